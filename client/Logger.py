@@ -1,40 +1,169 @@
 """
 日志管理类，包括:
 + 基本的控制台日志功能
-+ 日志文件写入功能
++ 日志文件写入功能(后台线程批量写入，按大小轮转)
 """
 from datetime import datetime
+from typing import List, Optional, Tuple
+import atexit
+import os
+import queue
+import threading
+import time
 
 # -*- encoding: utf-8 -*-
 
 # NOTE: 在下一次可能的更新前，该文件应消极改写。
-# XXX: 在下一次可能的更新时，解决R0903。
+
+LEVELS = {"TRACE": 0, "DEBUG": 1, "INFO": 2, "WARN": 3, "ERROR": 4}
 
 class Logger:
     """
     客户端日志管理类
 
+    日志记录先进入队列，由后台线程成批格式化并写入，文件句柄常驻，超过大小上限时轮转。
+    记录的最低等级默认为TRACE，可由环境变量KARTEN_LOG_LEVEL(TRACE, DEBUG, INFO, WARN, ERROR)设定，
+    高负载下设为INFO可免去热路径上TRACE日志的开销。
     """
+    level : int = LEVELS.get(os.environ.get("KARTEN_LOG_LEVEL", "TRACE").upper(), 0) # 低于该等级的日志直接丢弃(默认全部记录，可由环境变量或set_level调高)
+    file : str = "client.log"
+    max_bytes : int = 4 * 1024 * 1024
+    backups : int = 3
+    _BATCH = 256
+    _queue : "queue.SimpleQueue[Optional[Tuple[float, str, str, str]]]" = queue.SimpleQueue()
+    _thread : Optional[threading.Thread] = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def set_level(cls, t : str) -> None:
+        """
+        设置日志等级阈值
+
+        :param t: 消息等级(TRACE, DEBUG, INFO, WARN, ERROR)
+        :type t: str
+        """
+        cls.level = LEVELS[t]
+
     @classmethod
-    def write(cls, msg : str, t : str = "INFO", thread : str = "main", pipe : str = "file"):
+    def enabled(cls, t : str) -> bool:
+        """
+        判断该等级的日志是否会被记录(热路径上应先判断再格式化消息)
+
+        :param t: 消息等级
+        :type t: str
+        :return: 是否会被记录
+        :rtype: bool
+        """
+        return LEVELS.get(t, 2) >= cls.level
+
+    @classmethod
+    def write(cls, msg : str, t : str = "INFO", thread : str = "main", pipe : str = "file") -> None:
         """
         客户端日志写入接口
 
         :param msg: 消息内容
         :type msg: str
-        :param t: 消息等级(规定为INFO, TRACE, WARN, ERROR四种等级)
+        :param t: 消息等级(规定为TRACE, DEBUG, INFO, WARN, ERROR五种等级)
         :type t: str
         :param thread: 日志线程
         :type thread: str
         :param pipe: 日志输出管道(规定为cmd, file两种)
         :type pipe: str
         """
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        if LEVELS.get(t, 2) < cls.level:
+            return
         if pipe == "cmd":
+            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             print(timestamp + f" [{thread}] {t} {msg}")
         elif pipe == "file":
-            with open("client.log", "a", encoding = "utf-8") as f:
-                if msg == "":
-                    f.write("\n")
-                else:
-                    f.write(timestamp + f" [{thread}] {t} {msg}\n")
+            if cls._thread is None:
+                cls._start()
+            cls._queue.put((time.time(), t, thread, msg))
+
+    @classmethod
+    def _start(cls) -> None:
+        """
+        启动后台写入线程
+        """
+        with cls._lock:
+            if cls._thread is None:
+                cls._thread = threading.Thread(target = cls._run, name = "Logger", daemon = True)
+                cls._thread.start()
+                atexit.register(cls.close)
+
+    @classmethod
+    def _run(cls) -> None:
+        """
+        后台写入线程，每次取出队列中已积压的记录合并写入
+        """
+        f = open(cls.file, "a", encoding = "utf-8") # pylint: disable=R1732
+        try:
+            while True:
+                record = cls._queue.get()
+                batch : List[Optional[Tuple[float, str, str, str]]] = [record]
+                while record is not None and len(batch) < cls._BATCH:
+                    try:
+                        record = cls._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    batch.append(record)
+
+                lines = []
+                for i in batch:
+                    if i is None:
+                        break
+                    stamp, t, thread, msg = i
+                    if msg == "":
+                        lines.append("\n")
+                    else:
+                        timestamp = datetime.fromtimestamp(stamp).strftime('%Y-%m-%d %H:%M:%S')
+                        lines.append(timestamp + f" [{thread}] {t} {msg}\n")
+                f.write("".join(lines))
+                f.flush()
+
+                if batch[-1] is None:
+                    return
+                if f.tell() >= cls.max_bytes:
+                    f.close()
+                    cls._rotate()
+                    f = open(cls.file, "a", encoding = "utf-8") # pylint: disable=R1732
+        finally:
+            f.close()
+
+    @classmethod
+    def _rotate(cls) -> None:
+        """
+        轮转日志文件: xxx.log -> xxx.log.1 -> ... -> xxx.log.{backups}
+        """
+        for i in range(cls.backups - 1, 0, -1):
+            src = f"{cls.file}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{cls.file}.{i + 1}")
+        if cls.backups > 0:
+            os.replace(cls.file, f"{cls.file}.1")
+        else:
+            os.remove(cls.file)
+
+    @classmethod
+    def _after_fork(cls) -> None:
+        """
+        子进程中重置写入线程与队列(父进程的线程不会被fork继承)
+        """
+        cls._queue = queue.SimpleQueue()
+        cls._thread = None
+        cls._lock = threading.Lock()
+
+    @classmethod
+    def close(cls) -> None:
+        """
+        写完队列中剩余的日志并停止后台线程(进程退出时自动调用)
+        """
+        with cls._lock:
+            thread = cls._thread
+            cls._thread = None
+        if thread is not None:
+            cls._queue.put(None)
+            thread.join()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child = Logger._after_fork) # pylint: disable=W0212
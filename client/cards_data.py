@@ -4,13 +4,13 @@
 + 牌型属性规定
 + 牌型信息包规定
 """
-from typing import List, Union
-from dataclasses import dataclass
+from typing import Dict, Sequence, Tuple, Union
 from enum import Enum
 
 # -*- encoding: utf-8 -*-
 
 # NOTE: 在下一次可能的更新前，该文件应消极改写。
+# NOTE: 本文件在client与server下各有一份，修改时需保持两份一致。
 
 class Pattern(Enum):#牌型说明       牌数
     """
@@ -31,36 +31,143 @@ PATTERN_VALUE = {
     Pattern.SINGLE: int,
     Pattern.PAIR: int,
     Pattern.BOMB: int,
-    Pattern.STRAIGHT: list, # [长度, 最大点数]
-    Pattern.FULLHOUSE: list, # [长度, 三张点数值]
-    Pattern.SPAIRS: list, # [长度, 最大点数]
-    Pattern.PLANE: list, # [三张种数, 带子长度, 三张最大点数]
+    Pattern.STRAIGHT: tuple, # (长度, 最大点数)
+    Pattern.FULLHOUSE: tuple, # (长度, 三张点数值)
+    Pattern.SPAIRS: tuple, # (长度, 最大点数)
+    Pattern.PLANE: tuple, # (三张种数, 带子长度, 三张最大点数)
     Pattern.KK: None
 }
 
-@dataclass
+TIER = {
+    Pattern.BOMB: 1,
+    Pattern.KK: 2
+} # 炸弹与王炸可压过不同牌型，其余牌型为0
+
+_POOL : Dict[Tuple[Pattern, object], "Cards"] = {} # (牌型, 大小) -> 驻留的实例
+_POOL_LIMIT = 1 << 16 # 驻留池容量上限，合法牌型只有约三百种，超出的(非法大小)不再驻留
+
 class Cards:
     """
     Cards牌型数据类
+
+    构造时预先打包出整数强度键key: 从高到低依次为等级(tier)、牌型、长度/三张种数、翅膀张数、
+    最大点数(各占8位)，去掉最大点数即为形状(shape)。同一形状的牌型按key比较大小；
+    按key排序即按强度排序，key与(pattern, level)一一对应，可作为字典键。
+
+    不可变且全局驻留: 列表形式的level转为元组，相等的(pattern, level)总是返回同一个已校验的实例，
+    可以直接用is比较；重复构造只是一次字典查找。
     """
+    __slots__ = ("pattern", "level", "_tier", "_shape", "_key")
+
     pattern : Pattern
-    level : Union[int, List[int], None] = None
+    level : Union[int, Tuple[int, ...], None]
+    _tier : int
+    _shape : int
+    _key : int
 
-    def __post_init__(self) -> None:
-        expected = PATTERN_VALUE[self.pattern]
+    def __new__(cls, pattern : Pattern, level : Union[int, Sequence[int], None] = None) -> "Cards":
+        """
+        取得牌型实例
 
+        :param pattern: 牌型
+        :type pattern: Pattern
+        :param level: 大小(见PATTERN_VALUE，列表与元组均可)
+        :type level: Union[int, Sequence[int], None]
+        :return: 驻留的实例
+        :rtype: Cards
+        """
+        if isinstance(level, list):
+            level = tuple(level)
+        try:
+            return _POOL[(pattern, level)]
+        except (KeyError, TypeError):
+            pass
+
+        expected = PATTERN_VALUE[pattern]
         if expected is None:
-            if self.level is not None:
+            if level is not None:
                 raise TypeError(
-                    f"Level of the pattern {self.pattern.name} can't be {self.pattern}."
+                    f"Level of the pattern {pattern.name} can't be {level}."
                     )
         elif expected is int:
-            if not isinstance(self.level, int):
+            if not isinstance(level, int):
                 raise TypeError(
-                    f"Level of the pattern {self.pattern.name} can't be {self.pattern}."
+                    f"Level of the pattern {pattern.name} can't be {level}."
                     )
-        elif expected is list:
-            if not isinstance(self.level, list):
+        elif expected is tuple:
+            if not isinstance(level, tuple) or len(level) != (3 if pattern == Pattern.PLANE else 2) \
+                    or not all(isinstance(i, int) for i in level):
                 raise TypeError(
-                    f"Level of the pattern {self.pattern.name} can't be {self.pattern}."
+                    f"Level of the pattern {pattern.name} can't be {level}."
                     )
+
+        if isinstance(level, tuple):
+            shape = (level[0] << 8) | (level[1] if len(level) == 3 else 0)
+            rank = level[-1]
+        else:
+            shape = 0
+            rank = level or 0
+        tier = TIER.get(pattern, 0)
+        shape |= pattern.value << 16
+        self = object.__new__(cls)
+        setattr_ = object.__setattr__
+        setattr_(self, "pattern", pattern)
+        setattr_(self, "level", level)
+        setattr_(self, "_tier", tier)
+        setattr_(self, "_shape", shape)
+        setattr_(self, "_key", (tier << 32) | (shape << 8) | rank)
+        if len(_POOL) < _POOL_LIMIT:
+            _POOL[(pattern, level)] = self
+        return self
+
+    def __setattr__(self, name : str, value : object) -> None:
+        raise AttributeError(f"Cards is immutable, can't set {name}.")
+
+    def __delattr__(self, name : str) -> None:
+        raise AttributeError(f"Cards is immutable, can't delete {name}.")
+
+    def __reduce__(self) -> Tuple[type, Tuple]:
+        return (Cards, (self.pattern, self.level)) # 反序列化(如跨进程)时重新经过驻留池
+
+    def __eq__(self, other : object) -> bool:
+        if self is other:
+            return True
+        if not isinstance(other, Cards):
+            return NotImplemented
+        return self.pattern is other.pattern and self.level == other.level
+
+    def __repr__(self) -> str:
+        return f"Cards(pattern={self.pattern!r}, level={self.level!r})"
+
+    def __hash__(self) -> int:
+        return hash(self._key)
+
+    @property
+    def key(self) -> int:
+        """
+        整数强度键
+
+        :return: 强度键
+        :rtype: int
+        """
+        return self._key
+
+    @property
+    def shape(self) -> int:
+        """
+        形状(牌型、长度、翅膀)，形状相同的牌型才能互相比较，NONE为0
+
+        :return: 形状
+        :rtype: int
+        """
+        return self._shape
+
+    @property
+    def tier(self) -> int:
+        """
+        等级(0为普通牌型，1为炸弹，2为王炸)
+
+        :return: 等级
+        :rtype: int
+        """
+        return self._tier
@@ -0,0 +1,128 @@
+"""
+手牌强度评估类，包括:
++ 叫地主前17张手牌的强度分(按点数与张数查表累加)
++ 强度分对应的当地主胜率
++ 按强度分决定叫几分
+"""
+from functools import lru_cache
+from typing import List, Union
+import math
+from cards_hand import Hand
+
+# -*- encoding: utf-8 -*-
+
+# NOTE: 本文件在client与server下各有一份，修改时需保持两份一致。
+
+# 各点数持有0~4张时的分值(对数几率*10)，由自对局中叫地主前的17张手牌与当地主的胜负拟合而得，
+# 炸弹的分值取拟合值与三张+5中的较大者(样本少)
+_WEIGHT = [
+    [0, 0, 0, 0, 0],        # 不使用
+    [0, -6, -9, -9, -4],    # 3
+    [0, -6, -8, -7, -2],    # 4
+    [0, -6, -7, -9, 2],     # 5
+    [0, -5, -6, -8, 0],     # 6
+    [0, -3, -6, -7, 3],     # 7
+    [0, -3, -4, -4, 2],     # 8
+    [0, -2, -3, -5, 4],     # 9
+    [0, -1, -1, -1, 8],     # 10
+    [0, 0, 0, 0, 6],        # J
+    [0, 2, 4, 5, 11],       # Q
+    [0, 2, 5, 7, 12],       # K
+    [0, 3, 8, 11, 16],      # A
+    [0, 6, 12, 16, 21],     # 2
+    [0, 9, 0, 0, 0],        # 小王
+    [0, 10, 0, 0, 0]        # 大王
+]
+_ROCKET = -1    # 王炸的修正分(两张王已各自计分)
+_BIAS = 7       # 常数项
+_SCALE = 10     # 分值 = 对数几率*_SCALE
+_BIDS = (-2, 2, 6) # 叫1、2、3分所需的最低强度分(当地主胜率约45%、55%、65%)
+
+def _table(low : int) -> List[int]:
+    """
+    签名中一个字节(两个点数)的256种取值对应的分值
+
+    :param low: 该字节中较小的点数
+    :type low: int
+    :return: 分值表
+    :rtype: List[int]
+    """
+    table = []
+    for byte in range(256):
+        a, b = min(byte & 0xF, 4), min(byte >> 4, 4)
+        score = _WEIGHT[low][a] + _WEIGHT[low + 1][b]
+        if low == 14 and a and b:
+            score += _ROCKET
+        table.append(score)
+    return table
+
+_TABLES = [_table(2 * i) for i in range(8)] # 签名按字节查表，8次查表即得总分
+
+@lru_cache(maxsize = 4096)
+def _score(sig : int) -> int:
+    """
+    强度分(按手牌签名缓存)
+
+    :param sig: 手牌的点数计数签名
+    :type sig: int
+    :return: 强度分
+    :rtype: int
+    """
+    t = _TABLES
+    b = sig.to_bytes(8, "little")
+    return _BIAS + t[0][b[0]] + t[1][b[1]] + t[2][b[2]] + t[3][b[3]] + t[4][b[4]] + t[5][b[5]] + t[6][b[6]] + t[7][b[7]]
+
+class Evaluator:
+    """
+    手牌强度评估单例类
+
+    强度分只与各点数的张数有关，是各点数分值之和，约等于当地主胜率的对数几率*10(0分约为五成)；
+    评估的是叫地主前的17张手牌(不含地主牌)，供电脑叫分与客户端的叫分提示使用。
+    """
+
+    @classmethod
+    def score(cls, hand : Union[Hand, int]) -> int:
+        """
+        强度分
+
+        :param hand: 手牌或手牌的点数计数签名
+        :type hand: Union[Hand, int]
+        :return: 强度分
+        :rtype: int
+        """
+        return _score(hand.signature if isinstance(hand, Hand) else hand)
+
+    @classmethod
+    def winrate(cls, hand : Union[Hand, int]) -> float:
+        """
+        估计的当地主胜率
+
+        :param hand: 手牌或手牌的点数计数签名
+        :type hand: Union[Hand, int]
+        :return: 胜率(0~1)
+        :rtype: float
+        """
+        return 1 / (1 + math.exp(-cls.score(hand) / _SCALE))
+
+    @classmethod
+    def bid(cls, hand : Union[Hand, int], highest : int = 0) -> int:
+        """
+        决定叫几分
+
+        :param hand: 手牌或手牌的点数计数签名
+        :type hand: Union[Hand, int]
+        :param highest: 当前的最高叫分(0为还没有人叫)
+        :type highest: int
+        :return: 叫分(0为不叫，否则大于highest)
+        :rtype: int
+        """
+        score = cls.score(hand)
+        bid = sum(score >= i for i in _BIDS)
+        return bid if bid > highest else 0
+
+    @classmethod
+    def clear(cls) -> None:
+        """
+        清空缓存
+        """
+        _score.cache_clear()
@@ -0,0 +1,238 @@
+"""
+出牌枚举类，包括:
++ 枚举一手牌中所有合法的领出牌型
++ 枚举一手牌中所有能压过上一手的牌型
++ 按手牌签名缓存的枚举结果
+"""
+from functools import lru_cache
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+from cards_data import Pattern, Cards
+from cards_hand import Hand, RANK_UNIT as _UNIT, cards_to_mask
+from cards_identifier import Identifier
+from cards_judger import Judger
+
+# -*- encoding: utf-8 -*-
+
+# NOTE: 本文件在client与server下各有一份，修改时需保持两份一致。
+
+_RANK_BITS = [0] + [cards_to_mask([s, r] for s in range(4)) for r in range(1, 14)] \
+    + [cards_to_mask([[4, 14]]), cards_to_mask([[4, 15]])] # 各点数在掩码中的位
+
+class Move(NamedTuple):
+    """
+    一种出牌(只记录各点数的张数，与花色无关)
+    """
+    signature : int # 点数计数签名
+    size : int      # 牌数
+    pattern : Cards # 牌型
+
+def _counts(sig : int) -> List[int]:
+    """
+    把点数计数签名展开为各点数的张数
+
+    :param sig: 点数计数签名
+    :type sig: int
+    :return: 各点数的张数(下标即点数)
+    :rtype: List[int]
+    """
+    return [(sig >> (4 * i)) & 0xF for i in range(16)]
+
+def _wings(counts : List[int], ranks : List[int], size : int) -> Iterator[Tuple[int, int]]:
+    """
+    从给定点数中枚举size张单牌翅膀(某一点数恰取3张会成为三张，故不取)
+
+    :param counts: 各点数的张数
+    :type counts: List[int]
+    :param ranks: 可作翅膀的点数
+    :type ranks: List[int]
+    :param size: 翅膀张数
+    :type size: int
+    :return: (翅膀签名, 张数)
+    :rtype: Iterator[Tuple[int, int]]
+    """
+    def walk(i : int, left : int, sig : int) -> Iterator[Tuple[int, int]]:
+        if left == 0:
+            yield sig, size
+            return
+        if i == len(ranks):
+            return
+        rank = ranks[i]
+        for v in range(min(counts[rank], left) + 1):
+            if v != 3:
+                yield from walk(i + 1, left - v, sig + v * _UNIT[rank])
+
+    return walk(0, size, 0)
+
+def _pairs(ranks : List[int], size : int) -> Iterator[int]:
+    """
+    从给定点数中枚举size个不同点数的对子翅膀
+
+    :param ranks: 至少有2张的点数
+    :type ranks: List[int]
+    :param size: 对子个数
+    :type size: int
+    :return: 翅膀签名
+    :rtype: Iterator[int]
+    """
+    def walk(i : int, left : int, sig : int) -> Iterator[int]:
+        if left == 0:
+            yield sig
+            return
+        for j in range(i, len(ranks) - left + 1):
+            yield from walk(j + 1, left - 1, sig + 2 * _UNIT[ranks[j]])
+
+    return walk(0, size, 0)
+
+@lru_cache(maxsize = 4096)
+def _leads(sig : int) -> Tuple[Move, ...]:
+    """
+    枚举手牌中所有合法的出牌(按手牌签名缓存)
+
+    :param sig: 手牌的点数计数签名
+    :type sig: int
+    :return: 所有出牌
+    :rtype: Tuple[Move, ...]
+    """
+    counts = _counts(sig)
+    held = [i for i in range(1, 16) if counts[i]]
+    candidates : Dict[int, int] = {} # 签名 -> 牌数
+
+    for i in held:
+        for v in range(1, counts[i] + 1): # 单张、对子、三张、炸弹
+            candidates[v * _UNIT[i]] = v
+        if counts[i] >= 3: # 三带一、三带二
+            for j in held:
+                if j != i:
+                    candidates[3 * _UNIT[i] + _UNIT[j]] = 4
+                    if counts[j] >= 2:
+                        candidates[3 * _UNIT[i] + 2 * _UNIT[j]] = 5
+    if counts[14] and counts[15]:
+        candidates[_UNIT[14] + _UNIT[15]] = 2
+
+    # 顺子与连对(点数13及王不参与)
+    for start in range(1, 13):
+        run = 0
+        for end in range(start, 13):
+            if counts[end] < 1:
+                break
+            run += _UNIT[end]
+            if end - start >= 4:
+                candidates[run] = end - start + 1
+        run = 0
+        for end in range(start, 13):
+            if counts[end] < 2:
+                break
+            run += 2 * _UNIT[end]
+            if end - start >= 2:
+                candidates[run] = 2 * (end - start + 1)
+
+    # 飞机: 任意两个及以上点数的三张(不要求相连，点数13除外)
+    trios = [i for i in range(1, 13) if counts[i] >= 3]
+    def planes(i : int, chosen : List[int]) -> None:
+        if len(chosen) >= 2:
+            scale = len(chosen)
+            body = sum(3 * _UNIT[j] for j in chosen)
+            others = [j for j in held if j not in chosen]
+            candidates[body] = 3 * scale
+            for wing, size in _wings(counts, others, scale):
+                candidates[body + wing] = 3 * scale + size
+            for wing in _pairs([j for j in others if counts[j] >= 2], scale):
+                candidates[body + wing] = 5 * scale
+        for j in range(i, len(trios)):
+            chosen.append(trios[j])
+            planes(j + 1, chosen)
+            chosen.pop()
+    planes(0, [])
+
+    moves = []
+    for move_sig, size in candidates.items():
+        pattern = Identifier.lookup(move_sig, size)
+        if pattern.pattern != Pattern.NONE:
+            moves.append(Move(move_sig, size, pattern))
+    moves.sort(key = lambda i: i.pattern.key)
+    return tuple(moves)
+
+@lru_cache(maxsize = 16384)
+def _beats(sig : int, last : Cards) -> Tuple[Move, ...]:
+    """
+    枚举手牌中所有能压过上一手的出牌(按手牌签名与上一手缓存)
+
+    :param sig: 手牌的点数计数签名
+    :type sig: int
+    :param last: 上一手牌型
+    :type last: Cards
+    :return: 所有能压过的出牌
+    :rtype: Tuple[Move, ...]
+    """
+    return tuple(i for i in _leads(sig) if Judger.compare(last, i.pattern) == 2)
+
+class Generator:
+    """
+    出牌枚举单例类
+
+    结果只与各点数的张数有关，按手牌签名缓存(LRU)，同一手牌反复查询只需一次字典查找；
+    结果按牌型强度键(Cards.key)升序排列。需要具体的牌时用realize从手牌中取出。不出(过牌)不在结果中。
+    """
+
+    @classmethod
+    def leads(cls, hand : Union[Hand, int]) -> Tuple[Move, ...]:
+        """
+        枚举领出时所有合法的出牌
+
+        :param hand: 手牌或手牌的点数计数签名
+        :type hand: Union[Hand, int]
+        :return: 所有出牌
+        :rtype: Tuple[Move, ...]
+        """
+        return _leads(hand.signature if isinstance(hand, Hand) else hand)
+
+    @classmethod
+    def beats(cls, hand : Union[Hand, int], last : Optional[Cards]) -> Tuple[Move, ...]:
+        """
+        枚举所有能压过上一手的出牌(与Judger.compare的判定一致)
+
+        :param hand: 手牌或手牌的点数计数签名
+        :type hand: Union[Hand, int]
+        :param last: 上一手牌型(None即为领出)
+        :type last: Optional[Cards]
+        :return: 所有能压过的出牌
+        :rtype: Tuple[Move, ...]
+        """
+        sig = hand.signature if isinstance(hand, Hand) else hand
+        if last is None or last.pattern == Pattern.NONE:
+            return _leads(sig)
+        return _beats(sig, last)
+
+    @classmethod
+    def realize(cls, hand : Hand, move : Move) -> Hand:
+        """
+        从手牌中取出一种出牌对应的具体的牌(同点数取花色靠前的)
+
+        :param hand: 手牌
+        :type hand: Hand
+        :param move: 出牌
+        :type move: Move
+        :return: 具体的牌
+        :rtype: Hand
+        """
+        mask = 0
+        sig = move.signature
+        while sig:
+            rank = ((sig & -sig).bit_length() - 1) >> 2
+            bits = hand.mask & _RANK_BITS[rank]
+            for _ in range((sig >> (4 * rank)) & 0xF):
+                if not bits:
+                    raise ValueError("The move is not in hand.")
+                low = bits & -bits
+                mask |= low
+                bits ^= low
+            sig &= ~(0xF << (4 * rank))
+        return Hand.from_mask(mask)
+
+    @classmethod
+    def clear(cls) -> None:
+        """
+        清空缓存
+        """
+        _leads.cache_clear()
+        _beats.cache_clear()
@@ -0,0 +1,277 @@
+"""
+手牌数据类，包括:
++ 54位掩码与15个点数计数并存的手牌表示
++ 与旧版[花色, 点数]列表形式的互相转换(牌与掩码位序号的唯一定义，protocol亦由此导入)
++ 点数计数签名
+"""
+from typing import Iterable, Iterator, List
+
+# -*- encoding: utf-8 -*-
+
+# NOTE: 本文件在client与server下各有一份，修改时需保持两份一致。
+
+RANK_UNIT = [1 << (4 * i) for i in range(16)] # 点数计数签名: 每个点数占4位，点数r的张数位于第4r~4r+3位
+
+_BIT_CARD = [[i // 13, i % 13 + 1] for i in range(52)] + [[4, 14], [4, 15]]
+_BIT_RANK = [i % 13 + 1 for i in range(52)] + [14, 15]
+
+def card_bit(card : List[int]) -> int:
+    """
+    单张牌在掩码中的位序号(花色*13 + 点数-1，小王52，大王53)
+
+    :param card: [花色, 点数]
+    :type card: List[int]
+    :return: 位序号
+    :rtype: int
+    """
+    suit, rank = card
+    if suit == 4 and rank in (14, 15):
+        return rank + 38
+    if 0 <= suit < 4 and 1 <= rank <= 13:
+        return suit * 13 + rank - 1
+    raise ValueError(f"Invalid card {card}.")
+
+def cards_to_mask(cards : Iterable[List[int]]) -> int:
+    """
+    牌组转换为54位掩码
+
+    :param cards: 牌组
+    :type cards: Iterable[List[int]]
+    :return: 掩码
+    :rtype: int
+    """
+    mask = 0
+    for i in cards:
+        mask |= 1 << card_bit(i)
+    return mask
+
+def mask_to_cards(mask : int) -> List[List[int]]:
+    """
+    54位掩码转换为牌组(按位序号排列，即花色优先、点数其次)
+
+    :param mask: 掩码
+    :type mask: int
+    :return: 牌组
+    :rtype: List[List[int]]
+    """
+    cards = []
+    while mask:
+        low = mask & -mask
+        cards.append(list(_BIT_CARD[low.bit_length() - 1]))
+        mask ^= low
+    return cards
+
+def signature(cards : Iterable[List[int]]) -> int:
+    """
+    牌组的点数计数签名(与花色无关)
+
+    :param cards: 牌组
+    :type cards: Iterable[List[int]]
+    :return: 签名
+    :rtype: int
+    """
+    sig = 0
+    for i in cards:
+        sig += RANK_UNIT[i[1]]
+    return sig
+
+class Hand:
+    """
+    手牌类，同时维护54位掩码、15个点数的张数与点数计数签名
+
+    增删单张牌、判断持有均为O(1)；一副牌中每张牌至多出现一次，重复加入会报错。
+    """
+    __slots__ = ("_mask", "_counts", "_sig", "_size")
+
+    def __init__(self, cards : Iterable[List[int]] = ()):
+        """
+        初始化手牌
+
+        :param cards: 旧版列表形式的牌组
+        :type cards: Iterable[List[int]]
+        """
+        self._mask = 0
+        self._counts = [0] * 15 # 下标为点数-1
+        self._sig = 0
+        self._size = 0
+        for i in cards:
+            self.add(i)
+
+    @classmethod
+    def from_mask(cls, mask : int) -> "Hand":
+        """
+        由54位掩码构造手牌
+
+        :param mask: 掩码
+        :type mask: int
+        :return: 手牌
+        :rtype: Hand
+        """
+        if mask >> 54:
+            raise ValueError(f"Invalid card mask {mask:#x}.")
+        hand = cls()
+        counts = hand._counts
+        sig = 0
+        size = 0
+        bits = mask
+        while bits:
+            low = bits & -bits
+            rank = _BIT_RANK[low.bit_length() - 1]
+            counts[rank - 1] += 1
+            sig += RANK_UNIT[rank]
+            size += 1
+            bits ^= low
+        hand._mask = mask
+        hand._sig = sig
+        hand._size = size
+        return hand
+
+    def copy(self) -> "Hand":
+        """
+        复制手牌
+
+        :return: 新的手牌
+        :rtype: Hand
+        """
+        hand = Hand()
+        hand._mask = self._mask
+        hand._counts = self._counts.copy()
+        hand._sig = self._sig
+        hand._size = self._size
+        return hand
+
+    @property
+    def mask(self) -> int:
+        """
+        54位掩码
+
+        :return: 掩码
+        :rtype: int
+        """
+        return self._mask
+
+    @property
+    def signature(self) -> int:
+        """
+        点数计数签名(见cards_identifier)
+
+        :return: 签名
+        :rtype: int
+        """
+        return self._sig
+
+    def count(self, rank : int) -> int:
+        """
+        某一点数的张数
+
+        :param rank: 点数(1~15)
+        :type rank: int
+        :return: 张数
+        :rtype: int
+        """
+        return self._counts[rank - 1]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, card : List[int]) -> bool:
+        try:
+            return bool(self._mask >> card_bit(card) & 1)
+        except ValueError:
+            return False
+
+    def __iter__(self) -> Iterator[List[int]]:
+        bits = self._mask
+        while bits:
+            low = bits & -bits
+            yield list(_BIT_CARD[low.bit_length() - 1])
+            bits ^= low
+
+    def __repr__(self) -> str:
+        return f"Hand({self.tolist()})"
+
+    def add(self, card : List[int]) -> None:
+        """
+        加入一张牌
+
+        :param card: [花色, 点数]
+        :type card: List[int]
+        """
+        bit = 1 << card_bit(card)
+        if self._mask & bit:
+            raise ValueError(f"Duplicate card {card}.")
+        self._mask |= bit
+        self._counts[card[1] - 1] += 1
+        self._sig += RANK_UNIT[card[1]]
+        self._size += 1
+
+    def remove(self, card : List[int]) -> None:
+        """
+        移除一张牌
+
+        :param card: [花色, 点数]
+        :type card: List[int]
+        """
+        bit = 1 << card_bit(card)
+        if not self._mask & bit:
+            raise ValueError(f"Card {card} is not in hand.")
+        self._mask ^= bit
+        self._counts[card[1] - 1] -= 1
+        self._sig -= RANK_UNIT[card[1]]
+        self._size -= 1
+
+    def issuperset(self, other : "Hand") -> bool:
+        """
+        是否持有other中的所有牌
+
+        :param other: 另一手牌
+        :type other: Hand
+        :return: 是否全部持有
+        :rtype: bool
+        """
+        return not other._mask & ~self._mask
+
+    def update(self, other : "Hand") -> None:
+        """
+        加入other中的所有牌
+
+        :param other: 另一手牌
+        :type other: Hand
+        """
+        if self._mask & other._mask:
+            raise ValueError("Duplicate cards.")
+        self._mask |= other._mask
+        bits = other._mask
+        while bits: # 只遍历other中的牌，出牌通常只有几张
+            low = bits & -bits
+            self._counts[_BIT_RANK[low.bit_length() - 1] - 1] += 1
+            bits ^= low
+        self._sig += other._sig
+        self._size += other._size
+
+    def difference_update(self, other : "Hand") -> None:
+        """
+        移除other中的所有牌
+
+        :param other: 另一手牌
+        :type other: Hand
+        """
+        if other._mask & ~self._mask:
+            raise ValueError("Cards are not in hand.")
+        self._mask ^= other._mask
+        bits = other._mask
+        while bits: # 只遍历other中的牌，出牌通常只有几张
+            low = bits & -bits
+            self._counts[_BIT_RANK[low.bit_length() - 1] - 1] -= 1
+            bits ^= low
+        self._sig -= other._sig
+        self._size -= other._size
+
+    def tolist(self) -> List[List[int]]:
+        """
+        转换为旧版列表形式(按位序号排列，即花色优先、点数其次)
+
+        :return: 牌组
+        :rtype: List[List[int]]
+        """
+        return list(self)
@@ -2,27 +2,145 @@
 牌型识别类，包括:
 + 对客户端的出牌牌型进行判断
 + 识别、打包客户端的合法牌型
++ 以点数计数签名为键的牌型查找表
 """
 from collections import Counter
-from typing import List
+from typing import Dict, Iterator, List, Optional, Union
 from cards_data import Pattern, Cards
+from cards_hand import Hand, RANK_UNIT as _UNIT, signature
 
 # -*- encoding: utf-8 -*-
 
 # NOTE: 在下一次可能的更新前，该文件应消极改写。
+# NOTE: 本文件在client与server下各有一份，修改时需保持两份一致。
 # XXX: 在下一次可能的更新时，解决R0911、R0912和R0914
 
+_SEVENS = 0x7777777777777777
+_EIGHTS = 0x8888888888888888
+_THREES = 0x3333333333333333
+_NOT_TWOS = 0xDDDDDDDDDDDDDDDD  # 每个点数的张数只能为0或2时，除第1位外均为0
+_RANK_13 = 0x8 << (4 * 13)
+_LIMIT = [0] + [4] * 13 + [1, 1] # 一副牌中各点数的张数上限
+
 class Identifier:
     """
     客户端处的牌型判断单例类
+
+    除带翅膀的飞机外，一副牌中所有合法牌型都预先登记在以点数计数签名为键的表中；
+    带翅膀的飞机组合数过多(数百万种)，改为在签名上用位运算取出三张的点数后直接判定。
+    查找表在identify首次调用时由classify生成(约数千项，耗时数毫秒)。
     """
+    _table : Optional[Dict[int, Cards]] = None
 
     @classmethod
-    def identify(cls, cards : List[List[int]]) -> Cards:
+    def identify(cls, cards : Union[Hand, List[List[int]]]) -> Cards:
         """
         牌型识别方法(按非qq方规则识别，同时禁止牌型降级使用，确保同一序列只有一种牌型)
         具体的牌型种类见Pattern类
 
+        牌组须取自同一副牌(不含重复的牌)，结果与classify一致。返回的Cards可能为共享对象，不应修改。
+
+        :param cards: 带识别牌序列(传入Hand时直接使用其签名)
+        :type cards: Union[Hand, List[List[int]]]
+        :return: 牌型信息类
+        :rtype: Cards
+        """
+        if isinstance(cards, Hand):
+            sig = cards.signature
+        else:
+            sig = 0
+            for i in cards:
+                sig += _UNIT[i[1]]
+        return cls.lookup(sig, len(cards))
+
+    @classmethod
+    def lookup(cls, sig : int, n : int) -> Cards:
+        """
+        按点数计数签名识别牌型
+
+        :param sig: 点数计数签名(见cards_hand.signature)
+        :type sig: int
+        :param n: 牌数
+        :type n: int
+        :return: 牌型信息类
+        :rtype: Cards
+        """
+        pattern = (cls._table or cls._build()).get(sig)
+        if pattern is not None:
+            return pattern
+
+        if n < 6:
+            return _NONE
+
+        # 飞机: 张数恰为3的点数即为三张
+        x = sig ^ _THREES
+        triples = ~(((x & _SEVENS) + _SEVENS) | x | _SEVENS) & _EIGHTS
+        if not triples or triples & _RANK_13:
+            return _NONE
+        scale = bin(triples).count("1")
+        top = triples.bit_length() // 4 - 1
+        rest = n - scale * 3
+        if rest in (0, scale):
+            return Cards(Pattern.PLANE, (scale, rest, top))
+        if rest == scale * 2 and not sig & ~((triples >> 3) * 0xF) & _NOT_TWOS:
+            return Cards(Pattern.PLANE, (scale, rest, top))
+        return _NONE
+
+    @classmethod
+    def _build(cls) -> Dict[int, Cards]:
+        """
+        生成查找表: 5张及以下的牌组穷举，6张及以上的只有顺子与连对需要登记
+
+        :return: 查找表
+        :rtype: Dict[int, Cards]
+        """
+        table : Dict[int, Cards] = {}
+
+        def register(counts : List[int]) -> None:
+            cards = [[0, rank] for rank, v in enumerate(counts) for _ in range(v)]
+            pattern = cls.classify(cards)
+            if pattern.pattern != Pattern.NONE:
+                table[signature(cards)] = pattern
+
+        for counts in cls._multisets(5):
+            register(counts)
+        for start in range(1, 13):
+            for end in range(start + 5, 13):    # 6~12张的顺子
+                register([0] * start + [1] * (end - start + 1) + [0] * (15 - end))
+            for end in range(start + 2, min(start + 10, 13)):   # 3~10对的连对
+                register([0] * start + [2] * (end - start + 1) + [0] * (15 - end))
+
+        cls._table = table
+        return table
+
+    @staticmethod
+    def _multisets(size : int) -> Iterator[List[int]]:
+        """
+        枚举一副牌中不超过size张的所有点数组合
+
+        :param size: 张数上限
+        :type size: int
+        :return: 各点数的张数(下标即点数)
+        :rtype: Iterator[List[int]]
+        """
+        counts = [0] * 16
+
+        def walk(rank : int, left : int) -> Iterator[List[int]]:
+            if rank == 16:
+                if left < size:
+                    yield counts
+                return
+            for v in range(min(_LIMIT[rank], left) + 1):
+                counts[rank] = v
+                yield from walk(rank + 1, left - v)
+            counts[rank] = 0
+
+        return walk(1, size)
+
+    @classmethod
+    def classify(cls, cards : List[List[int]]) -> Cards:
+        """
+        逐步判断的牌型识别实现，用于生成查找表，也作为identify的参照
 
         :param cards: 带识别牌序列
         :type cards: List[List[int]]
@@ -48,16 +166,16 @@ class Identifier:
                     return Cards(Pattern.KK)
             case 3: # 三张
                 if s == 1:
-                    return Cards(Pattern.FULLHOUSE, [3, points[0]])
+                    return Cards(Pattern.FULLHOUSE, (3, points[0]))
             case 4: # 三带一、炸弹
                 if s == 1:
                     return Cards(Pattern.BOMB, points[0])
                 elif s == 2 and points[1] == points[2]:
-                    return Cards(Pattern.FULLHOUSE, [4, points[1]])
+                    return Cards(Pattern.FULLHOUSE, (4, points[1]))
             case 5: # 三带二、顺子
                 if s == 2:
                     if not (points[1] == points[2] and points[2] == points[3]):
-                        return Cards(Pattern.FULLHOUSE, [5, points[2]])
+                        return Cards(Pattern.FULLHOUSE, (5, points[2]))
                 elif s == 5:
                     if (points[1] == points[0] + 1 and
                         points[2] == points[1] + 1 and
@@ -65,13 +183,13 @@ class Identifier:
                         points[4] == points[3] + 1) and points[4] not in [
                             13, 14, 15
                             ]:
-                        return Cards(Pattern.STRAIGHT, [5, points[4]])
+                        return Cards(Pattern.STRAIGHT, (5, points[4]))
             case _: # 顺子、飞机或者连对
                 if n == s and points[-1] not in [13, 14, 15]:
                     for i in range(1, n):
                         if points[i] != points[i - 1] + 1:
                             return Cards(Pattern.NONE)
-                    return Cards(Pattern.STRAIGHT, [n, points[-1]])
+                    return Cards(Pattern.STRAIGHT, (n, points[-1]))
                 dic = Counter(points)
                 spairflag = True
 
@@ -92,7 +210,7 @@ class Identifier:
                         if i != prev + 1:
                             return Cards(Pattern.NONE)
                         prev = i
-                    return Cards(Pattern.SPAIRS, [n, prev])
+                    return Cards(Pattern.SPAIRS, (n, prev))
 
                 scale = 0
                 m = 0
@@ -109,9 +227,9 @@ class Identifier:
 
                 rest = n - scale * 3
                 if rest == 0:
-                    return Cards(Pattern.PLANE, [scale, 0, m])
+                    return Cards(Pattern.PLANE, (scale, 0, m))
                 elif rest == scale:
-                    return Cards(Pattern.PLANE, [scale, rest, m])
+                    return Cards(Pattern.PLANE, (scale, rest, m))
                 elif rest != scale * 2:
                     return Cards(Pattern.NONE)
 
@@ -119,5 +237,7 @@ class Identifier:
                 for i, v in rc.items():
                     if v != 2:
                         return Cards(Pattern.NONE)
-                return Cards(Pattern.PLANE, [scale, scale * 2, m])
+                return Cards(Pattern.PLANE, (scale, scale * 2, m))
         return Cards(Pattern.NONE)
+
+_NONE = Cards(Pattern.NONE)
@@ -6,17 +6,18 @@
 # pylint: disable=R0903
 # 抑制警告：
 # + R0903:类的公共方法太少(小于2)。
-from cards_data import Pattern, Cards
+from cards_data import Cards
 
 # -*- encoding: utf-8 -*-
 
 # NOTE: 在下一次可能的更新前，该文件应消极改写。
-# XXX: 在下一次可能的更新时，解决R0911和R0912
+# NOTE: 本文件在client与server下各有一份，修改时需保持两份一致。
 
 class Judger:
     """
     牌型对比单例
 
+    只比较Cards预先打包的形状与强度键(见cards_data)
     """
 
     @classmethod
@@ -31,52 +32,8 @@ class Judger:
         :return: 比较状态码(0为b的牌型非法;1为上家大,无法打出;2为下家打,可以出牌)
         :rtype: int
         """
-        if Pattern.KK in [a.pattern, b.pattern]:
-            if a.pattern == Pattern.KK:
-                return 1
-            else:
-                return 2
-
-        if Pattern.BOMB in [a.pattern, b.pattern]:
-            if len(set([a.pattern, b.pattern])) == 1:
-                if isinstance(a.level, int) and isinstance(b.level, int):
-                    if a.level > b.level:
-                        return 1
-                    else:
-                        return 2
-            else:
-                if a.pattern == Pattern.BOMB:
-                    return 1
-                else:
-                    return 2
-
-        if a.pattern != b.pattern:
+        if a.tier or b.tier: # 炸弹、王炸按等级与点数比较
+            return 1 if a.key >= b.key else 2
+        if a.shape != b.shape or not b.shape:
             return 0
-
-        if a.pattern in [Pattern.STRAIGHT, Pattern.FULLHOUSE, Pattern.SPAIRS]:
-            if isinstance(a.level, list) and isinstance(b.level, list):
-                if a.level[0] != b.level[0]:
-                    return 0
-
-                if a.level[1] >= b.level[1]:
-                    return 1
-                else:
-                    return 2
-
-        if a.pattern == Pattern.PLANE:
-            if isinstance(a.level, list) and isinstance(b.level, list):
-                if a.level[0] != b.level[0] or a.level[1] != b.level[1]:
-                    return 0
-
-                if a.level[2] >= b.level[2]:
-                    return 1
-                else:
-                    return 2
-
-        if isinstance(a.level, int) and isinstance(b.level, int):
-            if a.level >= b.level:
-                return 1
-            else:
-                return 2
-
-        return 0
+        return 1 if a.key >= b.key else 2
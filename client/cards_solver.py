@@ -0,0 +1,432 @@
+"""
+手牌拆分求解类，包括:
++ 打完一手牌所需的最少出牌次数
++ 对应的最优拆分(顺子、连对、飞机、三带、对子、个子等)
++ 按手牌签名共享的求解缓存
+"""
+# pylint: disable=R0912
+# pylint: disable=R0914
+# pylint: disable=R0915
+# pylint: disable=R1702
+# pylint: disable=R1730
+# 抑制警告：
+# + R0912:分支过多。
+# + R0914:局部变量过多。
+# + R0915:语句过多。
+# + R1702:嵌套层数过多。
+# + R1730:建议用min代替if(热点循环中if更快)。
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+from cards_data import Pattern
+from cards_hand import Hand, RANK_UNIT as _UNIT
+from cards_identifier import Identifier
+from cards_generator import Move
+
+# -*- encoding: utf-8 -*-
+
+# NOTE: 本文件在client与server下各有一份，修改时需保持两份一致。
+
+_INF = 1 << 30
+_GROUPS = 3 # 带单张/带对子的三张各自至多分为几组
+
+_CHAIN = 0  # 拆出一条从最小点数开始的顺子/连对/王炸
+_RANK = 1   # 把最小点数的牌全部分配完
+
+# 最小点数上的三张
+_BARE = 0   # 不带翅膀
+_SINGLE = 1 # 带单张
+_PAIR = 2   # 带对子
+_BOMB = 3   # 不是三张，而是炸弹
+
+_FIVES = 0x5555555555555555  # 张数不超过4，加5后第3位置位即张数不小于3
+_EIGHTS = 0x8888888888888888
+_LOW_NIBBLES = 0x0F0F0F0F0F0F0F0F
+
+_TRIOS = ((None,), (None,), (None,), (None, _BARE, _SINGLE, _PAIR), (None, _BARE, _SINGLE, _PAIR, _BOMB)) # 按张数的三张去向
+
+Groups = Tuple[Tuple[int, bool], ...] # 各组(待配翅膀数, 是否已有三张)，排序后作为状态
+
+def _size(sig : int) -> int:
+    """
+    签名中的总张数
+
+    :param sig: 点数计数签名
+    :type sig: int
+    :return: 张数
+    :rtype: int
+    """
+    halves = (sig & _LOW_NIBBLES) + ((sig >> 4) & _LOW_NIBBLES)
+    return ((halves * 0x0101010101010101) >> 56) & 0xFF
+
+@lru_cache(maxsize = 1 << 12)
+def _spread(groups : Groups, cards : int, limit : int, banned : int) -> Tuple[Tuple[Groups, Tuple[int, ...], int], ...]:
+    """
+    把同一点数的若干张翅膀分到各组(可新开组)的所有分法
+
+    :param groups: 现有各组(未必有序)
+    :type groups: Groups
+    :param cards: 翅膀张数(对子翅膀按对计)
+    :type cards: int
+    :param limit: 每组至多分到几份
+    :type limit: int
+    :param banned: 不能分到的组(同点数三张所在的组，-1为无)
+    :type banned: int
+    :return: (排序后的新各组, 每组分到的份数(含新开的组), 新开的组数)
+    :rtype: Tuple[Tuple[Groups, Tuple[int, ...], int], ...]
+    """
+    size = len(groups)
+    slots = size + min(cards, _GROUPS - size)
+    result : Dict[Groups, Tuple[Tuple[int, ...], int]] = {}  # 分到相同状态的几种分法只留新开组最少的
+    share = [0] * slots
+
+    def walk(i, left):
+        if i == slots:
+            opened = sum(1 for j in share[size:] if j)
+            if not left and all(share[size:size + opened]): # 新开的组只取前几个，避免重复
+                merged = [(g[0] - v, g[1]) for g, v in zip(groups, share)]
+                merged.extend((-v, False) for v in share[size:] if v)
+                key = tuple(sorted(merged))
+                if key not in result or opened < result[key][1]:
+                    result[key] = (tuple(share), opened)
+            return
+        for v in range(0 if i == banned else min(left, limit), -1, -1):
+            if v != 3: # 同一组的单张翅膀不能凑成三张
+                share[i] = v
+                walk(i + 1, left - v)
+        share[i] = 0
+
+    walk(0, cards)
+    return tuple((key, share, opened) for key, (share, opened) in result.items())
+
+@lru_cache(maxsize = 1 << 16)
+def _bound(sig : int, single : int, pair : int, opened : int) -> int:
+    """
+    最少手数的下界: 放宽_best的约束(各组合并、不避开同点数的翅膀)后的同一动态规划
+
+    :param sig: 剩余手牌的点数计数签名
+    :type sig: int
+    :param single: 各组待配的单张翅膀数之和
+    :type single: int
+    :param pair: 各组待配的对子翅膀数之和
+    :type pair: int
+    :param opened: 已有组的带牌方式(按位)
+    :type opened: int
+    :return: 下界
+    :rtype: int
+    """
+    if not sig:
+        return 0 if not single and not pair else _INF
+    spare = (-single if single < 0 else 0) + (-pair if pair < 0 else 0)
+    owed = (single if single > 0 else 0) + (2 * pair if pair > 0 else 0)
+    if spare > bin((sig + _FIVES) & _EIGHTS).count("1") or owed > _size(sig):
+        return _INF
+    rank = ((sig & -sig).bit_length() - 1) >> 2
+    count = (sig >> (4 * rank)) & 0xF
+    best = _INF
+
+    for width, least in ((1, 5), (2, 3)):
+        run = 0
+        for end in range(rank, 13):
+            if (sig >> (4 * end)) & 0xF < width:
+                break
+            run += width * _UNIT[end]
+            if end - rank + 1 >= least:
+                cost = _bound(sig - run, single, pair, opened) + 1
+                if cost < best:
+                    best = cost
+    if rank == 14 and sig >> 60:
+        cost = _bound(sig - _UNIT[14] - _UNIT[15], single, pair, opened) + 1
+        if cost < best:
+            best = cost
+
+    rest = sig - count * _UNIT[rank]
+    for trio in _TRIOS[count]:
+        if trio is None:
+            cost0, left, opened0 = 0, count, opened
+        elif trio == _BOMB:
+            cost0, left, opened0 = 1, 0, opened
+        else:
+            cost0, left, opened0 = int(not opened >> trio & 1), count - 3, opened | 1 << trio
+        single0 = single + (trio == _SINGLE)
+        pair0 = pair + (trio == _PAIR)
+        for pair_count in range(left // 2 + 1):
+            cards = left - 2 * pair_count
+            for pair_wing in range(pair_count - 1 if pair_count else 0, pair_count + 1):
+                for single_wing in range(cards - 1 if cards else 0, cards + 1):
+                    cost = cost0 + pair_count - pair_wing + cards - single_wing
+                    if cost < best:
+                        cost += _bound(rest, single0 - single_wing, pair0 - pair_wing, opened0)
+                        if cost < best:
+                            best = cost
+    return best
+
+def _relaxed(sig : int, singles : Groups, pairs : Groups, bare : bool) -> int:
+    """
+    _best状态对应的下界
+
+    :param sig: 剩余手牌的点数计数签名
+    :type sig: int
+    :param singles: 带单张的各组
+    :type singles: Groups
+    :param pairs: 带对子的各组
+    :type pairs: Groups
+    :param bare: 是否已有不带翅膀的一组
+    :type bare: bool
+    :return: 下界
+    :rtype: int
+    """
+    opened = (bare << _BARE) | (bool(singles) << _SINGLE) | (bool(pairs) << _PAIR)
+    return _bound(sig, sum(i[0] for i in singles), sum(i[0] for i in pairs), opened)
+
+@lru_cache(maxsize = 1 << 16)
+def _best(sig : int, singles : Groups, pairs : Groups, bare : bool) -> Tuple[int, Tuple]:
+    """
+    按点数从小到大分配手牌的动态规划(按状态缓存)
+
+    拆分由两部分组成: 顺子、连对、炸弹、王炸、对子、个子各算一手；三张按带牌方式分组，
+    每组是一架飞机或一手三带，只算一手，组内的翅膀不另算。不带翅膀的三张(点数13除外)总能并成一组；
+    带翅膀的三张要避开同点数的翅膀、同组单张翅膀不能凑成三张，故可分为多组。
+    各组的待配翅膀数可为负(翅膀先于三张出现)，结束时须恰好配完。
+
+    :param sig: 剩余手牌的点数计数签名
+    :type sig: int
+    :param singles: 带单张的各组
+    :type singles: Groups
+    :param pairs: 带对子的各组
+    :type pairs: Groups
+    :param bare: 是否已有不带翅膀的一组
+    :type bare: bool
+    :return: (最少手数, 本步选择)
+    :rtype: Tuple[int, Tuple]
+    """
+    if not sig:
+        done = all(not i[0] for i in singles) and all(not i[0] for i in pairs)
+        return (0, ()) if done else (_INF, ())
+    # 剩下的三张不够配先出现的翅膀，或剩下的牌不够作翅膀
+    owed = sum(i[0] for i in singles if i[0] > 0) + 2 * sum(i[0] for i in pairs if i[0] > 0)
+    spare = -sum(i[0] for i in singles if i[0] < 0) - sum(i[0] for i in pairs if i[0] < 0)
+    if spare > bin((sig + _FIVES) & _EIGHTS).count("1") or owed > _size(sig):
+        return (_INF, ())
+    rank = ((sig & -sig).bit_length() - 1) >> 2
+    count = (sig >> (4 * rank)) & 0xF
+    best : Tuple[int, Tuple] = (_INF, ())
+
+    # 从该点数开始的顺子与连对(点数13及王不参与)
+    for width, least in ((1, 5), (2, 3)):
+        run = 0
+        for end in range(rank, 13):
+            if (sig >> (4 * end)) & 0xF < width:
+                break
+            run += width * _UNIT[end]
+            if end - rank + 1 >= least and _relaxed(sig - run, singles, pairs, bare) + 1 < best[0]:
+                cost = _best(sig - run, singles, pairs, bare)[0] + 1
+                if cost < best[0]:
+                    best = (cost, (_CHAIN, run, width * (end - rank + 1)))
+    if rank == 14 and sig >> 60:
+        cost = _best(sig - _UNIT[14] - _UNIT[15], singles, pairs, bare)[0] + 1
+        if cost < best[0]:
+            best = (cost, (_CHAIN, _UNIT[14] + _UNIT[15], 2))
+
+    # 该点数剩下的牌: 至多一个三张(或炸弹)，其余拆为对子与单张，各自可作翅膀
+    rest = sig - count * _UNIT[rank]
+    for trio, group in _trios(count, rank, singles, pairs):
+        cost0, singles0, pairs0, bare0 = 0, singles, pairs, bare
+        left = count - 3
+        if trio == _BOMB:
+            cost0, left = 1, 0
+        elif trio == _BARE:
+            if rank == 13: # 点数13的三张不能组成飞机，单独成组
+                cost0 = 1
+            elif not bare:
+                cost0, bare0 = 1, True
+        elif trio is None:
+            left = count
+        else:
+            chosen = list(singles if trio == _SINGLE else pairs)
+            if group == len(chosen):
+                cost0 = 1
+                chosen.append((1, True))
+            else:
+                chosen[group] = (chosen[group][0] + 1, True)
+            if trio == _SINGLE:
+                singles0 = tuple(chosen)
+            else:
+                pairs0 = tuple(chosen)
+        for pair_count in range(left // 2 + 1):
+            cards = left - 2 * pair_count
+            for pair_wing in range(pair_count + 1):
+                if pair_count - pair_wing == 2: # 两个对子不如一个炸弹
+                    continue
+                for pairs1, pshare, popened in _spread(pairs0, pair_wing, 1, -1):
+                    for single_wing in range(max(cards - 1, 0), cards + 1): # 两张单出不如一个对子
+                        banned = group if trio == _SINGLE else -1 # 翅膀不能与三张同点数
+                        for singles1, sshare, sopened in _spread(singles0, single_wing, 4, banned):
+                            cost = cost0 + popened + sopened + pair_count - pair_wing + cards - single_wing
+                            if cost + _relaxed(rest, singles1, pairs1, bare0) >= best[0]:
+                                continue
+                            cost += _best(rest, singles1, pairs1, bare0)[0]
+                            if cost < best[0]:
+                                best = (cost, (_RANK, trio, group, pair_count, pshare, cards - single_wing, sshare))
+    return best
+
+def _trios(count : int, rank : int, singles : Groups, pairs : Groups) -> Iterator[Tuple[Optional[int], int]]:
+    """
+    最小点数上的三张的去向
+
+    :param count: 该点数的张数
+    :type count: int
+    :param rank: 点数
+    :type rank: int
+    :param singles: 带单张的各组
+    :type singles: Groups
+    :param pairs: 带对子的各组
+    :type pairs: Groups
+    :return: (去向(None为不组成三张), 组号)
+    :rtype: Iterator[Tuple[Optional[int], int]]
+    """
+    yield None, -1
+    if count < 3:
+        return
+    yield _BARE, -1
+    for trio, groups in ((_SINGLE, singles), (_PAIR, pairs)):
+        seen = set()
+        for i, group in enumerate(groups):
+            if group not in seen and not (rank == 13 and group[1]): # 点数13的三张只能与翅膀成组
+                seen.add(group)
+                yield trio, i
+        if len(groups) < _GROUPS:
+            yield trio, len(groups)
+    if count == 4:
+        yield _BOMB, -1
+
+def _move(sig : int, size : int) -> Move:
+    """
+    构造一手出牌
+
+    :param sig: 点数计数签名
+    :type sig: int
+    :param size: 牌数
+    :type size: int
+    :return: 出牌
+    :rtype: Move
+    """
+    pattern = Identifier.lookup(sig, size)
+    if pattern.pattern == Pattern.NONE:
+        raise ValueError(f"Invalid move {sig:#x}.")
+    return Move(sig, size, pattern)
+
+def _give(groups : List[List], share : Tuple[int, ...], rank : int) -> None:
+    """
+    把同一点数的翅膀记入各组(可新开组)，并按状态的顺序重新排序
+
+    :param groups: 各组[待配翅膀数, 是否已有三张, 三张点数, 翅膀点数]
+    :type groups: List[List]
+    :param share: 每组分到的份数(含新开的组)
+    :type share: Tuple[int, ...]
+    :param rank: 翅膀点数
+    :type rank: int
+    """
+    for i, v in enumerate(share):
+        if not v:
+            continue
+        if i == len(groups):
+            groups.append([0, False, [], []])
+        groups[i][0] -= v
+        groups[i][3].extend([rank] * v)
+    groups.sort(key = lambda i: (i[0], i[1]))
+
+def _decompose(sig : int) -> Tuple[Move, ...]:
+    """
+    按动态规划的选择还原最优拆分
+
+    :param sig: 手牌的点数计数签名
+    :type sig: int
+    :return: 各手出牌
+    :rtype: Tuple[Move, ...]
+    """
+    moves : List[Move] = []
+    bare : List[int] = []
+    singles : List[List] = []
+    pairs : List[List] = []
+    while sig:
+        state = (
+            tuple((i[0], i[1]) for i in singles),
+            tuple((i[0], i[1]) for i in pairs),
+            bool(bare)
+            )
+        choice = _best(sig, *state)[1]
+        if choice[0] == _CHAIN:
+            moves.append(_move(choice[1], choice[2]))
+            sig -= choice[1]
+            continue
+        _, trio, group, pair_count, pshare, alone, sshare = choice
+        rank = ((sig & -sig).bit_length() - 1) >> 2
+        sig -= ((sig >> (4 * rank)) & 0xF) * _UNIT[rank]
+        if trio == _BOMB:
+            moves.append(_move(4 * _UNIT[rank], 4))
+        elif trio == _BARE and rank == 13:
+            moves.append(_move(3 * _UNIT[rank], 3))
+        elif trio == _BARE:
+            bare.append(rank)
+        elif trio is not None:
+            chosen = singles if trio == _SINGLE else pairs
+            if group == len(chosen):
+                chosen.append([0, True, [], []])
+            chosen[group][0] += 1
+            chosen[group][1] = True
+            chosen[group][2].append(rank)
+        moves.extend(_move(2 * _UNIT[rank], 2) for _ in range(pair_count - sum(pshare)))
+        moves.extend(_move(_UNIT[rank], 1) for _ in range(alone))
+        _give(pairs, pshare, rank)
+        _give(singles, sshare, rank)
+
+    if bare:
+        moves.append(_move(sum(3 * _UNIT[i] for i in bare), 3 * len(bare)))
+    for width, groups in ((1, singles), (2, pairs)):
+        for _, _, trios, wings in groups:
+            moves.append(_move(
+                sum(3 * _UNIT[i] for i in trios) + sum(width * _UNIT[i] for i in wings),
+                (3 + width) * len(trios)
+                ))
+    moves.sort(key = lambda i: i.pattern.key)
+    return tuple(moves)
+
+class Solver:
+    """
+    手牌拆分求解单例类
+
+    求出打完一手牌最少需要出几手(不考虑其他玩家)，以及对应的一种拆分。结果只与各点数的张数有关，
+    各手牌之间共享按状态缓存的动态规划结果(LRU)，需要具体的牌时用Generator.realize取出。
+    """
+
+    @classmethod
+    def turns(cls, hand : Union[Hand, int]) -> int:
+        """
+        打完手牌所需的最少出牌次数
+
+        :param hand: 手牌或手牌的点数计数签名
+        :type hand: Union[Hand, int]
+        :return: 出牌次数
+        :rtype: int
+        """
+        return _best(hand.signature if isinstance(hand, Hand) else hand, (), (), False)[0]
+
+    @classmethod
+    def solve(cls, hand : Union[Hand, int]) -> Tuple[Move, ...]:
+        """
+        求出手牌的一种最优拆分
+
+        :param hand: 手牌或手牌的点数计数签名
+        :type hand: Union[Hand, int]
+        :return: 各手出牌(按牌型强度键排列)
+        :rtype: Tuple[Move, ...]
+        """
+        return _decompose(hand.signature if isinstance(hand, Hand) else hand)
+
+    @classmethod
+    def clear(cls) -> None:
+        """
+        清空缓存
+        """
+        _best.cache_clear()
+        _bound.cache_clear()
@@ -2,19 +2,91 @@
 数据转换类，包括:
 + JSON字符串转Cards数据
 + Cards数据转JSON字符串
++ 批量转换(如同步出牌历史)
 """
-from cards_data import Pattern, Cards
+from functools import lru_cache
+from typing import Dict, Hashable, Iterable, Iterator, List, Tuple
 import json
-from dataclasses import asdict
+from cards_data import Pattern, Cards
 
 # -*- encoding: utf-8 -*-
 
 # NOTE: 在下一次可能的更新前，该文件应消极改写。
+# NOTE: 本文件在client与server下各有一份，修改时需保持两份一致。
+
+def _legal() -> Iterator[Cards]:
+    """
+    列举所有合法牌型(一手牌至多20张)
+
+    :return: 牌型
+    :rtype: Iterator[Cards]
+    """
+    yield Cards(Pattern.NONE)
+    yield Cards(Pattern.KK)
+    for r in range(1, 16):
+        yield Cards(Pattern.SINGLE, r)
+    for r in range(1, 14):
+        yield Cards(Pattern.PAIR, r)
+        yield Cards(Pattern.BOMB, r)
+        for n in (3, 4, 5):
+            yield Cards(Pattern.FULLHOUSE, (n, r))
+    for top in range(1, 13):
+        for n in range(5, top + 1):
+            yield Cards(Pattern.STRAIGHT, (n, top))
+        for n in range(3, min(top, 10) + 1):
+            yield Cards(Pattern.SPAIRS, (2 * n, top))
+        for scale in range(2, min(top, 6) + 1):
+            for wing in (0, scale, 2 * scale):
+                if 3 * scale + wing <= 20:
+                    yield Cards(Pattern.PLANE, (scale, wing, top))
+
+def _dumps(cards : Cards) -> str:
+    """
+    按原有格式(dataclasses.asdict后json.dumps)生成JSON字符串
+
+    :param cards: 牌型
+    :type cards: Cards
+    :return: JSON字符串
+    :rtype: str
+    """
+    return json.dumps({"pattern": cards.pattern.name, "level": cards.level})
+
+_TEXT : Dict[int, str] = {}     # 强度键 -> JSON字符串
+_CARDS : Dict[str, Cards] = {}  # JSON字符串 -> 牌型
+_FIELDS : Dict[Tuple[str, Hashable], Cards] = {} # (牌型名, 大小) -> 牌型
+
+def _build() -> None:
+    """
+    预先生成所有合法牌型的编码表与解码表
+    """
+    for c in _legal():
+        text = _dumps(c)
+        _TEXT[c.key] = text
+        _CARDS[text] = c
+        _FIELDS[(c.pattern.name, c.level)] = c
+
+_build()
+
+@lru_cache(maxsize = 1024)
+def _loads(text : str) -> Cards:
+    """
+    解析表外的JSON字符串(如其他实现生成的、空白不同的字符串)，按字符串缓存
+
+    :param text: JSON字符串
+    :type text: str
+    :return: 牌型
+    :rtype: Cards
+    """
+    data_dict = json.loads(text)
+    data_dict['pattern'] = Pattern[data_dict['pattern']]
+    return Cards(**data_dict)
 
 class CardsTransfer:
     """
     牌型JSON转换单例
 
+    合法牌型与其JSON字符串在导入时预先生成，编码按强度键查表，解码按字符串查表，
+    格式与原先asdict后json.dumps的结果完全一致。
     """
     @classmethod
     def encoson(cls, send_cards : Cards) -> str:
@@ -26,9 +98,8 @@ class CardsTransfer:
         :return: JSON字符串
         :rtype: str
         """
-        data_dict = asdict(send_cards)
-        data_dict['pattern'] = send_cards.pattern.name
-        return json.dumps(data_dict)
+        text = _TEXT.get(send_cards.key)
+        return text if text is not None else _dumps(send_cards)
 
     @classmethod
     def decoson(cls, recv_cards : str) -> Cards:
@@ -40,6 +111,65 @@ class CardsTransfer:
         :return: Cards数据类
         :rtype: Cards
         """
-        data_dict = json.loads(recv_cards)
-        data_dict['pattern'] = Pattern[data_dict['pattern']]
-        return Cards(**data_dict)
+        cards = _CARDS.get(recv_cards)
+        return cards if cards is not None else _loads(recv_cards)
+
+    @classmethod
+    def encoson_many(cls, send_cards : Iterable[Cards]) -> List[str]:
+        """
+        批量把Cards数据转为JSON数据字符串
+
+        :param send_cards: 要发送的Cards数据类
+        :type send_cards: Iterable[Cards]
+        :return: JSON字符串
+        :rtype: List[str]
+        """
+        get = _TEXT.get
+        return [get(i.key) or _dumps(i) for i in send_cards]
+
+    @classmethod
+    def decoson_many(cls, recv_cards : Iterable[str]) -> List[Cards]:
+        """
+        批量把JSON数据字符串转为Cards数据
+
+        :param recv_cards: 接收的JSON数据
+        :type recv_cards: Iterable[str]
+        :return: Cards数据类
+        :rtype: List[Cards]
+        """
+        get = _CARDS.get
+        return [get(i) or _loads(i) for i in recv_cards]
+
+    @classmethod
+    def encoson_list(cls, send_cards : Iterable[Cards]) -> str:
+        """
+        把一串Cards数据转为一个JSON数组字符串(与对各项asdict后整体json.dumps的结果一致)
+
+        :param send_cards: 要发送的Cards数据类
+        :type send_cards: Iterable[Cards]
+        :return: JSON数组字符串
+        :rtype: str
+        """
+        return "[" + ", ".join(cls.encoson_many(send_cards)) + "]"
+
+    @classmethod
+    def decoson_list(cls, recv_cards : str) -> List[Cards]:
+        """
+        把JSON数组字符串转为一串Cards数据
+
+        :param recv_cards: 接收的JSON数组
+        :type recv_cards: str
+        :return: Cards数据类
+        :rtype: List[Cards]
+        """
+        get = _FIELDS.get
+        result = []
+        for data_dict in json.loads(recv_cards):
+            level = data_dict.get('level')
+            cards = get((data_dict.get('pattern'), tuple(level) if isinstance(level, list) else level)) \
+                if len(data_dict) == 2 else None
+            if cards is None:
+                data_dict['pattern'] = Pattern[data_dict['pattern']]
+                cards = Cards(**data_dict)
+            result.append(cards)
+        return result
@@ -19,8 +19,11 @@ import sys
 import asyncio
 import pygame
 import json
+from cards_evaluator import Evaluator
+from cards_hand import Hand
 from cards_identifier import Identifier
 from cards_judger import Judger
+from protocol import HELLO, VERSION, BID_VERSION, Op, TextCodec, BinaryCodec, mask_to_cards
 from ui_component import *
 
 from logger import Logger
@@ -34,6 +37,8 @@ ID = 0
 IDENTITY = 0
 CARD_QUEUE : List[Optional[Tuple[int, int]]] = []
 LORD_QUEUE : List[Optional[Tuple[int, int]]] = []
+BID_HINT = 0 # 叫分提示(按手牌强度)
+BID_CHOICES : List[int] = [] # 轮到自己叫分时可选的分数(0为不叫)，为空时不显示叫分界面
 
 # 运行路径初始化
 if getattr(sys, 'frozen', False):
@@ -58,7 +63,7 @@ def welcome_screen(surface: pygame.Surface, ui_main : "UIMain", sk_main : "Socke
         """
         start_button绑定的方法
         """
-        asyncio.create_task(sk_main.send("1")) # -> server.server._client_run
+        asyncio.create_task(sk_main.ready()) # -> server.server._client_run
         ui_main.switch_surfunc(waiting_screen)
 
     if ui_main.interactors_emp:# 交互组件事件注册
@@ -159,6 +164,57 @@ def game_screen(surface: pygame.Surface, ui_main : "UIMain", sk_main : "SocketMa
         waiting_text.draw(surface)
         return
 
+    if BID_CHOICES:
+        bid_prompt(surface, ui_main, sk_main)
+
+def bid_prompt(surface: pygame.Surface, ui_main : "UIMain", sk_main : "SocketMain") -> None:
+    """
+    叫分界面: 列出可选的叫分，并按手牌强度给出建议，由玩家自己选择
+
+    :param surface: pygame主窗口
+    :type surface: pygame.Surface
+    :param ui_main: UI绘制类
+    :type ui_main: UIMain
+    :param sk_main: 异步通信类
+    :type sk_main: SocketMain
+    """
+    def bid_buttons_job(score : int) -> Callable[[InteractorArea], None]:
+        """
+        生成叫分按钮绑定的方法
+
+        :param score: 按钮对应的叫分
+        :type score: int
+        :return: 绑定的方法
+        :rtype: Callable[[InteractorArea], None]
+        """
+        def job(_button : InteractorArea):
+            BID_CHOICES.clear()
+            ui_main.clear_interactors()
+            asyncio.create_task(sk_main.send_op(Op.BID, score)) # -> server.server.Table._ask_bid
+        return job
+
+    if ui_main.interactors_emp:# 交互组件事件注册
+        for i, score in enumerate(BID_CHOICES):
+            bid_button = BUTTONFACTORY.construct((400 + i * 130, 400),
+                                                 (110, 50),
+                                                 Text(f"{score}分" if score else "不叫",
+                                                      "src\\fonts\\MicrosoftYaHei.ttf",
+                                                      18
+                                                      ),
+                                                 border = Border(Color(0, 0, 0), 2 if score == BID_HINT else 1)
+                                                 )
+            bid_button.bind(bid_buttons_job(score))
+            ui_main.add_interactors(bid_button)
+    # 叫分建议载入
+    LABELFACTORY.construct(Text(f"建议: {BID_HINT}分" if BID_HINT else "建议: 不叫",
+                                "src\\fonts\\MicrosoftYaHei.ttf",
+                                24
+                                ),
+                           (500, 330),
+                           (280, 50),
+                           bg_apparent = True
+                           ).draw(surface)
+
 # 客户端主程序
 TESTADDR = ("127.0.0.1", 8888)
 
@@ -280,6 +336,8 @@ class SocketMain():
     """
     id = "0"
     _ui_main : Optional[UIMain]
+    _RETRIES = 5        # 对局中断线后的重连次数
+    _RETRY_DELAY = 1.0  # 重连间隔(秒)，总时长应小于服务器保留座位的时限
 
     def __init__(self, addr : Tuple[str, int]):
         self._addr = addr
@@ -288,6 +346,11 @@ class SocketMain():
         self._reader : Optional[asyncio.StreamReader] = None
         self._writer : Optional[asyncio.StreamWriter] = None
         self._connected : bool = False
+        self._binary : bool = False # 协商后是否使用二进制协议
+        self._version : int = 0     # 协商的二进制协议版本
+        self._negotiated = asyncio.Event() # 协商结束(收到应答或超时退回文本协议)
+        self._token : str = ""      # 服务器签发的会话令牌，断线重连时出示
+        self._ingame : bool = False # 是否已开局(开局后断线才需要重连)
 
     def set_ui(self, ui_main : UIMain) -> None:
         """
@@ -367,12 +430,14 @@ class SocketMain():
         while True:
             try:
                 msg = await self._sendmsg.get()
-                Logger.write(f"Message '{msg}' ready to be sent.", t = "TRACE", thread = "send_task/self._send")
+                if Logger.enabled("TRACE"):
+                    Logger.write(f"Message '{msg}' ready to be sent.", t = "TRACE", thread = "send_task/self._send")
 
                 if self._writer and not self._writer.is_closing():
-                    self._writer.write(msg.encode('utf-8'))
+                    self._writer.write(msg)
                     await self._writer.drain()
-                    Logger.write(f"Message {msg} has been sent.", t = "TRACE", thread = "send_task/self._send")
+                    if Logger.enabled("TRACE"):
+                        Logger.write(f"Message {msg} has been sent.", t = "TRACE", thread = "send_task/self._send")
                 else:
                     Logger.write(f'Writer failed, plz check the status of self._writer.', t = "WARN", thread = "send_task/self._send")
 
@@ -394,18 +459,38 @@ class SocketMain():
 
         while True:
             try:
+                if self._binary and self._reader:
+                    frame = await BinaryCodec.read(self._reader)
+                    if Logger.enabled("TRACE"):
+                        Logger.write(f'frame : {frame} received',
+                                     t = "TRACE",
+                                     thread = "listen_task/self._listen")
+                    await self._listenmsg.put(frame)
+                    continue
+
                 data = b''
                 if self._reader:
                     data = await self._reader.readuntil(b'\n')
 
                 msg = data.decode("utf-8").strip()
 
+                if msg.startswith(HELLO + " "): # <- server.server.Table.ack，此后切换协议
+                    ack = msg.split()
+                    self._version = int(ack[1])
+                    self._binary = self._version > 0
+                    if len(ack) == 4: # 二进制协议附带会话令牌与(重连时迁回的)座位号
+                        self._token = ack[2]
+                        self.id = ack[3]
+                    self._negotiated.set()
+                    continue
+
                 if msg == "":
                     await asyncio.sleep(0.1)
                     continue
-                Logger.write(f'msg : "{msg}" received',
-                             t = "TRACE",
-                             thread = "listen_task/self._listen")
+                if Logger.enabled("TRACE"):
+                    Logger.write(f'msg : "{msg}" received',
+                                 t = "TRACE",
+                                 thread = "listen_task/self._listen")
 
                 await self._listenmsg.put(msg)
 
@@ -443,7 +528,27 @@ class SocketMain():
         :param msg: 要发送的消息
         :type msg: str
         """
-        await self._sendmsg.put(str(self.id) + " " + msg + '\n')
+        await self._sendmsg.put((str(self.id) + " " + msg + '\n').encode("utf-8"))
+
+    async def send_op(self, op : Op, *args : int) -> None:
+        """
+        按协商的协议编码消息并送入发送序列
+
+        :param op: 操作码
+        :type op: Op
+        """
+        if self._binary:
+            await self._sendmsg.put(BinaryCodec.encode(op, *args))
+        else:
+            await self._sendmsg.put(TextCodec.encode(op, int(self.id), *args))
+
+    async def ready(self) -> None:
+        """
+        发送准备消息，协商结束前等待，以免在应答到达前以文本协议发出
+
+        """
+        await self._negotiated.wait()
+        await self.send_op(Op.READY)
 
     async def _run(self) -> None:
         """
@@ -464,26 +569,125 @@ class SocketMain():
         self.id = connect_status
         Logger.write(f"Connected successfully, id is {id}.", thread = "game_task/self._run")
 
-        ifbegin = await self.recv() # <- server.server._game_run
+        # 协商二进制协议，服务器不支持时退回文本协议；断线重连时出示会话令牌
+        token = self._token
+        await self.send(f"{HELLO} {VERSION} {token}".rstrip()) # -> server.server.Table.hello
+        try:
+            await asyncio.wait_for(self._negotiated.wait(), timeout = 1)
+        except asyncio.TimeoutError:
+            Logger.write("Protocol negotiation timeout, use text protocol.", t = "WARN", thread = "game_task/self._run")
+            self._negotiated.set()
 
-        if ifbegin:
-            if ifbegin != "b":
+        if token and self._token == token: # 服务器接受了令牌，以快照恢复牌局
+            ID = int(self.id)
+            op, args = await self._listenmsg.get() # <- server.server.Table.resume_run
+            if op != Op.SNAPSHOT:
+                return
+            _seat, lord, _turn, _last_seat, _last, hand, lords = args
+            CARD_QUEUE = mask_to_cards(hand)
+            Logger.write(f"Game resumed at seat {ID}.", thread = "game_task/self._run")
+            if self._ui_main:
+                self._ui_main.switch_surfunc(game_screen)
+            if lord or self._version < BID_VERSION:
+                LORD_QUEUE = mask_to_cards(lords)
+                IDENTITY = int(lord == ID)
                 return
+            # 叫分尚未结束(快照中没有地主)，回到叫分阶段，之后与正常开局相同
+            await self._bid()
+        elif not await self._begin():
+            return
+
+        if self._binary:
+            LORD_QUEUE = mask_to_cards((await self._listenmsg.get())[1][0]) # <- server.server.Table.client_run
+            IDENTITY = (await self._listenmsg.get())[1][0] # <- server.server.Table.client_run
+            CARD_QUEUE = mask_to_cards((await self._listenmsg.get())[1][0]) # <- server.server.Table.client_run
+        else:
+            LORD_QUEUE = json.loads(await self.recv()) # <- server.server.Table.client_run
+            IDENTITY = int(await self.recv()) # <- server.server.Table.client_run
+            CARD_QUEUE = json.loads(await self.recv()) # <- server.server.Table.client_run
+        self._ingame = True
+
+    async def _begin(self) -> bool:
+        """
+        等待开局，支持叫分时随后进入叫分阶段
 
-        Logger.write("Game started.", t = "TRACE", thread = "game_task/self._run")
+        :return: 是否开局
+        :rtype: bool
+        """
+        if self._binary:
+            op, _ = await self._listenmsg.get() # <- server.server.Table._game_run
+            if op != Op.BEGIN:
+                return False
+        else:
+            ifbegin = await self._listenmsg.get() # <- server.server.Table._game_run
+            if ifbegin != "b":
+                return False
+
+        Logger.write("Game started.", t = "TRACE", thread = "game_task/self._begin")
         if self._ui_main:
             self._ui_main.switch_surfunc(game_screen)
 
-        LORD_QUEUE = json.loads(await self.recv()) # <- server.server._client_run
-        IDENTITY = int(await self.recv()) # <- serevr.Server._client_run
-        CARD_QUEUE = json.loads(await self.recv()) # <- server.server._client_run
+        if self._version >= BID_VERSION:
+            await self._bid()
+        return True
+
+    async def _bid(self) -> None:
+        """
+        叫分阶段: 先收到17张手牌，再按叫分消息轮流叫分，三家都不叫时重新发牌；
+        轮到自己时显示叫分界面，由玩家选择(超时由服务器代叫，随后的叫分消息会收起界面)
+
+        """
+        global CARD_QUEUE, BID_HINT
+        hand = Hand(CARD_QUEUE) # 重连时手牌来自快照
+        highest = 0
+        while True:
+            op, args = await self._listenmsg.get() # <- server.server.Table._deal/_bid_run
+            if op == Op.HAND:
+                CARD_QUEUE = mask_to_cards(args[0])
+                hand = Hand(CARD_QUEUE)
+            elif op == Op.REDEAL:
+                Logger.write("Nobody bids, redeal.", thread = "game_task/self._bid")
+                highest = 0
+            elif op == Op.BID:
+                _seat, score, bidder = args
+                highest = max(highest, score)
+                if BID_CHOICES and self._ui_main: # 已叫分或超时代叫
+                    BID_CHOICES.clear()
+                    self._ui_main.clear_interactors()
+                if bidder == ID:
+                    BID_HINT = Evaluator.bid(hand, highest)
+                    BID_CHOICES.extend([0] + list(range(highest + 1, 4)))
+                elif not bidder and highest: # 叫分结束，随后是地主牌、身份与完整的手牌
+                    return
 
     async def start(self) -> None:
         """
-        socket总逻辑管理
+        socket总逻辑管理，对局中断线时凭会话令牌重连
+
+        """
+        retries = self._RETRIES
+        while True:
+            try:
+                await self._session()
+                return
+            except (asyncio.IncompleteReadError, ConnectionError, OSError) as e:
+                if not (self._token and self._ingame) or retries <= 0:
+                    raise
+                retries -= 1
+                Logger.write(f"Connection lost: {e}, resume in {self._RETRY_DELAY}s.", t = "WARN", thread = "SOCKET_MAIN")
+                await asyncio.sleep(self._RETRY_DELAY)
+
+    async def _session(self) -> None:
+        """
+        单次连接的socket逻辑
 
         """
         send_task = listen_task = game_task = None
+        self._listenmsg = asyncio.Queue()
+        self._sendmsg = asyncio.Queue()
+        self._binary = False
+        self._version = 0
+        self._negotiated.clear()
         try:
             Logger.write("Socket starts", thread = "SOCKET_MAIN")
 
@@ -0,0 +1,396 @@
+"""
+无界面机器人客户端压测工具，包含了：
++ 与SocketMain相同协议(二进制协商/文本回退)的机器人连接
++ 成批建立连接、按牌桌打完整局
++ 连接速率、消息吞吐与各类消息往返延迟的百分位统计(JSON输出)
+"""
+# pylint: disable=R0902
+# pylint: disable=W0718
+# 抑制警告：
+# + R0902:实例属性过多。
+# + W0718:过于宽松的except异常捕获。
+from typing import Dict, List, Optional
+import argparse
+import asyncio
+import json
+import sys
+import time
+from cards_evaluator import Evaluator
+from cards_hand import Hand
+from protocol import HELLO, VERSION, BID_VERSION, Op, TextCodec, BinaryCodec, mask_to_cards, cards_to_mask
+
+# -*- encoding: utf-8 -*-
+
+class Metrics:
+    """
+    压测统计类
+    """
+    def __init__(self):
+        self.connected = 0
+        self.refused = 0
+        self.errors = 0
+        self.stalled = 0
+        self.games = 0
+        self.sent = 0
+        self.received = 0
+        self.latency : Dict[str, List[float]] = {}
+
+    def record(self, kind : str, seconds : float) -> None:
+        """
+        记录一次往返延迟
+
+        :param kind: 消息类型
+        :type kind: str
+        :param seconds: 往返耗时(秒)
+        :type seconds: float
+        """
+        self.latency.setdefault(kind, []).append(seconds)
+
+    @staticmethod
+    def _percentile(data : List[float], q : float) -> float:
+        """
+        最近秩法百分位数
+
+        :param data: 已排序的数据
+        :type data: List[float]
+        :param q: 百分位(0~100)
+        :type q: float
+        :return: 百分位数
+        :rtype: float
+        """
+        return data[min(len(data) - 1, max(0, int(round(q / 100 * len(data))) - 1))]
+
+    def report(self, config : Dict, connect_time : float, elapsed : float) -> Dict:
+        """
+        生成可比较的统计结果
+
+        :param config: 压测参数
+        :type config: Dict
+        :param connect_time: 建立全部连接的耗时(秒)
+        :type connect_time: float
+        :param elapsed: 压测总耗时(秒)
+        :type elapsed: float
+        :return: 统计结果
+        :rtype: Dict
+        """
+        latency = {}
+        for kind, data in sorted(self.latency.items()):
+            data.sort()
+            latency[kind] = {
+                "count": len(data),
+                "p50_ms": round(self._percentile(data, 50) * 1000, 3),
+                "p95_ms": round(self._percentile(data, 95) * 1000, 3),
+                "p99_ms": round(self._percentile(data, 99) * 1000, 3),
+                "max_ms": round(data[-1] * 1000, 3)
+            }
+        return {
+            "config": config,
+            "elapsed_s": round(elapsed, 3),
+            "connections": self.connected,
+            "refused": self.refused,
+            "errors": self.errors,
+            "stalled": self.stalled,
+            "connect_rate": round(self.connected / connect_time, 1) if connect_time else 0.0,
+            "games": self.games,
+            "messages": self.sent + self.received,
+            "messages_per_sec": round((self.sent + self.received) / elapsed, 1) if elapsed else 0.0,
+            "latency": latency
+        }
+
+class Bot:
+    """
+    机器人客户端：领出时出最小的单张，跟牌时能压过单张则出最小的大牌，否则不出
+    """
+    def __init__(self, addr : str, port : int, metrics : Metrics, pace : float, binary : bool):
+        """
+        初始化机器人
+
+        :param addr: 服务器地址
+        :type addr: str
+        :param port: 服务器端口
+        :type port: int
+        :param metrics: 统计对象
+        :type metrics: Metrics
+        :param pace: 每次出牌前的思考时间(秒)
+        :type pace: float
+        :param binary: 是否协商二进制协议
+        :type binary: bool
+        """
+        self._addr = addr
+        self._port = port
+        self._metrics = metrics
+        self._pace = pace
+        self._binary = binary
+        self._version = 0
+        self._reader : Optional[asyncio.StreamReader] = None
+        self._writer : Optional[asyncio.StreamWriter] = None
+        self.seat = 0
+        self._hand : List[List[int]] = []
+
+    async def connect(self) -> bool:
+        """
+        建立连接并取得座位号、协商协议
+
+        :return: 是否成功入座
+        :rtype: bool
+        """
+        start = time.perf_counter()
+        self._reader, self._writer = await asyncio.open_connection(self._addr, self._port)
+        seat = (await self._reader.readuntil(b'\n')).decode("utf-8").strip()
+        self._metrics.received += 1
+        if seat == "f":
+            self._metrics.refused += 1
+            self._writer.close()
+            return False
+        self._metrics.record("seat", time.perf_counter() - start)
+        self._metrics.connected += 1
+        self.seat = int(seat)
+
+        if self._binary:
+            start = time.perf_counter()
+            self._writer.write(f"{self.seat} {HELLO} {VERSION}\n".encode("utf-8"))
+            self._metrics.sent += 1
+            ack = (await self._reader.readuntil(b'\n')).decode("utf-8").split()
+            self._metrics.received += 1
+            self._metrics.record("hello", time.perf_counter() - start)
+            self._version = int(ack[1])
+            self._binary = self._version > 0
+        return True
+
+    def _send(self, op : Op, *args : int) -> None:
+        """
+        按协商的协议发送消息
+
+        :param op: 操作码
+        :type op: Op
+        """
+        if self._binary:
+            data = BinaryCodec.encode(op, *args)
+        else:
+            data = TextCodec.encode(op, self.seat, *args)
+        if self._writer:
+            self._writer.write(data)
+        self._metrics.sent += 1
+
+    async def _recv(self) -> tuple:
+        """
+        读取一条消息，统一为(操作码, 参数)
+
+        :return: (操作码, 参数)
+        :rtype: tuple
+        """
+        assert self._reader
+        if self._binary:
+            frame = await BinaryCodec.read(self._reader)
+            self._metrics.received += 1
+            return frame
+        line = (await self._reader.readuntil(b'\n')).decode("utf-8").strip()
+        self._metrics.received += 1
+        if line == "b":
+            return Op.BEGIN, ()
+        if line.startswith("w "):
+            return Op.WIN, (int(line[2:]),)
+        if line.startswith("r "):
+            return Op.REJECT, (cards_to_mask(json.loads(line[2:])),)
+        head, _, payload = line.partition(" ")
+        if payload:
+            return Op.PLAY, (int(head), cards_to_mask(json.loads(payload)))
+        return Op.IDENTITY, (int(head),)
+
+    async def _recv_cards(self) -> int:
+        """
+        文本协议下的地主牌/手牌是裸JSON行，单独解析
+
+        :return: 牌组掩码
+        :rtype: int
+        """
+        assert self._reader
+        if self._binary:
+            return (await self._recv())[1][0]
+        line = await self._reader.readuntil(b'\n')
+        self._metrics.received += 1
+        return cards_to_mask(json.loads(line))
+
+    def _choose(self, last : int) -> int:
+        """
+        选择出牌
+
+        :param last: 需要压过的上一手牌(0即为领出)
+        :type last: int
+        :return: 出牌掩码(0为不出)
+        :rtype: int
+        """
+        hand = sorted(self._hand, key = lambda c: c[1])
+        if not last:
+            return cards_to_mask([hand[0]])
+        cards = mask_to_cards(last)
+        if len(cards) == 1:
+            for i in hand:
+                if i[1] > cards[0][1]:
+                    return cards_to_mask([i])
+        return 0
+
+    async def _bid(self) -> None:
+        """
+        叫分阶段: 按手牌强度叫分，直到叫分结束(三家都不叫时会重新发牌)
+        """
+        hand = Hand()
+        highest = 0
+        pending : Optional[float] = None
+        while True:
+            op, args = await self._recv()
+            if op == Op.HAND:
+                hand = Hand.from_mask(args[0])
+            elif op == Op.REDEAL:
+                highest = 0
+            elif op == Op.BID:
+                seat, score, bidder = args
+                highest = max(highest, score)
+                if seat == self.seat and pending is not None:
+                    self._metrics.record("bid", time.perf_counter() - pending)
+                    pending = None
+                if bidder == self.seat:
+                    pending = time.perf_counter()
+                    self._send(Op.BID, Evaluator.bid(hand, highest))
+                elif not bidder and highest:
+                    return
+
+    async def play(self) -> None:
+        """
+        准备并打完一整局
+        """
+        self._send(Op.READY)
+        op, _ = await self._recv()
+        if op != Op.BEGIN:
+            raise ValueError(f"Expect BEGIN, got {op}.")
+        if self._version >= BID_VERSION:
+            await self._bid()
+        await self._recv_cards() # 地主牌
+        if self._binary:
+            identity = (await self._recv())[1][0]
+        else:
+            assert self._reader
+            identity = int(await self._reader.readuntil(b'\n'))
+            self._metrics.received += 1
+        self._hand = mask_to_cards(await self._recv_cards())
+
+        turn = self.seat if identity else 0 # 非地主在看到第一手牌前不知道轮到谁
+        last, last_seat = 0, 0
+        pending : Optional[float] = None
+        pending_kind = ""
+        while True:
+            if turn == self.seat and pending is None:
+                if self._pace:
+                    await asyncio.sleep(self._pace)
+                mask = self._choose(last if last_seat != self.seat else 0)
+                pending_kind = "play" if mask else "pass"
+                pending = time.perf_counter()
+                self._send(Op.PLAY, mask)
+
+            op, args = await self._recv()
+            if op == Op.WIN:
+                self._metrics.games += args[0] == self.seat
+                return
+            if op == Op.REJECT:
+                raise ValueError(f"Play {mask_to_cards(args[0])} rejected.")
+            if op != Op.PLAY:
+                continue
+            seat, mask = args
+            if seat == self.seat and pending is not None:
+                self._metrics.record(pending_kind, time.perf_counter() - pending)
+                pending = None
+                played = mask_to_cards(mask)
+                self._hand = [i for i in self._hand if i not in played]
+            if mask:
+                last, last_seat = mask, seat
+            turn = seat % 3 + 1
+
+    def close(self) -> None:
+        """
+        关闭连接
+        """
+        if self._writer:
+            self._writer.close()
+
+async def run_bot(bot : Bot, metrics : Metrics, connected : asyncio.Event, rounds : int, timeout : float) -> None:
+    """
+    单个机器人的生命周期
+
+    :param bot: 机器人
+    :type bot: Bot
+    :param metrics: 统计对象
+    :type metrics: Metrics
+    :param connected: 全部连接建立后才开始准备，使各牌桌同时开局
+    :type connected: asyncio.Event
+    :param rounds: 每个机器人打的局数(每局结束后服务器会断开连接，需重连)
+    :type rounds: int
+    :param timeout: 单局时限(多工作进程时连接可能被分到凑不满的牌桌上)
+    :type timeout: float
+    """
+    for i in range(rounds):
+        try:
+            if not await bot.connect():
+                return
+            if i == 0:
+                await connected.wait()
+            await asyncio.wait_for(bot.play(), timeout)
+        except asyncio.TimeoutError:
+            metrics.stalled += 1
+            return
+        except Exception:
+            metrics.errors += 1
+            return
+        finally:
+            bot.close()
+
+async def main(opts : argparse.Namespace) -> Dict:
+    """
+    压测主程序
+
+    :param opts: 命令行参数
+    :type opts: argparse.Namespace
+    :return: 统计结果
+    :rtype: Dict
+    """
+    if opts.clients % 3:
+        opts.clients -= opts.clients % 3
+        print(f"Clients rounded down to {opts.clients} to fill whole tables.", file = sys.stderr)
+    metrics = Metrics()
+    connected = asyncio.Event()
+    start = time.perf_counter()
+    tasks = []
+    for i in range(opts.clients):
+        bot = Bot(opts.addr, opts.port, metrics, opts.pace, not opts.text)
+        tasks.append(asyncio.create_task(run_bot(bot, metrics, connected, opts.rounds, opts.timeout)))
+        if opts.rate and i % opts.rate == opts.rate - 1:
+            await asyncio.sleep(1)
+    while metrics.connected + metrics.refused + metrics.errors < opts.clients:
+        await asyncio.sleep(0.01)
+        if all(t.done() for t in tasks):
+            break
+    connect_time = time.perf_counter() - start
+    connected.set()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    config = {k: v for k, v in vars(opts).items() if k != "output"}
+    return metrics.report(config, connect_time, elapsed)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Karten headless load tester")
+    parser.add_argument("--addr", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 8888)
+    parser.add_argument("-c", "--clients", type = int, default = 300, help = "concurrent bot connections (3 per table)")
+    parser.add_argument("--rate", type = int, default = 0, help = "new connections per second (0 = all at once)")
+    parser.add_argument("--pace", type = float, default = 0.0, help = "think time before each play in seconds")
+    parser.add_argument("--rounds", type = int, default = 1, help = "games played by every bot")
+    parser.add_argument("--timeout", type = float, default = 60.0, help = "give up a game after this many seconds")
+    parser.add_argument("--text", action = "store_true", help = "use the legacy text protocol")
+    parser.add_argument("-o", "--output", default = "", help = "write the JSON report to this file")
+    args = parser.parse_args()
+    result = asyncio.run(main(args))
+    if args.output:
+        with open(args.output, "w", encoding = "utf-8") as f:
+            json.dump(result, f, indent = 2)
+    else:
+        json.dump(result, sys.stdout, indent = 2)
+        print()
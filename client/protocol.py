@@ -0,0 +1,202 @@
+"""
+客户端与服务器之间的通信协议，包括:
++ 掩码的校验(牌组与54位掩码的互相转换见cards_hand)
++ 旧版换行分隔文本协议的编解码
++ 长度前缀二进制协议的编解码
+"""
+# pylint: disable=R0911
+# 抑制警告：
+# + R0911:return语句过多。
+from enum import IntEnum
+from typing import Tuple, Any
+import asyncio
+import json
+import struct
+from cards_hand import cards_to_mask, mask_to_cards
+
+# -*- encoding: utf-8 -*-
+
+# NOTE: 本文件在client与server下各有一份，修改时需保持两份一致。
+
+VERSION = 2 # 当前支持的最高二进制协议版本
+BID_VERSION = 2 # 支持叫分消息的最低版本，更低版本与文本协议的座位由服务器按手牌强度代为叫分
+HELLO = "v" # 协商请求/应答的标记: 客户端发送"<id> v <版本> [令牌]"，服务器应答"v <版本> <令牌> <座位号>"(版本0为退回文本协议，只应答"v 0")
+
+MASK_BYTES = 7 # 54位掩码占用的字节数
+
+_HEADER = struct.Struct(">H") # 帧长度(不含自身)
+
+class Op(IntEnum):
+    """
+    二进制协议操作码
+    """
+    READY = 1       # C->S 准备
+    BEGIN = 2       # S->C 开局
+    LORDS = 3       # S->C 地主牌(掩码)
+    IDENTITY = 4    # S->C 身份(1为地主)
+    HAND = 5        # S->C 手牌(掩码)
+    PLAY = 6        # C->S 出牌(掩码，0为不出); S->C 座位号 + 掩码
+    WIN = 7         # S->C 赢家座位号
+    REJECT = 8      # S->C 出牌被拒绝(被拒绝的掩码)
+    SNAPSHOT = 9    # S->C 断线重连后的牌局快照(见BinaryCodec.encode)
+    BID = 10        # C->S 叫分(0为不叫，1~3); S->C 叫分的座位号(0为开始叫分) + 叫分 + 下一个叫分的座位号(0为叫分结束)
+    REDEAL = 11     # S->C 三家都不叫，重新发牌(随后是新的手牌与叫分)
+
+_PAYLOAD = { # 各操作码允许的负载字节数
+    Op.READY: (0,), Op.BEGIN: (0,), Op.REDEAL: (0,),
+    Op.LORDS: (MASK_BYTES,), Op.HAND: (MASK_BYTES,), Op.REJECT: (MASK_BYTES,),
+    Op.IDENTITY: (1,), Op.WIN: (1,),
+    Op.BID: (1, 3),
+    Op.PLAY: (MASK_BYTES, MASK_BYTES + 1),
+    Op.SNAPSHOT: (4 + 3 * MASK_BYTES,)
+    }
+
+def check_mask(mask : int) -> int:
+    """
+    校验掩码未越过54位
+
+    :param mask: 掩码
+    :type mask: int
+    :return: 原掩码
+    :rtype: int
+    """
+    if mask >> 54:
+        raise ValueError(f"Invalid card mask {mask:#x}.")
+    return mask
+
+class TextCodec:
+    """
+    旧版换行分隔文本协议编解码单例
+    """
+    @classmethod
+    def encode(cls, op : Op, *args : int) -> bytes:
+        """
+        把消息编码为一行文本
+
+        :param op: 操作码
+        :type op: Op
+        :return: 以换行结尾的字节串
+        :rtype: bytes
+        """
+        match op:
+            case Op.READY:
+                text = f"{args[0]} 1"
+            case Op.BEGIN:
+                text = "b"
+            case Op.LORDS | Op.HAND:
+                text = json.dumps(mask_to_cards(args[0]))
+            case Op.REJECT:
+                text = "r " + json.dumps(mask_to_cards(args[0]))
+            case Op.IDENTITY:
+                text = "1" if args[0] else "0"
+            case Op.PLAY:
+                text = f"{args[0]} {json.dumps(mask_to_cards(args[1]))}"
+            case Op.WIN:
+                text = f"w {args[0]}"
+            case _:
+                raise ValueError(f"Unknown op {op}.")
+        return (text + '\n').encode("utf-8")
+
+    @classmethod
+    def decode_play(cls, line : bytes) -> int:
+        """
+        解析客户端的出牌行("客户id JSON牌组")
+
+        :param line: 一行文本
+        :type line: bytes
+        :return: 出牌掩码
+        :rtype: int
+        """
+        payload = line.decode("utf-8").strip().partition(" ")[2]
+        cards = json.loads(payload) if payload else []
+        if not isinstance(cards, list):
+            raise ValueError(f"Invalid play {payload}.")
+        return cards_to_mask(cards)
+
+class BinaryCodec:
+    """
+    长度前缀二进制协议编解码单例
+
+    帧格式: 2字节大端长度 + 1字节操作码 + 负载，掩码固定7字节
+    SNAPSHOT负载: 座位号、地主座位号、当前出牌座位号、最后出牌座位号各1字节 + 最后一手牌、手牌、地主牌掩码
+    BID负载: C->S 叫分1字节; S->C 座位号、叫分、下一个叫分的座位号各1字节
+    """
+    @classmethod
+    def encode(cls, op : Op, *args : int) -> bytes:
+        """
+        把消息编码为一帧
+
+        :param op: 操作码
+        :type op: Op
+        :return: 完整的帧
+        :rtype: bytes
+        """
+        match op:
+            case Op.READY | Op.BEGIN | Op.REDEAL:
+                payload = b''
+            case Op.LORDS | Op.HAND | Op.REJECT:
+                payload = args[0].to_bytes(MASK_BYTES, "big")
+            case Op.IDENTITY | Op.WIN:
+                payload = bytes((args[0],))
+            case Op.BID:
+                payload = bytes(args[:3])
+            case Op.PLAY:
+                if len(args) == 1: # C->S 不带座位号
+                    payload = args[0].to_bytes(MASK_BYTES, "big")
+                else:
+                    payload = bytes((args[0],)) + args[1].to_bytes(MASK_BYTES, "big")
+            case Op.SNAPSHOT:
+                payload = bytes(args[:4]) + b''.join(i.to_bytes(MASK_BYTES, "big") for i in args[4:7])
+            case _:
+                raise ValueError(f"Unknown op {op}.")
+        return _HEADER.pack(len(payload) + 1) + bytes((op,)) + payload
+
+    @classmethod
+    def decode(cls, frame : bytes) -> Tuple[Op, Tuple[Any, ...]]:
+        """
+        解析一帧(不含长度前缀)，空帧、未知操作码或负载长度不符时抛出ValueError
+
+        :param frame: 操作码 + 负载
+        :type frame: bytes
+        :return: (操作码, 参数)
+        :rtype: Tuple[Op, Tuple[Any, ...]]
+        """
+        if not frame:
+            raise ValueError("Empty frame.")
+        op = Op(frame[0])
+        payload = frame[1:]
+        if len(payload) not in _PAYLOAD[op]:
+            raise ValueError(f"Invalid payload size {len(payload)} for {op.name}.")
+        match op:
+            case Op.READY | Op.BEGIN | Op.REDEAL:
+                return op, ()
+            case Op.LORDS | Op.HAND | Op.REJECT:
+                return op, (check_mask(int.from_bytes(payload, "big")),)
+            case Op.IDENTITY | Op.WIN:
+                return op, (payload[0],)
+            case Op.BID:
+                return op, tuple(payload)
+            case Op.PLAY:
+                if len(payload) == MASK_BYTES:
+                    return op, (check_mask(int.from_bytes(payload, "big")),)
+                return op, (payload[0], check_mask(int.from_bytes(payload[1:], "big")))
+            case Op.SNAPSHOT:
+                masks = tuple(
+                    check_mask(int.from_bytes(payload[i:i + MASK_BYTES], "big"))
+                    for i in range(4, 4 + 3 * MASK_BYTES, MASK_BYTES)
+                    )
+                return op, tuple(payload[:4]) + masks
+        raise ValueError(f"Unknown op {op}.")
+
+    @classmethod
+    async def read(cls, reader : asyncio.StreamReader) -> Tuple[Op, Tuple[Any, ...]]:
+        """
+        从网络输入流读取并解析一帧
+
+        :param reader: 网络输入流
+        :type reader: asyncio.StreamReader
+        :return: (操作码, 参数)
+        :rtype: Tuple[Op, Tuple[Any, ...]]
+        """
+        size, = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+        return cls.decode(await reader.readexactly(size))
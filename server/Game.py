@@ -1,65 +1,13 @@
-from random import shuffle, choice
 from enum import Enum
-from typing import List,Dict,Tuple,Optional,Any, cast
+from typing import List,Dict,Tuple,Optional,Any,Union, cast
 from dataclasses import dataclass
+import asyncio
 import time
-# Card id
-CARD = [
-    [0, 1], #->3
-    [0, 2],
-    [0, 3],
-    [0, 4],
-    [0, 5],
-    [0, 6],
-    [0, 7],
-    [0, 8],
-    [0, 9],
-    [0, 10],
-    [0, 11],
-    [0, 12],
-    [0, 13], #->2
-    [1, 1],
-    [1, 2],
-    [1, 3],
-    [1, 4],
-    [1, 5],
-    [1, 6],
-    [1, 7],
-    [1, 8],
-    [1, 9],
-    [1, 10],
-    [1, 11],
-    [1, 12],
-    [1, 13],
-    [2, 1],
-    [2, 2],
-    [2, 3],
-    [2, 4],
-    [2, 5],
-    [2, 6],
-    [2, 7],
-    [2, 8],
-    [2, 9],
-    [2, 10],
-    [2, 11],
-    [2, 12],
-    [2, 13],
-    [3, 1],
-    [3, 2],
-    [3, 3],
-    [3, 4],
-    [3, 5],
-    [3, 6],
-    [3, 7],
-    [3, 8],
-    [3, 9],
-    [3, 10],
-    [3, 11],
-    [3, 12],
-    [3, 13],
-    [4, 14], #小王
-    [4, 15]  #大王
-]
+from cards_data import Pattern, Cards
+from cards_hand import Hand
+from cards_identifier import Identifier
+from cards_judger import Judger
+from cards_dealer import Deal, Dealer
 
 class Suit(Enum):
     HEART = 0
@@ -68,24 +16,42 @@ class Suit(Enum):
     DIAMOND = 3
 
 class Player:
-    _card : List[List[int]]
+    _card : Hand
     def __init__(self, id : str):
         self.id = id
         self._landlord = False
+        self._card = Hand()
 
     def changeChar(self) -> None:
         self._landlord = not self._landlord
 
-    def addCard(self, cards : List[List[int]]|List[int]) -> None:
-        if isinstance(cards[0], List):
-            self._card.extend(cards) # pyright: ignore[reportArgumentType]
+    def addCard(self, cards : List[List[int]]|List[int]|Hand) -> None:
+        if isinstance(cards, Hand):
+            self._card.update(cards)
+        elif isinstance(cards[0], List):
+            for i in cards:
+                self._card.add(i) # pyright: ignore[reportArgumentType]
         else:
-            self._card.append(cards) # pyright: ignore[reportArgumentType]
+            self._card.add(cards) # pyright: ignore[reportArgumentType]
+
+    def clearCard(self) -> None:
+        self._card = Hand()
+
+    def removeCard(self, cards : List[List[int]]|Hand) -> None:
+        if isinstance(cards, Hand):
+            self._card.difference_update(cards)
+        else:
+            for i in cards:
+                self._card.remove(i)
 
     @property
-    def cards(self) -> List[List[int]]:
+    def hand(self) -> Hand:
         return self._card
 
+    @property
+    def cards(self) -> List[List[int]]:
+        return self._card.tolist()
+
     @property
     def cardnum(self) -> int:
         return len(self._card)
@@ -101,8 +67,27 @@ class Game:
     _player : List[Player]
     _ind : List[int]
 
-    def __init__(self):
-        self._ind = [0] * 4
+    def __init__(self, dealer : Optional[Dealer] = None):
+        # 每张牌桌各持有一个Game，所有状态都必须是实例属性，避免牌桌间共享；
+        # 发牌器由牌桌传入以便跨局延续，不传时新建一个随机种子的发牌器
+        self._dealer = dealer if dealer is not None else Dealer()
+        self._deal : Optional[Deal] = None
+        self._start = False
+        self._lords = []
+        self._lords_hand = Hand()
+        self._li = 0
+        self._player = []
+        self._ind = [-1] * 4
+        self._bidder = 0    # 轮到叫分的座位号(叫分结束时为0)
+        self._bid = 0       # 当前最高叫分
+        self._bid_id = ""   # 最高叫分者
+        self._bid_count = 0 # 已叫过的人数
+        self._winner : Optional[Player] = None
+        self._last : Optional[Cards] = None # 桌面上最后一手牌
+        self._last_id : str = ""            # 最后一手牌的出牌者
+        self._last_cards = Hand()
+        self._played = Hand()               # 本局已出过的牌
+        self._finished : Optional[asyncio.Future] = None
 
     @property
     def playerlist(self) -> List[Player]:
@@ -120,6 +105,10 @@ class Game:
     def lordscard(self) -> List[List[int]]:
         return self._lords
 
+    @property
+    def lordshand(self) -> Hand:
+        return self._lords_hand
+
     @property
     def lordsid(self) -> int:
         return self._li
@@ -128,9 +117,18 @@ class Game:
         self._player.append(player)
         self._ind[int(player.id)] = self.playernum - 1
 
+    def removePlayer(self, id : str) -> None:
+        cache = self._ind[int(id)]
+        if cache < 0:
+            return
+        del self._player[cache]
+        self._ind = [-1] * 4
+        for i, p in enumerate(self._player):
+            self._ind[int(p.id)] = i
+
     def searchPlayer(self, id : str) -> Optional[Player]:
         cache = self._ind[int(id)]
-        if cache:
+        if cache >= 0:
             return self._player[cache]
         return None
 
@@ -141,28 +139,120 @@ class Game:
     def istart(self) -> bool:
         return self._start
 
-    def arrangeCards(self) -> List[List[int]]:
-        arrangements = CARD
-        shuffle(arrangements)
-        self._lords = arrangements[51:]
-        return arrangements[:51]
-
-    def arrangeIden(self) -> Optional[Player]:
-        NUM = [1, 2, 3]
-        self._li = choice(NUM)
-        ti = self._ind[self._li]
-        t : Player
-        if ti:
-            t = self._player[ti]
+    def dealCards(self) -> Deal:
+        # 发出一副新牌: 返回三家的17张手牌(掩码)，3张地主牌留在牌局中，叫分结束后再交给地主；
+        # 每副牌(含首个叫分的座位)都可按其种子用cards_dealer.replay重现
+        self._deal = self._dealer.deal()
+        self._lords_hand = Hand.from_mask(self._deal.lords)
+        self._lords = self._lords_hand.tolist()
+        return self._deal
+
+    @property
+    def dealseed(self) -> int:
+        return self._deal.seed if self._deal else 0
+
+    def startBid(self) -> int:
+        # 由这副牌决定首个叫分的座位并开始叫分，三家都不叫、重新发牌后也从这里重新开始
+        if not self._deal:
+            raise ValueError("Cards are not dealt.")
+        self._bidder = self._deal.first
+        self._bid = 0
+        self._bid_id = ""
+        self._bid_count = 0
+        return self._bidder
+
+    @property
+    def bidder(self) -> int:
+        return self._bidder
+
+    @property
+    def bidscore(self) -> int:
+        return self._bid
+
+    def bid(self, id : str, score : int) -> Optional[Player]:
+        # 叫分: 0为不叫，1~3须高于当前最高分；有人叫3分或三家都叫过后叫分结束，最高分者成为地主并返回，
+        # 三家都不叫时返回None且bidder为0，需重新发牌
+        if not self._bidder:
+            raise ValueError("The bidding is over.")
+        if id != str(self._bidder):
+            raise ValueError("Not the player's turn to bid.")
+        if score and not self._bid < score <= 3:
+            raise ValueError(f"Illegal bid {score}.")
+        if score:
+            self._bid = score
+            self._bid_id = id
+        self._bid_count += 1
+        if self._bid < 3 and self._bid_count < 3:
+            self._bidder = self._bidder % 3 + 1
+            return None
+        self._bidder = 0
+        t = self.searchPlayer(self._bid_id) if self._bid else None
         if t:
+            self._li = int(t.id)
             t.changeChar()
         return t
 
+    @property
+    def lastplay(self) -> Optional[Cards]:
+        return self._last
+
+    @property
+    def lastid(self) -> str:
+        return self._last_id
+
+    @property
+    def lastcards(self) -> Hand:
+        return self._last_cards
+
+    @property
+    def playedcards(self) -> Hand:
+        return self._played
+
+    def check(self, id : str, cards : Hand) -> Cards:
+        # 服务器权威校验: 牌必须在手中、牌型合法且大过桌面上他人的最后一手，空牌组即为不出
+        p = self.searchPlayer(id)
+        if p is None:
+            raise IndexError("The player id is not exist.")
+        leading = self._last is None or self._last_id == id
+        if not cards:
+            if leading:
+                raise ValueError("The leading player can't pass.")
+            return Cards(Pattern.NONE)
+        if not p.hand.issuperset(cards):
+            raise ValueError("Cards are not in hand.")
+        pattern = Identifier.identify(cards)
+        if pattern.pattern == Pattern.NONE:
+            raise ValueError("Illegal pattern.")
+        if not leading and Judger.compare(cast(Cards, self._last), pattern) != 2:
+            raise ValueError("The play can't beat the last play.")
+        return pattern
+
+    def play(self, id : str, cards : Union[Hand, List[List[int]]]) -> Optional[Player]:
+        # 出牌时即时判定胜负，出完手牌的玩家即为赢家；列表形式的牌组有重复的牌时报错
+        if not isinstance(cards, Hand):
+            cards = Hand(cards)
+        pattern = self.check(id, cards)
+        p = cast(Player, self.searchPlayer(id))
+        if cards:
+            p.removeCard(cards)
+            self._last = pattern
+            self._last_id = id
+            self._last_cards = cards
+            self._played.update(cards)
+        if p.cardnum == 0 and self._winner is None:
+            self._start = False
+            self._winner = p
+            if self._finished and not self._finished.done():
+                self._finished.set_result(p)
+        return self._winner
+
+    @property
+    def winner(self) -> Optional[Player]:
+        return self._winner
+
     async def isfinished(self) -> Player:
-        a : Player
-        while self._start:
-            for i in self._player:
-                if i and i.cardnum == 0:
-                    self._start = False
-                    a = i
-        return a
+        if self._winner:
+            return self._winner
+        if self._finished is None:
+            self._finished = asyncio.get_running_loop().create_future()
+        return await asyncio.shield(self._finished)
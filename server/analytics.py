@@ -0,0 +1,322 @@
+"""
+对局记录的离线统计工具，包含了：
++ 以生成器流水线逐局读取记录文件(内存映射，不整体载入)
++ 按对局编号区间把各文件分片到进程池
++ 可合并的部分统计(地主胜率、各牌型出现次数、炸弹使用、对局长度、每手用时)，可保存后与其他部分再次合并
+"""
+# pylint: disable=R0902
+# 抑制警告：
+# + R0902:实例属性过多。
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+from cards_data import Pattern
+from cards_hand import Hand
+from cards_identifier import Identifier
+from journal import JournalReader, Record
+
+# -*- encoding: utf-8 -*-
+
+Task = Tuple[str, int, int] # (记录文件, 起始编号, 结束编号)
+
+@lru_cache(maxsize = 1 << 16)
+def _pattern(mask : int) -> Pattern:
+    """
+    出牌的牌型(按掩码缓存，不出为NONE)
+
+    :param mask: 出牌掩码
+    :type mask: int
+    :return: 牌型
+    :rtype: Pattern
+    """
+    if not mask:
+        return Pattern.NONE
+    hand = Hand.from_mask(mask)
+    return Identifier.lookup(hand.signature, len(hand)).pattern
+
+def _quantile(hist : Counter, q : float) -> int:
+    """
+    直方图的分位数
+
+    :param hist: 取值 -> 次数
+    :type hist: Counter
+    :param q: 分位(0~1)
+    :type q: float
+    :return: 取值
+    :rtype: int
+    """
+    total = sum(hist.values())
+    if not total:
+        return 0
+    seen = 0
+    for value in sorted(hist):
+        seen += hist[value]
+        if seen >= q * total:
+            return value
+    return max(hist)
+
+class Stats:
+    """
+    可合并的部分统计
+
+    各项都是计数或直方图，合并即逐项相加，与分片方式、合并顺序无关；
+    每手用时按2的幂分桶(桶k为[2^(k-1), 2^k)毫秒)，分位数给出的是桶的上界。
+    """
+    _FIELDS = ("games", "incomplete", "redeals", "landlord_wins", "plays", "moves", "move_ms",
+               "duration_ms", "bomb_games", "bombs_landlord", "bombs_farmers")
+    _HISTS = ("bids", "bid_wins", "patterns", "lengths", "move_time")
+
+    def __init__(self):
+        self.games = 0          # 局数
+        self.incomplete = 0     # 未计入的不完整记录(没有发牌、叫分或地主)
+        self.redeals = 0        # 三家都不叫而重新发牌的次数
+        self.landlord_wins = 0  # 地主获胜的局数
+        self.plays = 0          # 出牌次数(含不出)
+        self.moves = 0          # 计入用时的出牌次数(不含每局第一手，它包含叫分时间)
+        self.move_ms = 0        # 上述出牌的总用时
+        self.duration_ms = 0    # 对局总时长(从开始叫分起)
+        self.bomb_games = 0     # 出现过炸弹或王炸的局数
+        self.bombs_landlord = 0 # 地主打出的炸弹与王炸
+        self.bombs_farmers = 0  # 农民打出的炸弹与王炸
+        self.bids : Counter = Counter()       # 地主叫分 -> 局数
+        self.bid_wins : Counter = Counter()   # 地主叫分 -> 地主获胜的局数
+        self.patterns : Counter = Counter()   # Pattern -> 出现次数(不出为NONE)
+        self.lengths : Counter = Counter()    # 出牌次数 -> 局数
+        self.move_time : Counter = Counter()  # 用时分桶 -> 次数
+
+    def add(self, record : Record) -> None:
+        """
+        计入一局(不完整的记录只计数，不计入其他各项)
+
+        :param record: 一局的记录
+        :type record: Record
+        """
+        landlord = record.landlord
+        bid = max(record.deals[-1][2], default = 0) if record.deals else 0
+        if not bid or not landlord:
+            self.incomplete += 1
+            return
+        won = record.winner == landlord
+        self.games += 1
+        self.redeals += len(record.deals) - 1
+        self.landlord_wins += won
+        self.bids[bid] += 1
+        self.bid_wins[bid] += won
+        self.plays += len(record.plays)
+        self.lengths[len(record.plays)] += 1
+
+        patterns = self.patterns
+        move_time = self.move_time
+        bombs = 0
+        duration = 0
+        for i, (seat, delta, mask) in enumerate(record.seats()):
+            duration += delta
+            if i:
+                move_time[delta.bit_length()] += 1
+                self.moves += 1
+                self.move_ms += delta
+            pattern = _pattern(mask)
+            patterns[pattern] += 1
+            if pattern in (Pattern.BOMB, Pattern.KK):
+                bombs += 1
+                if seat == landlord:
+                    self.bombs_landlord += 1
+                else:
+                    self.bombs_farmers += 1
+        self.duration_ms += duration
+        self.bomb_games += bombs > 0
+
+    def merge(self, other : "Stats") -> "Stats":
+        """
+        合并另一部分统计(原地)
+
+        :param other: 另一部分统计
+        :type other: Stats
+        :return: 自身
+        :rtype: Stats
+        """
+        for name in self._FIELDS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for name in self._HISTS:
+            getattr(self, name).update(getattr(other, name))
+        return self
+
+    def to_dict(self) -> Dict:
+        """
+        转为可保存为JSON的部分统计
+
+        :return: 部分统计
+        :rtype: Dict
+        """
+        data : Dict = {name: getattr(self, name) for name in self._FIELDS}
+        for name in self._HISTS:
+            data[name] = {(k.name if isinstance(k, Pattern) else str(k)): v for k, v in getattr(self, name).items()}
+        return data
+
+    @classmethod
+    def from_dict(cls, data : Dict) -> "Stats":
+        """
+        由保存的部分统计恢复
+
+        :param data: 部分统计
+        :type data: Dict
+        :return: 部分统计
+        :rtype: Stats
+        """
+        stats = cls()
+        for name in cls._FIELDS:
+            setattr(stats, name, data.get(name, 0)) # 旧版保存的部分统计可能缺少后加的项
+        for name in cls._HISTS:
+            key = Pattern.__getitem__ if name == "patterns" else int
+            getattr(stats, name).update({key(k): v for k, v in data[name].items()})
+        return stats
+
+    def summary(self) -> Dict:
+        """
+        汇总统计
+
+        :return: 统计结果
+        :rtype: Dict
+        """
+        games = self.games or 1
+        shown = self.plays - self.patterns[Pattern.NONE] or 1
+        return {
+            "games": self.games,
+            "incomplete": self.incomplete,
+            "redeals": self.redeals,
+            "landlord_win_rate": round(self.landlord_wins / games, 4),
+            "landlord_win_rate_by_bid": {str(k): round(self.bid_wins[k] / v, 4) for k, v in sorted(self.bids.items())},
+            "patterns": {i.name: self.patterns[i] for i in Pattern},
+            "pattern_share": {i.name: round(self.patterns[i] / shown, 4) for i in Pattern if i != Pattern.NONE},
+            "bombs": {
+                "bombs": self.patterns[Pattern.BOMB],
+                "rockets": self.patterns[Pattern.KK],
+                "per_game": round((self.bombs_landlord + self.bombs_farmers) / games, 3),
+                "games_with_bombs": round(self.bomb_games / games, 4),
+                "by_landlord": self.bombs_landlord,
+                "by_farmers": self.bombs_farmers
+            },
+            "length": {
+                "avg_plays": round(self.plays / games, 2),
+                "p50_plays": _quantile(self.lengths, 0.5),
+                "p90_plays": _quantile(self.lengths, 0.9),
+                "max_plays": max(self.lengths, default = 0),
+                "avg_seconds": round(self.duration_ms / games / 1000, 2)
+            },
+            "move_time_ms": {
+                "avg": round(self.move_ms / (self.moves or 1), 1),
+                "p50_under": 1 << _quantile(self.move_time, 0.5),
+                "p90_under": 1 << _quantile(self.move_time, 0.9),
+                "p99_under": 1 << _quantile(self.move_time, 0.99)
+            }
+        }
+
+def scan(task : Task) -> Iterator[Record]:
+    """
+    流水线的源头: 逐局读出一个分片的记录
+
+    :param task: (记录文件, 起始编号, 结束编号)
+    :type task: Task
+    :return: 各局记录
+    :rtype: Iterator[Record]
+    """
+    path, start, stop = task
+    with JournalReader(path) as reader:
+        yield from reader.records(start, stop)
+
+def analyze(records : Iterable[Record]) -> Stats:
+    """
+    流水线的终点: 把记录逐局计入部分统计
+
+    :param records: 各局记录
+    :type records: Iterable[Record]
+    :return: 部分统计
+    :rtype: Stats
+    """
+    stats = Stats()
+    for i in records:
+        stats.add(i)
+    return stats
+
+def _run_task(task : Task) -> Stats:
+    """
+    工作进程入口: 统计一个分片
+
+    :param task: (记录文件, 起始编号, 结束编号)
+    :type task: Task
+    :return: 部分统计
+    :rtype: Stats
+    """
+    return analyze(scan(task))
+
+def shard(paths : Sequence[str], chunk : int = 20000) -> List[Task]:
+    """
+    按对局编号区间把各记录文件切成分片(只读索引，不解析记录)
+
+    :param paths: 记录文件
+    :type paths: Sequence[str]
+    :param chunk: 每片的局数
+    :type chunk: int
+    :return: 分片
+    :rtype: List[Task]
+    """
+    tasks = []
+    for path in paths:
+        with JournalReader(path) as reader:
+            count = len(reader)
+        tasks += [(path, i, min(i + chunk, count)) for i in range(0, count, chunk)]
+    return tasks
+
+def run(paths : Sequence[str], workers : int = 0, chunk : int = 20000) -> Stats:
+    """
+    并行统计多个记录文件
+
+    :param paths: 记录文件
+    :type paths: Sequence[str]
+    :param workers: 进程数(0即为CPU核数，1为在本进程内运行)
+    :type workers: int
+    :param chunk: 每片的局数
+    :type chunk: int
+    :return: 合并后的统计
+    :rtype: Stats
+    """
+    tasks = shard(paths, chunk)
+    workers = workers or multiprocessing.cpu_count()
+    total = Stats()
+    if workers == 1:
+        for task in tasks:
+            total.merge(_run_task(task))
+        return total
+    with multiprocessing.Pool(workers) as pool:
+        for part in pool.imap_unordered(_run_task, tasks):
+            total.merge(part)
+    return total
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Karten game journal analytics")
+    parser.add_argument("journals", nargs = "*", help = "game journal files")
+    parser.add_argument("-j", "--workers", type = int, default = 0, help = "worker processes (0 = CPU count)")
+    parser.add_argument("--chunk", type = int, default = 20000, help = "games per task sent to a worker")
+    parser.add_argument("--merge", action = "append", default = [], help = "merge a saved partial result")
+    parser.add_argument("--partial", default = "", help = "save the merged partial result to this file")
+    args = parser.parse_args()
+    if not args.journals and not args.merge:
+        parser.error("Expect journal files or partial results to merge.")
+
+    begin = time.perf_counter()
+    result = run(args.journals, args.workers, args.chunk) if args.journals else Stats()
+    for partial in args.merge:
+        with open(partial, encoding = "utf-8") as f:
+            result.merge(Stats.from_dict(json.load(f)))
+    if args.partial:
+        with open(args.partial, "w", encoding = "utf-8") as f:
+            json.dump(result.to_dict(), f)
+    out = result.summary()
+    out["elapsed_s"] = round(time.perf_counter() - begin, 3)
+    json.dump(out, sys.stdout, indent = 2)
+    print()
@@ -0,0 +1,608 @@
+"""
+规则引擎的基准测试与等价性检查工具，包含了：
++ Identifier、Judger、Cards构造、CardsTransfer与发牌在常见与最坏输入下的每秒操作数，与保存的基线比较以发现性能退化
++ 按规则逐条判断、慢而直观的参照牌型识别与参照比较
++ 穷举20张以内的全部点数组合(约5亿种)，把各个优化实现与参照识别逐项比较(按进程池分片)
++ 全部牌型两两之间的比较、强度键与JSON转换的一致性检查
++ 识别与解码路径上Cards对象的内存占用与分配统计
+"""
+# pylint: disable=R0911
+# pylint: disable=R0912
+# pylint: disable=R0914
+# 抑制警告：
+# + R0911:return语句过多。
+# + R0912:分支过多。
+# + R0914:局部变量过多。
+from functools import lru_cache
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+import numpy as np
+from cards_data import Pattern, Cards
+from cards_hand import Hand, RANK_UNIT
+from cards_identifier import Identifier
+from cards_judger import Judger
+from cards_generator import Generator
+from cards_transfer import CardsTransfer
+from cards_batch import Batch
+from cards_dealer import Dealer, bulk, seeds
+
+# -*- encoding: utf-8 -*-
+
+BASELINE = "bench_baseline.json"
+
+_LIMIT = [0] + [4] * 13 + [1, 1] # 一副牌中各点数的张数上限
+_LOW = range(1, 8)      # 穷举时各分片内层循环的点数
+_MID = range(8, 11)     # 各分片中层循环的点数
+_HIGH = range(11, 16)   # 按这些点数的张数分片
+_EXAMPLES = 5           # 每种实现最多记录的不一致样例
+
+Combo = Tuple[int, int, Tuple[int, ...]] # (张数, 签名, 各点数的张数)
+
+def reference(counts : Sequence[int]) -> Cards:
+    """
+    参照牌型识别: 按规则逐条判断，不做任何优化，用于检验各个优化实现
+
+    :param counts: 各点数的张数(下标即点数，长度16)
+    :type counts: Sequence[int]
+    :return: 牌型信息类
+    :rtype: Cards
+    """
+    n = sum(counts)
+    ranks = [r for r in range(1, 16) if counts[r]]
+    if n == 0:
+        return Cards(Pattern.NONE)
+    top = ranks[-1]
+    if n == 1:                                  # 个子
+        return Cards(Pattern.SINGLE, top)
+    if len(ranks) == 1:                         # 对子、三张、炸弹
+        if n == 2:
+            return Cards(Pattern.PAIR, top)
+        if n == 3:
+            return Cards(Pattern.FULLHOUSE, (3, top))
+        return Cards(Pattern.BOMB, top)
+    if ranks == [14, 15]:                       # 王炸
+        return Cards(Pattern.KK)
+
+    trios = [r for r in ranks if counts[r] == 3]
+    others = [r for r in ranks if counts[r] != 3]
+    if n in (4, 5) and len(trios) == 1 and len(others) == 1 and counts[others[0]] == n - 3: # 三带一、三带二
+        return Cards(Pattern.FULLHOUSE, (n, trios[0]))
+
+    consecutive = top - ranks[0] + 1 == len(ranks) and top <= 12 # 点数相连且不含2与王
+    if n >= 5 and consecutive and all(counts[r] == 1 for r in ranks):  # 顺子
+        return Cards(Pattern.STRAIGHT, (n, top))
+    if n >= 6 and consecutive and all(counts[r] == 2 for r in ranks):  # 连对
+        return Cards(Pattern.SPAIRS, (n, top))
+
+    if n >= 6 and trios and 13 not in trios:    # 飞机: 张数恰为3的点数即为三张，不要求相连，2不能作三张
+        scale = len(trios)
+        rest = n - 3 * scale
+        if rest in (0, scale) or (rest == 2 * scale and all(counts[r] == 2 for r in others)):
+            return Cards(Pattern.PLANE, (scale, rest, trios[-1]))
+    return Cards(Pattern.NONE)
+
+def reference_compare(a : Cards, b : Cards) -> int:
+    """
+    参照牌型比较: 按规则逐条判断(返回值与Judger.compare相同)
+
+    :param a: 上家的出牌牌型(非NONE)
+    :type a: Cards
+    :param b: 本家的选择牌型
+    :type b: Cards
+    :return: 比较状态码(0为b的牌型非法;1为上家大,无法打出;2为下家打,可以出牌)
+    :rtype: int
+    """
+    if b.pattern == Pattern.KK:                 # 王炸压过一切
+        return 1 if a.pattern == Pattern.KK else 2
+    if a.pattern == Pattern.KK:
+        return 1
+    if b.pattern == Pattern.BOMB:               # 炸弹压过非炸弹，炸弹之间比点数
+        if a.pattern != Pattern.BOMB or b.level > a.level:
+            return 2
+        return 1
+    if a.pattern == Pattern.BOMB:
+        return 1
+    if b.pattern == Pattern.NONE or a.pattern != b.pattern:
+        return 0
+    if isinstance(a.level, tuple):               # 长度(飞机还有翅膀)须一致，再比最大点数
+        if a.level[:-1] != b.level[:-1]:
+            return 0
+        return 2 if b.level[-1] > a.level[-1] else 1
+    return 2 if b.level > a.level else 1
+
+def patterns(max_cards : int = 20) -> List[Cards]:
+    """
+    按规则列举不超过max_cards张的所有牌型(不含NONE)
+
+    :param max_cards: 张数上限
+    :type max_cards: int
+    :return: 牌型
+    :rtype: List[Cards]
+    """
+    result = [Cards(Pattern.SINGLE, r) for r in range(1, 16)]
+    result += [Cards(Pattern.PAIR, r) for r in range(1, 14)]
+    result += [Cards(Pattern.BOMB, r) for r in range(1, 14)]
+    result.append(Cards(Pattern.KK))
+    result += [Cards(Pattern.FULLHOUSE, (n, r)) for n in (3, 4, 5) for r in range(1, 14)]
+    result += [Cards(Pattern.STRAIGHT, (n, top)) for n in range(5, 13) for top in range(n, 13)]
+    result += [Cards(Pattern.SPAIRS, (2 * n, top)) for n in range(3, 11) for top in range(n, 13)]
+    for scale in range(2, 7):
+        for wing in (0, scale, 2 * scale):
+            if 3 * scale + wing <= max_cards:
+                result += [Cards(Pattern.PLANE, (scale, wing, top)) for top in range(scale, 13)]
+    return result
+
+def _combos(ranks : range) -> List[Combo]:
+    """
+    列举给定点数上的所有张数组合(按张数升序)
+
+    :param ranks: 点数
+    :type ranks: range
+    :return: (张数, 签名, 各点数的张数)
+    :rtype: List[Combo]
+    """
+    combos : List[Combo] = [(0, 0, ())]
+    for rank in ranks:
+        combos = [(size + v, sig + v * RANK_UNIT[rank], counts + (v,))
+                  for size, sig, counts in combos for v in range(_LIMIT[rank] + 1)]
+    combos.sort(key = lambda i: i[0])
+    return combos
+
+@lru_cache(maxsize = None)
+def _inner() -> Tuple[List[Combo], List[Combo], List[int]]:
+    """
+    各分片共用的内层、中层组合(工作进程内只生成一次)
+
+    :return: (内层组合, 中层组合, 内层张数不超过k的组合个数(下标为k))
+    :rtype: Tuple[List[Combo], List[Combo], List[int]]
+    """
+    lows = _combos(_LOW)
+    ends = [sum(1 for i in lows if i[0] <= k) for k in range(21)]
+    return lows, _combos(_MID), ends
+
+def _batch_keys(codes : np.ndarray, levels : np.ndarray) -> np.ndarray:
+    """
+    批量识别结果对应的Cards强度键(与Batch.to_cards(...).key一致)
+
+    :param codes: 牌型码
+    :type codes: np.ndarray
+    :param levels: 大小
+    :type levels: np.ndarray
+    :return: 强度键(int64)
+    :rtype: np.ndarray
+    """
+    code = codes.astype(np.int64)
+    level = levels.astype(np.int64)
+    chain = np.isin(code, (Pattern.STRAIGHT.value, Pattern.FULLHOUSE.value, Pattern.SPAIRS.value, Pattern.PLANE.value))
+    plane = code == Pattern.PLANE.value
+    ranked = ~np.isin(code, (Pattern.NONE.value, Pattern.KK.value))
+    tier = (code == Pattern.BOMB.value) + 2 * (code == Pattern.KK.value)
+    return ((tier << 32) | (code << 24) | (np.where(chain, level[:, 0], 0) << 16)
+            | (np.where(plane, level[:, 1], 0) << 8) | np.where(ranked, level[:, 2], 0))
+
+def _check_block(task : Tuple[Tuple[int, ...], int, Tuple[str, ...]]) -> Tuple[int, Dict[str, List]]:
+    """
+    工作进程入口: 检查高位点数张数固定的一片组合
+
+    :param task: (点数11~15的张数, 张数上限, 要检查的实现)
+    :type task: Tuple[Tuple[int, ...], int, Tuple[str, ...]]
+    :return: (检查的组合数, 各实现的(不一致数, 样例))
+    :rtype: Tuple[int, Dict[str, List]]
+    """
+    high, max_cards, impls = task
+    lows, mids, ends = _inner()
+    high_size = sum(high)
+    high_sig = sum(v * RANK_UNIT[r] for r, v in zip(_HIGH, high))
+    lookup = Identifier.lookup
+    classify = Identifier.classify
+    use_lookup = "lookup" in impls
+    use_classify = "classify" in impls
+    use_batch = "batch" in impls
+    failures : Dict[str, List] = {i: [0, []] for i in impls}
+    sigs : List[int] = []
+    keys : List[int] = []
+    checked = 0
+
+    def fail(impl : str, counts : Tuple[int, ...], expected : Cards, got : Cards) -> None:
+        failures[impl][0] += 1
+        if len(failures[impl][1]) < _EXAMPLES:
+            failures[impl][1].append([list(counts[1:]), repr(expected), repr(got)])
+
+    for mid_size, mid_sig, mid_counts in mids:
+        left = max_cards - high_size - mid_size
+        if left < 0:
+            break
+        for low_size, low_sig, low_counts in lows[:ends[min(left, 20)]]:
+            n = low_size + mid_size + high_size
+            if not n:
+                continue
+            counts = (0,) + low_counts + mid_counts + high
+            sig = low_sig + mid_sig + high_sig
+            expected = reference(counts)
+            key = expected.key
+            checked += 1
+            if use_lookup:
+                got = lookup(sig, n)
+                if got.key != key:
+                    fail("lookup", counts, expected, got)
+            if use_classify:
+                got = classify([[0, r] for r in range(1, 16) for _ in range(counts[r])])
+                if got.key != key:
+                    fail("classify", counts, expected, got)
+            if use_batch:
+                sigs.append(sig)
+                keys.append(key)
+
+    if use_batch and sigs:
+        arr = np.array(sigs, dtype = np.uint64)
+        codes, levels = Batch.classify_signatures(arr)
+        got_keys = _batch_keys(codes, levels)
+        for i in np.flatnonzero(got_keys != np.array(keys, dtype = np.int64)):
+            counts = (0,) + tuple((sigs[i] >> (4 * r)) & 0xF for r in range(1, 16))
+            fail("batch", counts, reference(counts), Batch.to_cards(codes[i], levels[i]))
+    return checked, failures
+
+def check_multisets(max_cards : int, impls : Sequence[str], workers : int = 0) -> Dict:
+    """
+    穷举不超过max_cards张的全部点数组合，逐项比较各实现与参照识别
+
+    :param max_cards: 张数上限(至多20)
+    :type max_cards: int
+    :param impls: 要检查的实现(lookup: Identifier.lookup; classify: Identifier.classify; batch: Batch.classify_signatures)
+    :type impls: Sequence[str]
+    :param workers: 进程数(0即为CPU核数，1为在本进程内运行)
+    :type workers: int
+    :return: 检查结果
+    :rtype: Dict
+    """
+    tasks = [(counts, max_cards, tuple(impls)) for size, _, counts in _combos(_HIGH) if size <= max_cards]
+    workers = workers or multiprocessing.cpu_count()
+    checked = 0
+    failures : Dict[str, List] = {i: [0, []] for i in impls}
+    if workers == 1:
+        results : Iterator = map(_check_block, tasks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap_unordered(_check_block, tasks)
+    try:
+        for count, block in results:
+            checked += count
+            for impl, (n, examples) in block.items():
+                failures[impl][0] += n
+                failures[impl][1] = (failures[impl][1] + examples)[:_EXAMPLES]
+    finally:
+        if pool:
+            pool.terminate()
+    return {
+        "multisets": checked,
+        "mismatches": {impl: {"count": n, "examples": examples} for impl, (n, examples) in failures.items()}
+    }
+
+def check_patterns(max_cards : int = 20) -> Dict:
+    """
+    检查全部牌型两两之间的比较(Judger、Batch.compare)、强度键是否与牌型一一对应，以及JSON转换
+
+    :param max_cards: 张数上限
+    :type max_cards: int
+    :return: 检查结果
+    :rtype: Dict
+    """
+    leads = patterns(max_cards)
+    follows = leads + [Cards(Pattern.NONE)]
+    mismatches : Dict[str, List] = {"judger": [], "batch.compare": [], "key": [], "transfer": []}
+
+    keys : Dict[int, Cards] = {}
+    for c in follows:
+        other = keys.setdefault(c.key, c)
+        if other is not c:
+            mismatches["key"].append([repr(other), repr(c)])
+        text = json.dumps({"pattern": c.pattern.name, "level": c.level})
+        encoded = CardsTransfer.encoson(c)
+        decoded = CardsTransfer.decoson(encoded)
+        if encoded != text or decoded.key != c.key or decoded.level != c.level:
+            mismatches["transfer"].append([repr(c), encoded, repr(decoded)])
+
+    pairs = [(a, b) for a in leads for b in follows]
+    expected = [reference_compare(a, b) for a, b in pairs]
+    for (a, b), e in zip(pairs, expected):
+        got = Judger.compare(a, b)
+        if got != e:
+            mismatches["judger"].append([repr(a), repr(b), e, got])
+
+    def encode(cards : List[Cards]) -> Tuple[np.ndarray, np.ndarray]:
+        codes = np.array([c.pattern.value for c in cards], dtype = np.int8)
+        levels = np.zeros((len(cards), 3), dtype = np.int8)
+        for i, c in enumerate(cards):
+            if isinstance(c.level, tuple):
+                levels[i, 0] = c.level[0]
+                levels[i, 1] = c.level[1] if len(c.level) == 3 else 0
+                levels[i, 2] = c.level[-1]
+            elif c.level is not None:
+                levels[i, 2] = c.level
+        return codes, levels
+
+    got = Batch.compare(*encode([a for a, _ in pairs]), *encode([b for _, b in pairs]))
+    for i in np.flatnonzero(got != np.array(expected, dtype = np.int8)):
+        mismatches["batch.compare"].append([repr(pairs[i][0]), repr(pairs[i][1]), expected[i], int(got[i])])
+
+    return {
+        "patterns": len(leads),
+        "pairs": len(pairs),
+        "mismatches": {k: {"count": len(v), "examples": v[:_EXAMPLES]} for k, v in mismatches.items()}
+    }
+
+def _plays(rng : random.Random, count : int) -> List[Hand]:
+    """
+    常见输入: 从随机发出的手牌中随机选取合法出牌
+
+    :param rng: 随机数发生器
+    :type rng: random.Random
+    :param count: 个数
+    :type count: int
+    :return: 具体的牌
+    :rtype: List[Hand]
+    """
+    deck = list(range(54))
+    plays = []
+    while len(plays) < count:
+        rng.shuffle(deck)
+        hand = Hand.from_mask(sum(1 << i for i in deck[:20]))
+        moves = Generator.leads(hand)
+        for _ in range(8):
+            plays.append(Generator.realize(hand, rng.choice(moves)))
+    return plays[:count]
+
+def _worst() -> List[List[List[int]]]:
+    """
+    最坏输入: 查找表未命中、需走位运算的20张牌组(飞机带对子、飞机带单张与非法牌组)
+
+    :return: 牌组
+    :rtype: List[List[List[int]]]
+    """
+    return [
+        [[s, r] for r in (1, 2, 3, 4) for s in range(3)] + [[s, r] for r in (5, 6, 7, 8) for s in range(2)],
+        [[s, r] for r in (1, 2, 3, 4, 5) for s in range(3)] + [[0, 6], [1, 7], [2, 8], [4, 14], [4, 15]],
+        [[s, r] for r in (1, 2, 3, 4) for s in range(3)] + [[s, r] for r in (5, 6, 7, 8) for s in (0, 1)][:7] + [[3, 9]],
+        [[s, r] for r in range(1, 6) for s in range(4)]
+    ]
+
+def cases() -> Dict[str, Tuple[Callable, List]]:
+    """
+    基准测试项: 名称 -> (被测函数, 输入)，输入由固定种子生成，各次运行一致
+
+    :return: 测试项
+    :rtype: Dict[str, Tuple[Callable, List]]
+    """
+    rng = random.Random(0)
+    hands = _plays(rng, 4096)
+    lists = [i.tolist() for i in hands]
+    worst = _worst()
+    leads = patterns()
+    played = [Identifier.identify(i) for i in hands]
+    shaped = [(a, b) for a in played for b in played[:64] if a.shape == b.shape][:4096]
+    mixed = [(a, b) for a in played[:64] for b in played[:64]]
+    bombs = [(a, b) for a in leads for b in leads if a.tier or b.tier][:4096]
+    texts = [CardsTransfer.encoson(c) for c in played]
+    arr = np.array([i.signature for i in hands] * 16, dtype = np.uint64)
+    Identifier.lookup(RANK_UNIT[1], 1) # 预先建立查找表
+    return {
+        "identify.list/common": (Identifier.identify, lists),
+        "identify.hand/common": (Identifier.identify, hands),
+        "identify.list/worst": (Identifier.identify, worst),
+        "classify/common": (Identifier.classify, lists),
+        "classify/worst": (Identifier.classify, worst),
+        "judger/same-shape": (lambda p: Judger.compare(*p), shaped),
+        "judger/mixed": (lambda p: Judger.compare(*p), mixed),
+        "judger/bombs": (lambda p: Judger.compare(*p), bombs),
+        "cards.init/single": (lambda r: Cards(Pattern.SINGLE, r), list(range(1, 16))),
+        "cards.init/plane": (lambda p: Cards(Pattern.PLANE, p), [(5, 5, r) for r in range(5, 13)]),
+        "cards.init/common": (lambda c: Cards(c.pattern, c.level), played),
+        "transfer.encode/common": (CardsTransfer.encoson, played),
+        "transfer.decode/common": (CardsTransfer.decoson, texts),
+        "batch.classify/rows": (Batch.classify_signatures, [arr]),
+        "batch.classify/counts": (Batch.classify, [Batch.from_signatures(arr)]),
+        "dealer.deal": (lambda d: d.deal(), [Dealer(0)]),
+        "dealer.bulk/rows": (bulk, [seeds(0, 1 << 16)])
+    }
+
+def measure(fn : Callable, inputs : List, seconds : float = 0.2, repeat : int = 5) -> float:
+    """
+    测量每秒操作数(批量项按行计)，取多轮中最快的一轮以减少干扰
+
+    :param fn: 被测函数
+    :type fn: Callable
+    :param inputs: 输入(循环使用)
+    :type inputs: List
+    :param seconds: 每轮的时长(秒)
+    :type seconds: float
+    :param repeat: 轮数
+    :type repeat: int
+    :return: 每秒操作数
+    :rtype: float
+    """
+    rows = len(inputs[0]) if isinstance(inputs[0], np.ndarray) else 1
+    for i in inputs: # 预热
+        fn(i)
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            for i in inputs:
+                fn(i)
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds / 4:
+            break
+        loops *= 2
+    loops = max(1, int(loops * seconds / elapsed))
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            for i in inputs:
+                fn(i)
+        best = min(best, time.perf_counter() - start)
+    return loops * len(inputs) * rows / best
+
+def bench(names : Sequence[str] = (), seconds : float = 0.2) -> Dict[str, float]:
+    """
+    运行基准测试
+
+    :param names: 只运行名称以这些前缀开头的测试项(空为全部)
+    :type names: Sequence[str]
+    :param seconds: 每轮的时长(秒)
+    :type seconds: float
+    :return: 各测试项的每秒操作数
+    :rtype: Dict[str, float]
+    """
+    result = {}
+    for name, (fn, inputs) in cases().items():
+        if not names or any(name.startswith(i) for i in names):
+            result[name] = round(measure(fn, inputs, seconds), 1)
+    return result
+
+def _sizeof(cards : Cards) -> int:
+    """
+    单个Cards对象及其独占的属性字典、大小列表的字节数
+
+    :param cards: 牌型
+    :type cards: Cards
+    :return: 字节数
+    :rtype: int
+    """
+    size = sys.getsizeof(cards)
+    if hasattr(cards, "__dict__"):
+        size += sys.getsizeof(vars(cards))
+    if isinstance(cards.level, (list, tuple)):
+        size += sys.getsizeof(cards.level)
+    return size
+
+def memory(count : int = 4096) -> Dict[str, Dict]:
+    """
+    识别与解码路径的内存统计: 逐个识别(解码)常见出牌并保留结果(如出牌历史)时，
+    每手新增的内存块数、字节数，以及结果中不同对象的个数
+
+    :param count: 出牌个数
+    :type count: int
+    :return: 各路径的统计
+    :rtype: Dict[str, Dict]
+    """
+    hands = _plays(random.Random(0), count)
+    lists = [i.tolist() for i in hands]
+    texts = [CardsTransfer.encoson(Identifier.identify(i)) for i in hands]
+    paths : Dict[str, Tuple[Callable, List]] = {
+        "identify.list": (Identifier.identify, lists),
+        "identify.hand": (Identifier.identify, hands),
+        "transfer.decode": (CardsTransfer.decoson, texts)
+    }
+    report = {}
+    for name, (fn, inputs) in paths.items():
+        fn(inputs[0]) # 预先建立查找表等
+        kept : List = [None] * count
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        for i, x in enumerate(inputs):
+            kept[i] = fn(x)
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        blocks = sum(i.count_diff for i in after.compare_to(before, "filename"))
+        size = sum(i.size_diff for i in after.compare_to(before, "filename"))
+        distinct = {id(i): i for i in kept}
+        report[name] = {
+            "blocks_per_play": round(blocks / count, 3),
+            "bytes_per_play": round(size / count, 1),
+            "distinct_objects": len(distinct),
+            "object_bytes": round(sum(_sizeof(i) for i in distinct.values()) / len(distinct), 1)
+        }
+    return report
+
+def compare(result : Dict[str, float], baseline : Dict[str, float], tolerance : float) -> Dict[str, Dict]:
+    """
+    与基线比较，每秒操作数低于基线(1 - tolerance)倍的项即为退化
+
+    :param result: 本次结果
+    :type result: Dict[str, float]
+    :param baseline: 基线
+    :type baseline: Dict[str, float]
+    :param tolerance: 允许的相对下降
+    :type tolerance: float
+    :return: 各项的(本次, 基线, 比值, 是否退化)
+    :rtype: Dict[str, Dict]
+    """
+    report = {}
+    for name, ops in result.items():
+        base = baseline.get(name)
+        ratio = round(ops / base, 3) if base else None
+        report[name] = {
+            "ops_per_sec": ops,
+            "baseline": base,
+            "ratio": ratio,
+            "regressed": ratio is not None and ratio < 1 - tolerance
+        }
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Karten rules engine benchmark and equivalence checker")
+    sub = parser.add_subparsers(dest = "command", required = True)
+    p_bench = sub.add_parser("bench", help = "measure ops/sec and compare with the baseline")
+    p_bench.add_argument("-k", "--only", action = "append", default = [], help = "run cases with this name prefix")
+    p_bench.add_argument("--seconds", type = float, default = 0.2, help = "duration of each timing round")
+    p_bench.add_argument("--baseline", default = BASELINE)
+    p_bench.add_argument("--save", action = "store_true", help = "store the result as the new baseline")
+    p_bench.add_argument("--tolerance", type = float, default = 0.2, help = "allowed relative slowdown")
+    p_mem = sub.add_parser("mem", help = "measure memory retained by identified and decoded plays")
+    p_mem.add_argument("-n", "--count", type = int, default = 4096)
+    p_check = sub.add_parser("check", help = "compare implementations with the reference exhaustively")
+    p_check.add_argument("-n", "--max-cards", type = int, default = 20)
+    p_check.add_argument("-j", "--workers", type = int, default = 0, help = "worker processes (0 = CPU count)")
+    p_check.add_argument("--impl", default = "lookup,batch",
+                         help = "comma separated implementations from lookup, classify, batch")
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        measured = bench(args.only, args.seconds)
+        if args.save:
+            saved = {}
+            if os.path.exists(args.baseline):
+                with open(args.baseline, encoding = "utf-8") as f:
+                    saved = json.load(f)["ops_per_sec"]
+            saved.update(measured)
+            with open(args.baseline, "w", encoding = "utf-8") as f:
+                json.dump({"python": platform.python_version(), "machine": platform.machine(), "ops_per_sec": saved},
+                          f, indent = 2)
+                f.write("\n")
+            json.dump(measured, sys.stdout, indent = 2)
+            print()
+            sys.exit(0)
+        base_ops = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding = "utf-8") as f:
+                base_ops = json.load(f)["ops_per_sec"]
+        out = compare(measured, base_ops, args.tolerance)
+        json.dump(out, sys.stdout, indent = 2)
+        print()
+        sys.exit(1 if any(i["regressed"] for i in out.values()) else 0)
+
+    if args.command == "mem":
+        json.dump(memory(args.count), sys.stdout, indent = 2)
+        print()
+        sys.exit(0)
+
+    selected = args.impl.split(",")
+    if any(i not in ("lookup", "classify", "batch") for i in selected):
+        parser.error("Expect implementations from lookup, classify, batch.")
+    begin = time.perf_counter()
+    out = {"patterns": check_patterns(args.max_cards), "multisets": check_multisets(args.max_cards, selected, args.workers)}
+    out["elapsed_s"] = round(time.perf_counter() - begin, 3)
+    json.dump(out, sys.stdout, indent = 2)
+    print()
+    failed = any(v["count"] for part in ("patterns", "multisets") for v in out[part]["mismatches"].values())
+    sys.exit(1 if failed else 0)
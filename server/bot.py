@@ -0,0 +1,525 @@
+"""
+电脑出牌策略，包含了：
++ 某个座位在牌局中能看到的信息(View)
++ 随机、贪心策略
++ 确定化蒙特卡洛搜索策略(抽样对手手牌、贪心推演到终局、按置换表缓存推演结果)
++ 直接读取Game状态出牌、可用于服务器补位的电脑玩家
+"""
+# pylint: disable=R0903
+# pylint: disable=R0913
+# pylint: disable=R0914
+# 抑制警告：
+# + R0903:类的公共方法太少(小于2)。
+# + R0913:参数过多。
+# + R0914:局部变量过多。
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple, Type
+import multiprocessing
+import multiprocessing.pool
+import random
+import time
+from cards_data import Pattern, Cards
+from cards_hand import Hand, RANK_UNIT
+from cards_identifier import Identifier
+from cards_generator import Generator, Move
+from Game import Game
+
+# -*- encoding: utf-8 -*-
+
+_DECK = sum(4 * RANK_UNIT[i] for i in range(1, 14)) + RANK_UNIT[14] + RANK_UNIT[15] # 整副牌的点数计数签名
+
+class View(NamedTuple):
+    """
+    轮到某个座位出牌时它能看到的牌局
+    """
+    seat : int              # 座位号(1~3)
+    landlord : int          # 地主座位号
+    hand : Hand             # 手牌
+    last : Optional[Cards]  # 需要压过的上一手(None即为领出)
+    last_seat : int         # 上一手的座位号(领出时为0)
+    remaining : Tuple[int, int, int] # 各座位剩余张数
+    played : Hand           # 已经出过的牌
+    lords : Hand            # 地主牌(公开)
+
+def observe(game : Game, seat : int) -> View:
+    """
+    从Game状态取出某个座位能看到的牌局
+
+    :param game: 已开始的牌局
+    :type game: Game
+    :param seat: 座位号
+    :type seat: int
+    :return: 牌局
+    :rtype: View
+    """
+    p = game.searchPlayer(str(seat))
+    if p is None:
+        raise IndexError("The player id is not exist.")
+    remaining = [0, 0, 0]
+    for i in game.playerlist:
+        remaining[int(i.id) - 1] = i.cardnum
+    last = game.lastplay
+    leading = last is None or game.lastid == p.id
+    return View(
+        seat, game.lordsid, p.hand,
+        None if leading else last, 0 if leading else int(game.lastid),
+        (remaining[0], remaining[1], remaining[2]),
+        game.playedcards, game.lordshand
+        )
+
+class Policy:
+    """
+    出牌策略基类
+
+    每局为每个座位新建一个实例；play只返回出牌(点数计数)，由调用方从手牌中取出具体的牌并校验。
+    """
+    def __init__(self, seat : int, rng : random.Random):
+        """
+        初始化策略
+
+        :param seat: 座位号
+        :type seat: int
+        :param rng: 本座位的随机数发生器(由本局种子导出)
+        :type rng: random.Random
+        """
+        self.seat = seat
+        self.rng = rng
+
+    def play(self, view : View) -> Optional[Move]:
+        """
+        选择出牌
+
+        :param view: 牌局
+        :type view: View
+        :return: 出牌(None为不出)
+        :rtype: Optional[Move]
+        """
+        raise NotImplementedError
+
+class RandomPolicy(Policy):
+    """
+    随机策略: 在所有合法出牌(跟牌时含不出)中等概率选择，用于检查规则
+    """
+    def play(self, view : View) -> Optional[Move]:
+        moves : List[Optional[Move]] = list(Generator.beats(view.hand, view.last))
+        if view.last is not None:
+            moves.append(None)
+        return self.rng.choice(moves)
+
+class GreedyPolicy(Policy):
+    """
+    贪心策略: 领出时出最小点数的全部牌，跟牌时出能压过的最小同形牌，
+    压不过对手时用最小的炸弹或王炸，不压队友。只做签名运算，不枚举全部出牌。
+    """
+    def play(self, view : View) -> Optional[Move]:
+        partner = view.last is not None and view.landlord not in (view.seat, view.last_seat)
+        return greedy(view.hand.signature, view.last, partner)
+
+def _count(sig : int, rank : int) -> int:
+    """
+    签名中某一点数的张数
+
+    :param sig: 点数计数签名
+    :type sig: int
+    :param rank: 点数
+    :type rank: int
+    :return: 张数
+    :rtype: int
+    """
+    return (sig >> (4 * rank)) & 0xF
+
+def _size(sig : int) -> int:
+    """
+    签名中的总张数
+
+    :param sig: 点数计数签名
+    :type sig: int
+    :return: 张数
+    :rtype: int
+    """
+    halves = (sig & 0x0F0F0F0F0F0F0F0F) + ((sig >> 4) & 0x0F0F0F0F0F0F0F0F)
+    return ((halves * 0x0101010101010101) >> 56) & 0xFF
+
+def _move(sig : int) -> Move:
+    """
+    由签名构造出牌
+
+    :param sig: 点数计数签名
+    :type sig: int
+    :return: 出牌
+    :rtype: Move
+    """
+    size = _size(sig)
+    return Move(sig, size, Identifier.lookup(sig, size))
+
+def _ranks(sig : int, count : int) -> int:
+    """
+    签名中张数恰为count的点数(这些点数的第3位置位)
+
+    :param sig: 点数计数签名
+    :type sig: int
+    :param count: 张数
+    :type count: int
+    :return: 逐4位掩码
+    :rtype: int
+    """
+    x = sig ^ (count * 0x1111111111111111)
+    return ~(((x & 0x7777777777777777) + 0x7777777777777777) | x | 0x7777777777777777) & 0x8888888888888888
+
+def _bomb(sig : int, above : int) -> Optional[Move]:
+    """
+    最小的大于above的炸弹，没有时用王炸
+
+    :param sig: 手牌签名
+    :type sig: int
+    :param above: 需要大过的炸弹点数(0为任意)
+    :type above: int
+    :return: 出牌
+    :rtype: Optional[Move]
+    """
+    fours = (sig >> 2) & 0x1111111111111111 # 张数不超过4，第2位置位即张数为4
+    fours &= ~((1 << (4 * (above + 1))) - 1) & ((1 << (4 * 14)) - 1)
+    if fours:
+        return _move(4 * (fours & -fours))
+    if _count(sig, 14) and _count(sig, 15):
+        return _move(RANK_UNIT[14] + RANK_UNIT[15])
+    return None
+
+def _follow(sig : int, last : Cards) -> Optional[Move]:
+    """
+    能压过上一手的最小同形出牌(尽量不拆牌，飞机不跟)
+
+    :param sig: 手牌签名
+    :type sig: int
+    :param last: 上一手牌型
+    :type last: Cards
+    :return: 出牌
+    :rtype: Optional[Move]
+    """
+    level = last.level
+    if last.pattern in (Pattern.SINGLE, Pattern.PAIR) or (last.pattern == Pattern.FULLHOUSE and level[0] == 3):
+        need = 1 if last.pattern == Pattern.SINGLE else 2 if last.pattern == Pattern.PAIR else 3
+        top = level if isinstance(level, int) else level[1]
+        window = ((1 << (4 * (16 if need == 1 else 14))) - 1) & ~((1 << (4 * (top + 1))) - 1)
+        found = _ranks(sig, need) & window # 先找张数恰好的点数，没有时再拆张数更多的(炸弹除外)
+        if not found:
+            found = ((_ranks(sig, 2) if need == 1 else 0) | (_ranks(sig, 3) if need < 3 else 0)) & window
+        if not found:
+            return None
+        return _move(need * RANK_UNIT[((found & -found).bit_length() - 1) >> 2])
+    if last.pattern == Pattern.FULLHOUSE:
+        wing = level[0] - 3
+        for rank in range(level[1] + 1, 14):
+            if _count(sig, rank) == 3:
+                for other in range(1, 16):
+                    if other != rank and _count(sig, other) == wing:
+                        return _move(3 * RANK_UNIT[rank] + wing * RANK_UNIT[other])
+        return None
+    if last.pattern in (Pattern.STRAIGHT, Pattern.SPAIRS):
+        width = 1 if last.pattern == Pattern.STRAIGHT else 2
+        length = level[0] // width
+        for top in range(level[1] + 1, 13):
+            if all(_count(sig, i) >= width for i in range(top - length + 1, top + 1)):
+                return _move(sum(width * RANK_UNIT[i] for i in range(top - length + 1, top + 1)))
+    return None
+
+def greedy(sig : int, last : Optional[Cards], partner : bool = False) -> Optional[Move]:
+    """
+    贪心出牌(GreedyPolicy与蒙特卡洛推演共用)
+
+    :param sig: 手牌签名(非空)
+    :type sig: int
+    :param last: 需要压过的上一手(None即为领出)
+    :type last: Optional[Cards]
+    :param partner: 上一手是否为队友所出
+    :type partner: bool
+    :return: 出牌(None为不出)
+    :rtype: Optional[Move]
+    """
+    if last is None:
+        rank = ((sig & -sig).bit_length() - 1) >> 2
+        return _move(_count(sig, rank) * RANK_UNIT[rank])
+    if partner:
+        return None
+    move = _follow(sig, last)
+    if move is None and last.pattern != Pattern.KK:
+        move = _bomb(sig, last.level if last.pattern == Pattern.BOMB else 0)
+    return move
+
+@lru_cache(maxsize = 1 << 15) # 表过大时垃圾回收的停顿会超出每步的预算
+def _outcome(hands : Tuple[int, int, int], turn : int, last : Optional[Cards], last_seat : int, landlord : int) -> int:
+    """
+    各家按贪心策略推演到终局的赢家(置换表: 按三家手牌签名与桌面状态缓存)
+
+    推演是确定的，路径上经过的每个局面都以同一赢家入表；不同抽样、不同候选出牌汇合到同一局面时直接命中。
+
+    :param hands: 座位1~3的手牌签名
+    :type hands: Tuple[int, int, int]
+    :param turn: 轮到的座位号
+    :type turn: int
+    :param last: 桌面上最后一手(None即为领出)
+    :type last: Optional[Cards]
+    :param last_seat: 最后一手的座位号(领出时为0)
+    :type last_seat: int
+    :param landlord: 地主座位号
+    :type landlord: int
+    :return: 赢家座位号
+    :rtype: int
+    """
+    if last_seat == turn: # 无人压过，轮回出牌者领出
+        return _outcome(hands, turn, None, 0, landlord)
+    sig = hands[turn - 1]
+    move = greedy(sig, last, last is not None and landlord not in (turn, last_seat))
+    if move is None:
+        return _outcome(hands, turn % 3 + 1, last, last_seat, landlord)
+    rest = sig - move.signature
+    if not rest:
+        return turn
+    return _outcome(hands[:turn - 1] + (rest,) + hands[turn:], turn % 3 + 1, move.pattern, turn, landlord)
+
+class _State(NamedTuple):
+    """
+    搜索用的牌局(只含签名，可pickle后发给工作进程)
+    """
+    seat : int
+    landlord : int
+    sig : int               # 自己的手牌签名
+    last : Optional[Cards]
+    last_seat : int
+    remaining : Tuple[int, int, int]
+    unknown : Tuple[int, ...] # 对手手中未知的牌(点数列表)
+    known : int             # 地主手中已知的地主牌签名(自己是地主时为0)
+
+def _state(view : View) -> _State:
+    """
+    由牌局得到搜索用的牌局
+
+    :param view: 牌局
+    :type view: View
+    :return: 搜索用的牌局
+    :rtype: _State
+    """
+    known = 0
+    if view.landlord != view.seat: # 未出的地主牌必在地主手中
+        known = Hand.from_mask(view.lords.mask & ~view.played.mask).signature
+    rest = _DECK - view.hand.signature - view.played.signature - known
+    unknown = tuple(r for r in range(1, 16) for _ in range(_count(rest, r)))
+    if len(unknown) + _size(known) != sum(view.remaining) - len(view.hand):
+        raise ValueError("The view is inconsistent with the remaining cards.")
+    return _State(view.seat, view.landlord, view.hand.signature, view.last, view.last_seat,
+                  view.remaining, unknown, known)
+
+def _deal(state : _State, rng : random.Random) -> Tuple[int, int, int]:
+    """
+    确定化: 把未知的牌按各家剩余张数随机分给两个对手
+
+    :param state: 搜索用的牌局
+    :type state: _State
+    :param rng: 随机数发生器
+    :type rng: random.Random
+    :return: 座位1~3的手牌签名
+    :rtype: Tuple[int, int, int]
+    """
+    pool = list(state.unknown)
+    rng.shuffle(pool)
+    hands = [0, 0, 0]
+    start = 0
+    for seat in range(1, 4):
+        if seat == state.seat:
+            hands[seat - 1] = state.sig
+            continue
+        sig = state.known if seat == state.landlord else 0
+        end = start + state.remaining[seat - 1] - _size(sig)
+        for rank in pool[start:end]:
+            sig += RANK_UNIT[rank]
+        hands[seat - 1] = sig
+        start = end
+    return hands[0], hands[1], hands[2]
+
+def _candidates(state : _State) -> List[Optional[Move]]:
+    """
+    根节点的候选出牌(跟牌时末尾为不出)
+
+    :param state: 搜索用的牌局
+    :type state: _State
+    :return: 候选出牌
+    :rtype: List[Optional[Move]]
+    """
+    moves : List[Optional[Move]] = list(Generator.beats(state.sig, state.last))
+    if state.last is not None:
+        moves.append(None)
+    return moves
+
+def _search(task : Tuple[_State, float, int, int]) -> Tuple[List[int], List[int]]:
+    """
+    在时间预算内反复抽样，对每个候选出牌推演到终局并计胜负(也是工作进程入口)
+
+    :param task: (搜索用的牌局, 时间预算(秒), 抽样数上限(0为不限), 随机种子)
+    :type task: Tuple[_State, float, int, int]
+    :return: 各候选出牌的(胜局数, 推演数)
+    :rtype: Tuple[List[int], List[int]]
+    """
+    state, budget, samples, seed = task
+    deadline = time.perf_counter() + budget
+    rng = random.Random(seed)
+    moves = _candidates(state)
+    wins = [0] * len(moves)
+    counts = [0] * len(moves)
+    seat, landlord = state.seat, state.landlord
+    after = seat % 3 + 1
+    n = 0
+    while not samples or n < samples:
+        hands = _deal(state, rng)
+        for i, move in enumerate(moves):
+            if move is None:
+                winner = _outcome(hands, after, state.last, state.last_seat, landlord)
+            else:
+                played = hands[:seat - 1] + (state.sig - move.signature,) + hands[seat:]
+                winner = _outcome(played, after, move.pattern, seat, landlord)
+            wins[i] += winner == seat or (seat != landlord and winner != landlord)
+            counts[i] += 1
+            if time.perf_counter() >= deadline:
+                return wins, counts
+        n += 1
+    return wins, counts
+
+def decide(view : View,
+           rng : random.Random,
+           budget : float = 0.2,
+           samples : int = 0,
+           pool : Optional[multiprocessing.pool.Pool] = None,
+           workers : int = 1
+           ) -> Optional[Move]:
+    """
+    确定化蒙特卡洛搜索: 按可见信息抽样对手手牌，对每个候选出牌推演到终局，选胜率最高的出牌
+
+    :param view: 牌局
+    :type view: View
+    :param rng: 随机数发生器(只用于导出各次搜索的种子)
+    :type rng: random.Random
+    :param budget: 时间预算(秒)
+    :type budget: float
+    :param samples: 抽样数上限(0为不限，只受时间预算限制；大于0且预算足够时结果可复现)
+    :type samples: int
+    :param pool: 进程池(None为在本进程内搜索)
+    :type pool: Optional[multiprocessing.pool.Pool]
+    :param workers: 使用进程池时分出的搜索任务数
+    :type workers: int
+    :return: 出牌(None为不出)
+    :rtype: Optional[Move]
+    """
+    state = _state(view)
+    moves = _candidates(state)
+    for move in moves:
+        if move is not None and move.signature == state.sig: # 能一手出完
+            return move
+    if len(moves) == 1:
+        return moves[0]
+    if pool is None:
+        wins, counts = _search((state, budget, samples, rng.getrandbits(64)))
+    else:
+        share = -(-samples // workers) if samples else 0
+        tasks = [(state, budget, share, rng.getrandbits(64)) for _ in range(workers)]
+        wins = [0] * len(moves)
+        counts = [0] * len(moves)
+        for w, c in pool.map(_search, tasks):
+            for i, v in enumerate(w):
+                wins[i] += v
+                counts[i] += c[i]
+    best, rate = 0, -1.0
+    for i, c in enumerate(counts):
+        if c and wins[i] / c > rate: # 胜率相同时取靠前(较小)的出牌
+            best, rate = i, wins[i] / c
+    return moves[best]
+
+class MonteCarloPolicy(Policy):
+    """
+    确定化蒙特卡洛策略(供模拟器使用)
+
+    批量模拟时建议设置samples，使结果与机器快慢无关；需要非默认的预算或抽样数时，
+    以functools.partial(MonteCarloPolicy, budget = ..., samples = ...)作为策略传给模拟器。
+    """
+    def __init__(self, seat : int, rng : random.Random, budget : float = 0.2, samples : int = 0):
+        """
+        初始化策略
+
+        :param seat: 座位号
+        :type seat: int
+        :param rng: 本座位的随机数发生器(由本局种子导出)
+        :type rng: random.Random
+        :param budget: 每步的时间预算(秒)
+        :type budget: float
+        :param samples: 每步的抽样数上限(0为不限)
+        :type samples: int
+        """
+        super().__init__(seat, rng)
+        self.budget = budget
+        self.samples = samples
+
+    def play(self, view : View) -> Optional[Move]:
+        return decide(view, self.rng, self.budget, self.samples)
+
+class MonteCarloBot:
+    """
+    电脑玩家: 直接读取Game状态出牌，用于补位
+
+    workers大于1时持有一个进程池，把每步的抽样分给多个进程并行；
+    choose是阻塞的，在事件循环中应放到线程池执行(loop.run_in_executor)。
+    """
+    def __init__(self, budget : float = 0.2, samples : int = 0, workers : int = 1, seed : Optional[int] = None):
+        """
+        初始化电脑玩家
+
+        :param budget: 每步的时间预算(秒)
+        :type budget: float
+        :param samples: 每步的抽样数上限(0为不限)
+        :type samples: int
+        :param workers: 进程数(1为在本进程内搜索)
+        :type workers: int
+        :param seed: 随机种子
+        :type seed: Optional[int]
+        """
+        self.budget = budget
+        self.samples = samples
+        self.workers = workers
+        self.rng = random.Random(seed)
+        self._pool : Optional[multiprocessing.pool.Pool] = None
+        Identifier.lookup(RANK_UNIT[1], 1) # 预先建立牌型表，避免第一步超出预算
+
+    def choose(self, game : Game, seat : int) -> Hand:
+        """
+        为某个座位选择要出的牌
+
+        :param game: 已开始的牌局
+        :type game: Game
+        :param seat: 座位号
+        :type seat: int
+        :return: 具体的牌(空即为不出，可直接交给Game.play)
+        :rtype: Hand
+        """
+        if self.workers > 1 and self._pool is None:
+            self._pool = multiprocessing.Pool(self.workers)
+        view = observe(game, seat)
+        move = decide(view, self.rng, self.budget, self.samples, self._pool, self.workers)
+        return Generator.realize(view.hand, move) if move else Hand()
+
+    def close(self) -> None:
+        """
+        关闭进程池
+        """
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+def clear() -> None:
+    """
+    清空置换表
+    """
+    _outcome.cache_clear()
+
+POLICIES : Dict[str, Type[Policy]] = {
+    "random": RandomPolicy,
+    "greedy": GreedyPolicy,
+    "mc": MonteCarloPolicy
+}
@@ -0,0 +1,539 @@
+"""
+牌型批量计算类(供分析任务使用，依赖numpy)，包括:
++ 点数计数矩阵的构造
++ 批量牌型识别
++ 批量牌型比较
+"""
+# pylint: disable=R0914
+# 抑制警告：
+# + R0914:局部变量过多。
+from typing import Iterable, List, NamedTuple, Tuple, Union
+import random
+import numpy as np
+from cards_data import Pattern, Cards
+from cards_hand import Hand
+from cards_identifier import Identifier
+
+# -*- encoding: utf-8 -*-
+
+_SHIFTS = np.arange(4, 64, 4, dtype = np.uint64)
+
+# 点数计数签名(见cards_hand)上的逐4位运算常量
+_U = np.uint64
+_SEVENS = _U(0x7777777777777777)
+_EIGHTS = _U(0x8888888888888888)
+_THREES = _U(0x3333333333333333)
+_NOT_TWOS = _U(0xDDDDDDDDDDDDDDDD)
+_LOW_NIBBLES = _U(0x0F0F0F0F0F0F0F0F)
+_BYTE_SUM = _U(0x0101010101010101)
+_F = _U(0xF)
+_ONE = _U(1)
+_RANK_13 = _U(0x8 << 52)
+_HIGH_RANKS = _U(0x888 << 52)   # 点数13~15
+_JOKERS = _U(0x11 << 56)
+
+# 张数上限校验: 各字节按无符号数不超过4(负数按无符号数都大于4)，王的字节不超过1
+_MAX_COUNT = 4
+_JOKERS_OVER = _U(0x00FEFE0000000000) # 点数9~15的字节中王所在的两个字节，张数不少于2时置位
+
+# 按字节打包的键(第i字节的低3位、次3位依次为点数i+1、i+9的张数)上的逐3位运算常量
+_BYTE_THREES = _U(0x1B1B1B1B1B1B1B1B)
+_BYTE_LOWS = _U(0x0101010101010101)
+_BYTE_HIGHS = _U(0x0808080808080808)
+_BYTE_SEVENS = _U(0x0707070707070707)
+_BYTE_ODDS = _U(0x2D2D2D2D2D2D2D2D) # 各张数的第0、2位(张数不为0、2时置位)
+_KEY_RANK_13 = _U(1 << 35)
+
+_CHUNK = 1 << 14 # 分块计算，使中间数组留在缓存中
+
+NONE = Pattern.NONE.value
+SINGLE = Pattern.SINGLE.value
+PAIR = Pattern.PAIR.value
+BOMB = Pattern.BOMB.value
+STRAIGHT = Pattern.STRAIGHT.value
+FULLHOUSE = Pattern.FULLHOUSE.value
+SPAIRS = Pattern.SPAIRS.value
+PLANE = Pattern.PLANE.value
+KK = Pattern.KK.value
+
+def _outcomes() -> np.ndarray:
+    """
+    生成牌型码两两之间的比较结果表(3表示牌型相同，需再比较形状与大小)
+
+    :return: (9, 9)比较结果表，按a*9+b展平
+    :rtype: np.ndarray
+    """
+    table = np.zeros((9, 9), dtype = np.int8)
+    for a in range(9):
+        for b in range(9):
+            if KK in (a, b):
+                table[a, b] = 2 - (a == KK)
+            elif BOMB in (a, b):
+                table[a, b] = 3 if a == b else 2 - (a == BOMB)
+            elif a == b != NONE:
+                table[a, b] = 3
+    return table.reshape(-1)
+
+_OUTCOMES = _outcomes()
+
+class _Table(NamedTuple):
+    """
+    以64位键为下标的完美哈希表: 槽位为(key * mult) >> shift，槽位上的键不符即未登记
+    """
+    mult : np.uint64
+    shift : np.uint64
+    keys : np.ndarray   # uint64，空槽为0(0不是合法牌组的键)
+    values : np.ndarray # <u4，各字节依次为牌型码与3列大小
+
+class Batch:
+    """
+    牌型批量计算单例类
+
+    牌组以(N, 15)的点数计数矩阵表示(第i列为点数i+1的张数)。识别结果为牌型码(Pattern.value)
+    与(N, 3)的大小矩阵，列依次为: 长度/三张种数、翅膀张数、最大点数；只有一个大小值的牌型
+    (个子、对子、炸弹)只用最后一列。结果与Identifier.identify、Judger.compare逐项一致。
+
+    识别以查表为主: Identifier查找表中的牌型(带翅膀的飞机以外的全部合法牌型)登记在完美哈希表中，
+    每行只需一次散列与两次取数；未命中的行直接在键上按位运算判定飞机。
+    计数矩阵与签名各用一张表(键不同)，在首次调用时生成。计数矩阵的键由矩阵按步长直接读出，
+    不经过签名。
+    """
+    _tables : Tuple[_Table, ...] = ()
+
+    @classmethod
+    def from_signatures(cls, sigs : Union[np.ndarray, Iterable[int]]) -> np.ndarray:
+        """
+        由点数计数签名构造点数计数矩阵
+
+        :param sigs: 点数计数签名
+        :type sigs: Union[np.ndarray, Iterable[int]]
+        :return: (N, 15)点数计数矩阵
+        :rtype: np.ndarray
+        """
+        sigs = np.asarray(sigs if isinstance(sigs, np.ndarray) else list(sigs), dtype = np.uint64)
+        return ((sigs[:, None] >> _SHIFTS) & _F).astype(np.int8)
+
+    @classmethod
+    def signatures(cls, counts : np.ndarray) -> np.ndarray:
+        """
+        由点数计数矩阵构造点数计数签名
+
+        :param counts: (N, 15)点数计数矩阵，每行须取自同一副牌
+        :type counts: np.ndarray
+        :return: 点数计数签名(uint64)
+        :rtype: np.ndarray
+        """
+        c = cls._matrix(counts)
+        if not len(c):
+            return np.zeros(0, dtype = np.uint64)
+        return cls._nibbles(*cls._rows(c))
+
+    @staticmethod
+    def _nibbles(low : np.ndarray, high : np.ndarray) -> np.ndarray:
+        """
+        把每字节一个点数的张数压缩为点数计数签名
+
+        :param low: 点数1~8的张数(每字节一个)
+        :type low: np.ndarray
+        :param high: 点数9~15的张数(每字节一个)
+        :type high: np.ndarray
+        :return: 点数计数签名(uint64)
+        :rtype: np.ndarray
+        """
+        for mask, shift in ((0x00FF00FF00FF00FF, 4), (0x0000FFFF0000FFFF, 8), (0x00000000FFFFFFFF, 16)):
+            low = (low | (low >> _U(shift))) & _U(mask)
+            high = (high | (high >> _U(shift))) & _U(mask)
+        return (low | (high << _U(32))) << _U(4)
+
+    @classmethod
+    def from_cards(cls, groups : Iterable[Union[Hand, List[List[int]]]]) -> np.ndarray:
+        """
+        由牌组构造点数计数矩阵
+
+        :param groups: 牌组
+        :type groups: Iterable[Union[Hand, List[List[int]]]]
+        :return: (N, 15)点数计数矩阵
+        :rtype: np.ndarray
+        """
+        return cls.from_signatures(
+            i.signature if isinstance(i, Hand) else Hand(i).signature for i in groups
+            )
+
+    @staticmethod
+    def _top(bits : np.ndarray) -> np.ndarray:
+        """
+        逐4位掩码中最高的置位所在的点数(无置位时为0)
+
+        :param bits: 逐4位掩码(只有各点数的第3位可能置位)
+        :type bits: np.ndarray
+        :return: 点数
+        :rtype: np.ndarray
+        """
+        low = bits >> _U(3)
+        for shift in (4, 8, 16, 32): # 把最高位向下铺满，置位数即为点数+1
+            low |= low >> _U(shift)
+        return np.bitwise_count(low).astype(np.int8) - np.int8(1) + (bits == 0).view(np.int8)
+
+    @staticmethod
+    def _bottom(bits : np.ndarray) -> np.ndarray:
+        """
+        逐4位掩码中最低的置位所在的点数
+
+        :param bits: 逐4位掩码(只有各点数的第3位可能置位)
+        :type bits: np.ndarray
+        :return: 点数
+        :rtype: np.ndarray
+        """
+        return np.bitwise_count((bits & (~bits + _ONE)) - _ONE).astype(np.int8) >> np.int8(2)
+
+    @staticmethod
+    def _rows(c : np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        按步长15直接读出每行的前8字节与后7字节(非对齐视图，免去补齐复制)，并校验张数上限
+        (整块按字节取一次最大值，王再由后7字节的按位或检查，都不产生中间数组)
+
+        :param c: (N, 15)点数计数矩阵(int8，连续)
+        :type c: np.ndarray
+        :return: (点数1~8的字节, 点数9~15的字节)
+        :rtype: Tuple[np.ndarray, np.ndarray]
+        """
+        flat = c.reshape(-1)
+        if flat.view(np.uint8).max(initial = 0) > _MAX_COUNT:
+            raise ValueError("Rank counts exceed a single deck.")
+        low = np.ndarray((len(c),), dtype = "<u8", buffer = flat, offset = 0, strides = (15,))
+        high = np.ndarray((len(c),), dtype = "<u8", buffer = flat, offset = 7, strides = (15,)) >> _U(8)
+        if np.bitwise_or.reduce(high) & _JOKERS_OVER:
+            raise ValueError("Rank counts exceed a single deck.")
+        return low, high
+
+    @staticmethod
+    def _matrix(counts : np.ndarray) -> np.ndarray:
+        """
+        检查并整理点数计数矩阵
+
+        :param counts: (N, 15)点数计数矩阵
+        :type counts: np.ndarray
+        :return: 连续的int8矩阵
+        :rtype: np.ndarray
+        """
+        c = np.ascontiguousarray(counts, dtype = np.int8)
+        if c.ndim != 2 or c.shape[1] != 15:
+            raise ValueError(f"Expect an (N, 15) matrix, got {c.shape}.")
+        return c
+
+    @classmethod
+    def _row_keys(cls, c : np.ndarray) -> np.ndarray:
+        """
+        计数矩阵各行的键: 两个字节视图错开3位合并，每字节的低3位、次3位各为一个点数的张数
+
+        :param c: (N, 15)点数计数矩阵(int8，连续)
+        :type c: np.ndarray
+        :return: 键(uint64)
+        :rtype: np.ndarray
+        """
+        low, high = cls._rows(c)
+        return low | (high << _U(3))
+
+    @staticmethod
+    def _perfect(keys : np.ndarray, values : np.ndarray) -> _Table:
+        """
+        为给定的键寻找乘法完美哈希(槽位数从小到大尝试，乘数由固定种子生成)
+
+        :param keys: 键(uint64，互不相同且非0)
+        :type keys: np.ndarray
+        :param values: 各键的打包结果(<u4)
+        :type values: np.ndarray
+        :return: 完美哈希表
+        :rtype: _Table
+        """
+        rng = random.Random(0)
+        for bits in range(12, 20):
+            shift = _U(64 - bits)
+            for _ in range(4096):
+                mult = _U(rng.getrandbits(64) | 1)
+                slots = (keys * mult) >> shift
+                if len(np.unique(slots)) != len(keys):
+                    continue
+                table_keys = np.zeros(1 << bits, dtype = np.uint64)
+                table_values = np.zeros(1 << bits, dtype = "<u4")
+                table_keys[slots] = keys
+                table_values[slots] = values
+                return _Table(mult, shift, table_keys, table_values)
+        raise RuntimeError("No perfect hash found.")
+
+    @staticmethod
+    def _pack(codes : np.ndarray, levels : np.ndarray) -> np.ndarray:
+        """
+        把识别结果打包为<u4(各字节依次为牌型码与3列大小)
+
+        :param codes: 牌型码
+        :type codes: np.ndarray
+        :param levels: (N, 3)大小
+        :type levels: np.ndarray
+        :return: 打包结果
+        :rtype: np.ndarray
+        """
+        packed = np.empty((len(codes), 4), dtype = np.int8)
+        packed[:, 0] = codes
+        packed[:, 1:] = levels
+        return packed.reshape(-1).view("<u4")
+
+    @classmethod
+    def _build(cls) -> Tuple[_Table, ...]:
+        """
+        由Identifier的查找表生成(计数矩阵键, 签名键)两张完美哈希表，值由逐4位运算得出
+
+        :return: (计数矩阵键的表, 签名键的表)
+        :rtype: Tuple[_Table, ...]
+        """
+        sigs = np.array(sorted(Identifier._table or Identifier._build()), dtype = np.uint64) # pylint: disable=W0212
+        values = cls._pack(*cls._classify(sigs))
+        cls._tables = (cls._perfect(cls._row_keys(cls.from_signatures(sigs)), values), cls._perfect(sigs, values))
+        return cls._tables
+
+    @staticmethod
+    def _lookup(table : _Table, key : np.ndarray, out : np.ndarray) -> np.ndarray:
+        """
+        查表识别一块(不超过_CHUNK个)，打包结果直接写入out(未命中为0)
+
+        :param table: 与键对应的完美哈希表
+        :type table: _Table
+        :param key: 键(uint64)
+        :type key: np.ndarray
+        :param out: 打包结果(<u4)
+        :type out: np.ndarray
+        :return: 未命中的行
+        :rtype: np.ndarray
+        """
+        slot = key * table.mult
+        slot >>= table.shift
+        slot = slot.view(np.intp)
+        hit = table.keys.take(slot) == key
+        np.multiply(table.values.take(slot), hit, out = out)
+        return ~hit
+
+    @staticmethod
+    def _planes(sig : np.ndarray) -> np.ndarray:
+        """
+        识别查表未命中且含三张的行: 这样的行只可能是带翅膀的飞机，否则即为非法牌组
+        (与_classify在这些行上的结果相同，只做飞机所需的运算)
+
+        :param sig: 点数计数签名(uint64)
+        :type sig: np.ndarray
+        :return: 打包结果(<u4)
+        :rtype: np.ndarray
+        """
+        halves = (sig & _LOW_NIBBLES) + ((sig >> _U(4)) & _LOW_NIBBLES)
+        n = (halves * _BYTE_SUM) >> _U(56)
+        x = sig ^ _THREES
+        triple = ~(((x & _SEVENS) + _SEVENS) | x | _SEVENS) & _EIGHTS
+        scale = np.bitwise_count(triple).astype(np.uint64)
+        rest = n - _U(3) * scale
+        wings = (rest == 0) | (rest == scale) | (
+            (rest == _U(2) * scale) & ((sig & ~((triple >> _U(3)) * _F) & _NOT_TWOS) == 0)
+            )
+        plane = (n >= _U(6)) & ((triple & _RANK_13) == 0) & wings
+        # 最大三张的点数r: 置位(第4r位)转为浮点数后的指数为4r+1(各点数至多一位，转换不会进位)
+        ttop = ((np.frexp((triple >> _U(3)).astype(np.float64))[1] - 1) >> 2).astype(np.uint64)
+        packed = _U(PLANE) | (scale << _U(8)) | (rest << _U(16)) | (ttop << _U(24))
+        return (packed * plane).astype("<u4")
+
+    @staticmethod
+    def _key_planes(key : np.ndarray) -> np.ndarray:
+        """
+        与_planes相同，但直接在计数矩阵的键上运算(免去还原签名)
+
+        :param key: 计数矩阵的键(uint64)
+        :type key: np.ndarray
+        :return: 打包结果(<u4)
+        :rtype: np.ndarray
+        """
+        x = key ^ _BYTE_THREES
+        triple = ~(x | (x >> _U(1)) | (x >> _U(2))) & (_BYTE_LOWS | _BYTE_HIGHS)
+        n = (((key & _BYTE_SEVENS) + ((key >> _U(3)) & _BYTE_SEVENS)) * _BYTE_SUM) >> _U(56)
+        scale = np.bitwise_count(triple).astype(np.uint64)
+        rest = n - _U(3) * scale
+        wings = (rest == 0) | (rest == scale) | (
+            (rest == _U(2) * scale) & ((key & ~(triple * _U(7)) & _BYTE_ODDS) == 0)
+            )
+        plane = (n >= _U(6)) & ((triple & _KEY_RANK_13) == 0) & wings
+        # 点数9~15的置位(第8j+3位)乘以2^61后排在点数1~8之上，浮点数的指数e满足(e-1)>>3 = 点数-1
+        top = (triple & _BYTE_HIGHS).astype(np.float64) * 2.0 ** 61 + (triple & _BYTE_LOWS).astype(np.float64)
+        ttop = (((np.frexp(top)[1] - 1) >> 3) + 1).astype(np.uint64)
+        packed = _U(PLANE) | (scale << _U(8)) | (rest << _U(16)) | (ttop << _U(24))
+        return (packed * plane).astype("<u4")
+
+    @staticmethod
+    def _unpack(packed : np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        拆分打包结果
+
+        :param packed: 打包结果(<u4)
+        :type packed: np.ndarray
+        :return: (牌型码(N,), 大小(N, 3))，均为packed上的视图
+        :rtype: Tuple[np.ndarray, np.ndarray]
+        """
+        view = packed.view(np.int8).reshape(-1, 4)
+        return view[:, 0], view[:, 1:]
+
+    @classmethod
+    def classify(cls, counts : np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        批量识别牌型
+
+        :param counts: (N, 15)点数计数矩阵，每行须取自同一副牌
+        :type counts: np.ndarray
+        :return: (牌型码(N,), 大小(N, 3))
+        :rtype: Tuple[np.ndarray, np.ndarray]
+        """
+        c = cls._matrix(counts)
+        table = (cls._tables or cls._build())[0]
+        packed = np.empty(len(c), dtype = "<u4")
+        for i in range(0, len(c), _CHUNK):
+            key = cls._row_keys(c[i:i + _CHUNK])
+            out = packed[i:i + _CHUNK]
+            rows = np.flatnonzero(cls._lookup(table, key, out))
+            out[rows] = cls._key_planes(key[rows])
+        return cls._unpack(packed)
+
+    @classmethod
+    def classify_signatures(cls, sig : np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        按点数计数签名批量识别牌型
+
+        :param sig: 点数计数签名(uint64)
+        :type sig: np.ndarray
+        :return: (牌型码(N,), 大小(N, 3))
+        :rtype: Tuple[np.ndarray, np.ndarray]
+        """
+        sig = np.asarray(sig, dtype = np.uint64)
+        table = (cls._tables or cls._build())[1]
+        packed = np.empty(len(sig), dtype = "<u4")
+        for i in range(0, len(sig), _CHUNK):
+            block = sig[i:i + _CHUNK]
+            out = packed[i:i + _CHUNK]
+            rows = np.flatnonzero(cls._lookup(table, block, out))
+            out[rows] = cls._planes(block[rows]) # 不含三张的行在_planes中得到0
+        return cls._unpack(packed)
+
+    @classmethod
+    def _classify(cls, sig : np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        按逐4位运算识别签名(与Identifier.lookup相同，用于生成查找表与判定飞机)
+
+        :param sig: 点数计数签名(uint64)
+        :type sig: np.ndarray
+        :return: (牌型码(N,), 大小(N, 3))
+        :rtype: Tuple[np.ndarray, np.ndarray]
+        """
+        halves = (sig & _LOW_NIBBLES) + ((sig >> _U(4)) & _LOW_NIBBLES)
+        n = ((halves * _BYTE_SUM) >> _U(56)).astype(np.int8)
+        held = (((sig & _SEVENS) + _SEVENS) | sig) & _EIGHTS     # 张数非0的点数
+        x = sig ^ _THREES
+        triple = ~(((x & _SEVENS) + _SEVENS) | x | _SEVENS) & _EIGHTS  # 张数恰为3的点数
+        s = np.bitwise_count(held).astype(np.int8)
+        scale = np.bitwise_count(triple).astype(np.int8)
+        ttop = cls._top(triple)
+        # 持有的点数是否相连: 相连的逐4位1乘以15再加上最低位恰为2的幂
+        ones = held >> _U(3)
+        y = ones * _F + (ones & (~ones + _ONE))
+        run = (y & (y - _ONE)) == 0
+        top = cls._bottom(held) + s - np.int8(1) # 只在相连(或只有一种点数)时使用
+        pairs = (sig & _NOT_TWOS) == 0
+        rest = n - np.int8(3) * scale
+        big = n >= 6
+
+        # 以下各牌型的条件互斥
+        one = n == 1
+        pair = (n == 2) & (s == 1)
+        kk = (n == 2) & ((sig & _U(0xFF << 56)) == _JOKERS)
+        bomb = (n == 4) & (s == 1)
+        fullhouse = ((n == 3) & (s == 1)) | (((n == 4) | (n == 5)) & (s == 2) & (scale == 1))
+        straight = (n >= 5) & (s == n) & run & ((held & _HIGH_RANKS) == 0)
+        spairs = big & pairs & run & ((held & _RANK_13) == 0)
+        wings = (rest == 0) | (rest == scale) | (
+            (rest == np.int8(2) * scale) & ((sig & ~((triple >> _U(3)) * _F) & _NOT_TWOS) == 0)
+            )
+        plane = big & (scale > 0) & ((triple & _RANK_13) == 0) & wings
+
+        def i8(mask : np.ndarray) -> np.ndarray:
+            return mask.view(np.int8)
+
+        codes = (i8(one) * np.int8(SINGLE) + i8(pair) * np.int8(PAIR) + i8(kk) * np.int8(KK)
+                 + i8(bomb) * np.int8(BOMB) + i8(fullhouse) * np.int8(FULLHOUSE)
+                 + i8(straight) * np.int8(STRAIGHT) + i8(spairs) * np.int8(SPAIRS) + i8(plane) * np.int8(PLANE))
+        by_top = i8(one | pair | bomb | straight | spairs)
+        by_triple = i8(fullhouse | plane)
+        levels = np.empty((len(sig), 3), dtype = np.int8)
+        levels[:, 0] = i8(fullhouse | straight | spairs) * n + i8(plane) * scale
+        levels[:, 1] = i8(plane) * rest
+        levels[:, 2] = by_top * top + by_triple * ttop
+        return codes, levels
+
+    @classmethod
+    def compare(cls,
+                a_codes : np.ndarray,
+                a_levels : np.ndarray,
+                b_codes : np.ndarray,
+                b_levels : np.ndarray
+                ) -> np.ndarray:
+        """
+        批量比较牌型(逐项与Judger.compare(a, b)一致)
+
+        :param a_codes: 上家的牌型码
+        :type a_codes: np.ndarray
+        :param a_levels: 上家的大小
+        :type a_levels: np.ndarray
+        :param b_codes: 本家的牌型码
+        :type b_codes: np.ndarray
+        :param b_levels: 本家的大小
+        :type b_levels: np.ndarray
+        :return: 比较状态码(0为b的牌型非法;1为上家大,无法打出;2为下家打,可以出牌)
+        :rtype: np.ndarray
+        """
+        al = np.asarray(a_levels)
+        bl = np.asarray(b_levels)
+        outcome = _OUTCOMES.take(np.asarray(a_codes, dtype = np.intp) * 9 + np.asarray(b_codes))
+
+        # 牌型相同(含都是炸弹): 形状(长度、翅膀)一致时比较最大点数
+        same = (al[:, 0] == bl[:, 0]) & (al[:, 1] == bl[:, 1])
+        result = same.view(np.int8) * ((al[:, 2] < bl[:, 2]).view(np.int8) + np.int8(1))
+        return np.where(outcome == 3, result, outcome)
+
+    @classmethod
+    def beats(cls,
+              a_codes : np.ndarray,
+              a_levels : np.ndarray,
+              b_codes : np.ndarray,
+              b_levels : np.ndarray
+              ) -> np.ndarray:
+        """
+        批量判断b能否压过a
+
+        :return: 布尔数组
+        :rtype: np.ndarray
+        """
+        return cls.compare(a_codes, a_levels, b_codes, b_levels) == 2
+
+    @classmethod
+    def to_cards(cls, code : int, level : np.ndarray) -> Cards:
+        """
+        把一项识别结果转换为Cards
+
+        :param code: 牌型码
+        :type code: int
+        :param level: 大小(3项)
+        :type level: np.ndarray
+        :return: 牌型信息类
+        :rtype: Cards
+        """
+        pattern = Pattern(int(code))
+        length, wing, rank = (int(i) for i in level)
+        match pattern:
+            case Pattern.SINGLE | Pattern.PAIR | Pattern.BOMB:
+                return Cards(pattern, rank)
+            case Pattern.STRAIGHT | Pattern.FULLHOUSE | Pattern.SPAIRS:
+                return Cards(pattern, (length, rank))
+            case Pattern.PLANE:
+                return Cards(pattern, (length, wing, rank))
+        return Cards(pattern)
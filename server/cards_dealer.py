@@ -0,0 +1,192 @@
+"""
+发牌引擎，包括:
++ 由单个64位种子完全确定的一副牌(三家各17张、3张地主牌与首个叫分的座位)，可按种子重现
++ 可设定种子、每张牌桌各自独立的发牌器(没有共享的可变状态)
++ 基于NumPy的批量发牌，供模拟与压力测试使用(只在批量函数内导入NumPy，发牌器本身只依赖标准库)
+"""
+# pylint: disable=C0415
+# 抑制警告：
+# + C0415:在函数内导入。服务器的运行环境没有NumPy，只有批量函数需要它。
+from typing import TYPE_CHECKING, NamedTuple, Optional, Tuple
+import random
+if TYPE_CHECKING:
+    import numpy as np
+
+# -*- encoding: utf-8 -*-
+
+_MASK64 = (1 << 64) - 1
+_GOLDEN = 0x9E3779B97F4A7C15 # splitmix64的步长
+_MIX1 = 0xBF58476D1CE4E5B9
+_MIX2 = 0x94D049BB133111EB
+_FIRST = 53 # 第0~52个随机数用于洗牌，第53个决定首个叫分的座位
+
+class Deal(NamedTuple):
+    """
+    一副牌(牌以cards_hand的54位掩码表示)
+    """
+    seed : int                      # 种子，replay(seed)即可重现
+    hands : Tuple[int, int, int]    # 座位1~3的17张手牌
+    lords : int                     # 3张地主牌
+    first : int                     # 首个叫分的座位号
+
+class Deals(NamedTuple):
+    """
+    批量发出的牌(第i行与replay(seeds[i])相同)
+    """
+    seeds : "np.ndarray"  # 种子(uint64, (N,))
+    hands : "np.ndarray"  # 手牌掩码(uint64, (N, 3))
+    lords : "np.ndarray"  # 地主牌掩码(uint64, (N,))
+    first : "np.ndarray"  # 首个叫分的座位号(int8, (N,))
+
+def derive(seed : int, index : int) -> int:
+    """
+    由种子与序号派生出新的64位种子(splitmix64)，也用作发牌时的第index个随机数
+
+    :param seed: 种子
+    :type seed: int
+    :param index: 序号
+    :type index: int
+    :return: 派生的种子
+    :rtype: int
+    """
+    z = (seed + _GOLDEN * (index + 1)) & _MASK64
+    z = ((z ^ (z >> 30)) * _MIX1) & _MASK64
+    z = ((z ^ (z >> 27)) * _MIX2) & _MASK64
+    return z ^ (z >> 31)
+
+def _derive(values : "np.ndarray", index : int) -> "np.ndarray":
+    """
+    derive的批量版本(uint64运算自然按2^64取模)
+
+    :param values: 种子(uint64)
+    :type values: np.ndarray
+    :param index: 序号
+    :type index: int
+    :return: 派生的种子(uint64)
+    :rtype: np.ndarray
+    """
+    import numpy as np
+    z = values + np.uint64(_GOLDEN * (index + 1) & _MASK64)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(_MIX1)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(_MIX2)
+    return z ^ (z >> np.uint64(31))
+
+def replay(seed : int) -> Deal:
+    """
+    按种子发牌: 以derive(seed, k)为随机数对54张牌做Fisher-Yates洗牌，前51张依次发给座位1~3，后3张为地主牌
+
+    :param seed: 64位种子
+    :type seed: int
+    :return: 一副牌
+    :rtype: Deal
+    """
+    seed &= _MASK64
+    deck = list(range(54))
+    for k in range(53):
+        i = 53 - k
+        z = (seed + _GOLDEN * (k + 1)) & _MASK64
+        z = ((z ^ (z >> 30)) * _MIX1) & _MASK64
+        z = ((z ^ (z >> 27)) * _MIX2) & _MASK64
+        j = (z ^ (z >> 31)) % (i + 1)
+        deck[i], deck[j] = deck[j], deck[i]
+    masks = [0, 0, 0, 0]
+    for n, bit in enumerate(deck):
+        masks[n // 17] |= 1 << bit
+    return Deal(seed, (masks[0], masks[1], masks[2]), masks[3], derive(seed, _FIRST) % 3 + 1)
+
+def seeds(seed : int, count : int, start : int = 0) -> "np.ndarray":
+    """
+    发牌器Dealer(seed)依次发出的第start~start+count-1副牌的种子
+
+    :param seed: 发牌器的种子
+    :type seed: int
+    :param count: 个数
+    :type count: int
+    :param start: 起始序号
+    :type start: int
+    :return: 种子(uint64)
+    :rtype: np.ndarray
+    """
+    import numpy as np
+    index = np.arange(start, start + count, dtype = np.uint64)
+    z = np.uint64(seed & _MASK64) + np.uint64(_GOLDEN) * (index + np.uint64(1))
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(_MIX1)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(_MIX2)
+    return z ^ (z >> np.uint64(31))
+
+def bulk(deal_seeds : "np.ndarray") -> Deals:
+    """
+    批量按种子发牌，与逐个replay的结果相同(洗牌的每一步对所有行一起进行)
+
+    :param deal_seeds: 种子(uint64, (N,))
+    :type deal_seeds: np.ndarray
+    :return: 各副牌
+    :rtype: Deals
+    """
+    import numpy as np
+    deal_seeds = np.asarray(deal_seeds, dtype = np.uint64)
+    count = len(deal_seeds)
+    rows = np.arange(count)
+    deck = np.tile(np.arange(54, dtype = np.uint64), (count, 1))
+    for k in range(53):
+        i = 53 - k
+        j = (_derive(deal_seeds, k) % np.uint64(i + 1)).astype(np.intp)
+        top = deck[:, i].copy()
+        deck[:, i] = deck[rows, j]
+        deck[rows, j] = top
+    one = np.uint64(1)
+    masks = np.zeros((count, 4), dtype = np.uint64)
+    for n in range(54):
+        masks[:, n // 17] |= one << deck[:, n]
+    first = (_derive(deal_seeds, _FIRST) % np.uint64(3)).astype(np.int8) + 1
+    return Deals(deal_seeds, masks[:, :3].copy(), masks[:, 3].copy(), first)
+
+class Dealer:
+    """
+    发牌器，每张牌桌各持有一个
+
+    第k副牌的种子为derive(种子, k)，因此同一种子的发牌器总是依次发出相同的牌，
+    与seeds(种子, n)后bulk的结果一致；每副牌也可以单独按其种子用replay重现。
+    """
+    __slots__ = ("_seed", "_count")
+
+    def __init__(self, seed : Optional[int] = None):
+        """
+        初始化发牌器
+
+        :param seed: 种子(None即为随机选取)
+        :type seed: Optional[int]
+        """
+        self._seed = random.SystemRandom().getrandbits(64) if seed is None else seed & _MASK64
+        self._count = 0
+
+    @property
+    def seed(self) -> int:
+        """
+        发牌器的种子
+
+        :return: 种子
+        :rtype: int
+        """
+        return self._seed
+
+    @property
+    def count(self) -> int:
+        """
+        已发出的副数
+
+        :return: 副数
+        :rtype: int
+        """
+        return self._count
+
+    def deal(self) -> Deal:
+        """
+        发出下一副牌
+
+        :return: 一副牌
+        :rtype: Deal
+        """
+        seed = derive(self._seed, self._count)
+        self._count += 1
+        return replay(seed)
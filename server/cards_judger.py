@@ -0,0 +1,39 @@
+"""
+牌型比较类，包括:
++ 可比较类型判断
++ 值大小判断
+"""
+# pylint: disable=R0903
+# 抑制警告：
+# + R0903:类的公共方法太少(小于2)。
+from cards_data import Cards
+
+# -*- encoding: utf-8 -*-
+
+# NOTE: 在下一次可能的更新前，该文件应消极改写。
+# NOTE: 本文件在client与server下各有一份，修改时需保持两份一致。
+
+class Judger:
+    """
+    牌型对比单例
+
+    只比较Cards预先打包的形状与强度键(见cards_data)
+    """
+
+    @classmethod
+    def compare(cls, a : Cards, b : Cards) -> int:
+        """
+        比较牌型
+
+        :param a: 上家的出牌牌型(确保绝对非NONE)
+        :type a: Cards
+        :param b: 本家的选择牌型
+        :type b: Cards
+        :return: 比较状态码(0为b的牌型非法;1为上家大,无法打出;2为下家打,可以出牌)
+        :rtype: int
+        """
+        if a.tier or b.tier: # 炸弹、王炸按等级与点数比较
+            return 1 if a.key >= b.key else 2
+        if a.shape != b.shape or not b.shape:
+            return 0
+        return 1 if a.key >= b.key else 2
@@ -0,0 +1,686 @@
+"""
+对局记录模块，包括:
++ 紧凑的二进制对局记录(发牌种子、叫分、每手出牌与时间差，出牌按剩余手牌中的组合序号记录)
++ 只追加的记录文件与旁路索引文件，由后台线程批量写入
++ 以内存映射读取，按对局编号直接定位，无需解析整个文件
+"""
+# pylint: disable=R0914
+# 抑制警告：
+# + R0914:局部变量过多。
+from math import comb
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Tuple
+import atexit
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+from cards_dealer import replay
+
+# -*- encoding: utf-8 -*-
+
+# 记录文件: 8字节文件头，之后是逐局首尾相接的记录(小端序):
+#   varint 之后的字节数 | varint 开局时刻(毫秒) | varint 牌桌编号 | u8 发牌次数D | D × u64 发牌种子
+#   varint 出牌次数P | 其余字节为一个按混合进制编码的整数(小端序)
+# 混合进制的各位依次为: 地主座位、赢家座位、每次发牌的首个叫分座位与叫分，以及每手出牌的
+# 用时(位数与尾数)和出牌。发牌可由种子重现，出牌只记录张数与在该座位剩余手牌中的组合序号；
+# 跟牌时先记一位: 不出、与上一手同张数或其他张数。出牌由地主开始按座位轮流，座位号不必记录。
+# 出牌不在剩余手牌中时(如未记录发牌)整局改为直接记录54位掩码。
+# 对局编号即记录在索引中的位置，不写入记录。
+# 索引文件: 8字节文件头，之后第k个u64为对局k在记录文件中的偏移量。
+MAGIC = b"KJNL\x02\x00\x00\x00"
+INDEX_MAGIC = b"KJIX\x01\x00\x00\x00"
+_SEED = struct.Struct("<Q")
+_OFFSET = struct.Struct("<Q")
+_DELTA_BITS = 32 # 用时的最大位数(毫秒数超过2^32 - 1时截断)
+_COMB = [[comb(h, n) for n in range(21)] for h in range(21)] # 手牌至多20张
+
+class Record(NamedTuple):
+    """
+    一局的记录
+    """
+    game : int                                          # 对局编号(每个记录文件内从0递增)
+    table : int                                         # 牌桌编号
+    start : float                                       # 开局(开始叫分)的时刻(精确到毫秒)
+    landlord : int                                      # 地主座位号
+    winner : int                                        # 赢家座位号
+    deals : Tuple[Tuple[int, int, Tuple[int, ...]], ...] # 各次发牌的(种子, 首个叫分的座位, 依次的叫分)，三家都不叫时会重新发牌
+    plays : Tuple[Tuple[int, int], ...]                 # 依次的(距上一事件的毫秒数, 出牌掩码)
+
+    def seats(self) -> Iterator[Tuple[int, int, int]]:
+        """
+        带座位号的出牌
+
+        :return: 依次的(座位号, 距上一事件的毫秒数, 出牌掩码)
+        :rtype: Iterator[Tuple[int, int, int]]
+        """
+        seat = self.landlord
+        for delta, mask in self.plays:
+            yield seat, delta, mask
+            seat = seat % 3 + 1
+
+def _varint(n : int, out : bytearray) -> None:
+    """
+    写入无符号LEB128变长整数
+
+    :param n: 非负整数
+    :type n: int
+    :param out: 输出缓冲区
+    :type out: bytearray
+    """
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+def _read_varint(buf : bytes, i : int) -> Tuple[int, int]:
+    """
+    读取无符号LEB128变长整数
+
+    :param buf: 缓冲区
+    :type buf: bytes
+    :param i: 起始位置
+    :type i: int
+    :return: (整数, 之后的位置)
+    :rtype: Tuple[int, int]
+    """
+    v = shift = 0
+    while True:
+        b = buf[i]
+        i += 1
+        v |= (b & 0x7F) << shift
+        if b < 0x80:
+            return v, i
+        shift += 7
+
+def _hands(deals : Sequence[Tuple[int, int, Sequence[int]]], landlord : int) -> Optional[List[int]]:
+    """
+    由最后一次发牌的种子重现开局时三家的手牌(地主已拿到地主牌)
+
+    :param deals: 各次发牌的(种子, 首个叫分的座位, 依次的叫分)
+    :type deals: Sequence[Tuple[int, int, Sequence[int]]]
+    :param landlord: 地主座位号
+    :type landlord: int
+    :return: 座位1~3的手牌掩码(没有发牌或地主时为None)
+    :rtype: Optional[List[int]]
+    """
+    if not deals or not 1 <= landlord <= 3:
+        return None
+    deal = replay(deals[-1][0])
+    hands = list(deal.hands)
+    hands[landlord - 1] |= deal.lords
+    return hands
+
+def _combination(hand : int, mask : int) -> Tuple[int, int, int]:
+    """
+    出牌在手牌中的组合序号: 出牌各张在手牌中的位置p1 < p2 < ... < pn，序号为∑C(pi, i)
+
+    :param hand: 手牌掩码
+    :type hand: int
+    :param mask: 出牌掩码(须为手牌的子集)
+    :type mask: int
+    :return: (手牌张数, 出牌张数, 组合序号)
+    :rtype: Tuple[int, int, int]
+    """
+    h = n = index = 0
+    while hand:
+        low = hand & -hand
+        if mask & low:
+            n += 1
+            index += _COMB[h][n]
+        h += 1
+        hand ^= low
+    return h, n, index
+
+def _uncombination(h : int, n : int, index : int) -> List[int]:
+    """
+    由组合序号求出出牌各张在手牌中的位置(_combination的逆运算，从最高位起贪心选取)
+
+    :param h: 手牌张数
+    :type h: int
+    :param n: 出牌张数
+    :type n: int
+    :param index: 组合序号
+    :type index: int
+    :return: 各张的位置(降序)
+    :rtype: List[int]
+    """
+    if n == 1:
+        return [index]
+    chosen = []
+    while n:
+        h -= 1
+        c = _COMB[h][n]
+        if c <= index:
+            index -= c
+            chosen.append(h)
+            n -= 1
+    return chosen
+
+class _Digits:
+    """
+    混合进制整数的编码与解码: 编码时逐位登记(数字, 进制)，解码时按同样的顺序逐位取出
+    """
+    __slots__ = ("digits", "value")
+
+    def __init__(self, value : int = 0):
+        self.digits : List[Tuple[int, int]] = []
+        self.value = value
+
+    def put(self, digit : int, radix : int) -> None:
+        """
+        登记一位
+
+        :param digit: 数字(0 <= digit < radix)
+        :type digit: int
+        :param radix: 进制
+        :type radix: int
+        """
+        if not 0 <= digit < radix:
+            raise ValueError(f"Digit {digit} out of radix {radix}.")
+        self.digits.append((digit, radix))
+
+    def get(self, radix : int) -> int:
+        """
+        取出一位
+
+        :param radix: 进制
+        :type radix: int
+        :return: 数字
+        :rtype: int
+        """
+        self.value, digit = divmod(self.value, radix)
+        return digit
+
+    def put_delta(self, delta : int) -> None:
+        """
+        登记毫秒数: 先记是否为0(模拟对局中多为0)，再记位数与最高位以下的尾数
+
+        :param delta: 毫秒数
+        :type delta: int
+        """
+        delta = min(max(delta, 0), (1 << _DELTA_BITS) - 1)
+        self.put(delta > 0, 2)
+        if delta:
+            bits = delta.bit_length()
+            self.put(bits - 1, _DELTA_BITS)
+            if bits > 1:
+                self.put(delta - (1 << (bits - 1)), 1 << (bits - 1))
+
+    def get_delta(self) -> int:
+        """
+        取出毫秒数
+
+        :return: 毫秒数
+        :rtype: int
+        """
+        if not self.get(2):
+            return 0
+        bits = self.get(_DELTA_BITS) + 1
+        if bits == 1:
+            return 1
+        return (1 << (bits - 1)) + self.get(1 << (bits - 1))
+
+    def to_bytes(self) -> bytes:
+        """
+        编码为小端序字节
+
+        :return: 字节
+        :rtype: bytes
+        """
+        value = 0
+        for digit, radix in reversed(self.digits):
+            value = value * radix + digit
+        return value.to_bytes((value.bit_length() + 7) // 8, "little")
+
+def _encode_plays(digits : _Digits, plays : Sequence[Tuple[int, int]], hands : List[int]) -> bool:
+    """
+    按剩余手牌登记各手出牌
+
+    :param digits: 混合进制整数
+    :type digits: _Digits
+    :param plays: 依次的(距上一事件的毫秒数, 出牌掩码)，由地主开始
+    :type plays: Sequence[Tuple[int, int]]
+    :param hands: 开局时的手牌(从地主开始按座位轮流)
+    :type hands: List[int]
+    :return: 各手出牌是否都在剩余手牌中(否则应改为直接记录掩码)
+    :rtype: bool
+    """
+    hands = list(hands)
+    passes = 2  # 连续不出的次数，为2时本手为领出
+    last = 0    # 本轮上一手的张数
+    for i, (delta, mask) in enumerate(plays):
+        digits.put_delta(delta)
+        hand = hands[i % 3]
+        if mask & ~hand:
+            return False
+        h, n, index = _combination(hand, mask)
+        if passes == 2:
+            if not n:
+                return False
+            digits.put(n - 1, h)
+        elif not n:
+            digits.put(0, 3)
+        elif n == last:
+            digits.put(1, 3)
+        else:
+            digits.put(2, 3)
+            digits.put(n - 1, h)
+        if n:
+            digits.put(index, _COMB[h][n])
+            hands[i % 3] = hand ^ mask
+            passes = 0
+            last = n
+        else:
+            passes += 1
+    return True
+
+def _decode_plays(digits : _Digits, count : int, hands : List[int]) -> List[Tuple[int, int]]:
+    """
+    按剩余手牌取出各手出牌(_encode_plays的逆运算)
+
+    :param digits: 混合进制整数
+    :type digits: _Digits
+    :param count: 出牌次数
+    :type count: int
+    :param hands: 开局时的手牌(从地主开始按座位轮流)
+    :type hands: List[int]
+    :return: 依次的(距上一事件的毫秒数, 出牌掩码)
+    :rtype: List[Tuple[int, int]]
+    """
+    cards = []  # 各座位剩余的牌(按位升序的单个位)
+    for hand in hands:
+        bits = []
+        while hand:
+            low = hand & -hand
+            bits.append(low)
+            hand ^= low
+        cards.append(bits)
+    plays = []
+    passes = 2
+    last = 0
+    for i in range(count):
+        delta = digits.get_delta()
+        bits = cards[i % 3]
+        h = len(bits)
+        if passes == 2:
+            n = digits.get(h) + 1
+        else:
+            kind = digits.get(3)
+            n = digits.get(h) + 1 if kind == 2 else last * kind
+        mask = 0
+        if n:
+            for p in _uncombination(h, n, digits.get(_COMB[h][n])):
+                mask |= bits.pop(p)
+            passes = 0
+            last = n
+        else:
+            passes += 1
+        plays.append((delta, mask))
+    return plays
+
+class Recorder:
+    """
+    一局对局的记录器，牌桌在对局过程中逐项记录，结束后交给Journal编码写入
+    """
+    __slots__ = ("table", "start", "landlord", "winner", "deals", "plays", "_last")
+
+    def __init__(self, table : int):
+        """
+        开始记录一局(即开始叫分的时刻)
+
+        :param table: 牌桌编号
+        :type table: int
+        """
+        self.table = table
+        self.start = time.time()
+        self.landlord = 0
+        self.winner = 0
+        self.deals : List[Tuple[int, int, List[int]]] = []
+        self.plays : List[Tuple[int, int]] = []  # 依次的(距上一事件的毫秒数, 出牌掩码)
+        self._last = time.monotonic()
+
+    def deal(self, seed : int, first : int) -> None:
+        """
+        记录一次发牌
+
+        :param seed: 发牌种子
+        :type seed: int
+        :param first: 首个叫分的座位号
+        :type first: int
+        """
+        self.deals.append((seed, first, []))
+
+    def bid(self, score : int) -> None:
+        """
+        记录本次发牌后的一次叫分
+
+        :param score: 叫分(0为不叫)
+        :type score: int
+        """
+        self.deals[-1][2].append(score)
+
+    def play(self, mask : int) -> None:
+        """
+        记录一手出牌(按座位轮流，不出也要记录)
+
+        :param mask: 出牌掩码(0为不出)
+        :type mask: int
+        """
+        now = time.monotonic()
+        self.plays.append((int((now - self._last) * 1000), mask))
+        self._last = now
+
+    def finish(self, landlord : int, winner : int) -> None:
+        """
+        记录对局结果
+
+        :param landlord: 地主座位号
+        :type landlord: int
+        :param winner: 赢家座位号
+        :type winner: int
+        """
+        self.landlord = landlord
+        self.winner = winner
+
+    def encode(self) -> bytes:
+        """
+        编码为一条记录
+
+        :return: 记录
+        :rtype: bytes
+        """
+        digits = _Digits()
+        digits.put(self.landlord, 4)
+        digits.put(self.winner, 4)
+        for _, first, bids in self.deals:
+            digits.put(first, 4)
+            digits.put(len(bids), 4)
+            for i in bids:
+                digits.put(i, 4)
+
+        hands = _hands(self.deals, self.landlord)
+        mark = len(digits.digits)
+        relative = hands is not None
+        digits.put(relative, 2)
+        if relative:
+            landlord = self.landlord - 1
+            relative = _encode_plays(digits, self.plays, [hands[(landlord + i) % 3] for i in range(3)])
+            if not relative:
+                del digits.digits[mark:]
+                digits.put(0, 2)
+        if not relative:
+            for delta, mask in self.plays:
+                digits.put_delta(delta)
+                digits.put(mask, 1 << 54)
+
+        body = bytearray()
+        _varint(int(self.start * 1000), body)
+        _varint(self.table, body)
+        body.append(len(self.deals))
+        for seed, _, _ in self.deals:
+            body += _SEED.pack(seed)
+        _varint(len(self.plays), body)
+        body += digits.to_bytes()
+        head = bytearray()
+        _varint(len(body), head)
+        return bytes(head + body)
+
+def decode(buf : bytes, offset : int, game : int) -> Record:
+    """
+    解码一条记录
+
+    :param buf: 记录文件的内容(bytes或mmap)
+    :type buf: bytes
+    :param offset: 记录的偏移量
+    :type offset: int
+    :param game: 对局编号
+    :type game: int
+    :return: 记录
+    :rtype: Record
+    """
+    size, i = _read_varint(buf, offset)
+    end = i + size
+    start, i = _read_varint(buf, i)
+    table, i = _read_varint(buf, i)
+    seeds = []
+    for _ in range(buf[i]):
+        seeds.append(_SEED.unpack_from(buf, i + 1 + 8 * len(seeds))[0])
+    i += 1 + 8 * len(seeds)
+    count, i = _read_varint(buf, i)
+    digits = _Digits(int.from_bytes(buf[i:end], "little"))
+
+    landlord = digits.get(4)
+    winner = digits.get(4)
+    deals = []
+    for seed in seeds:
+        first = digits.get(4)
+        deals.append((seed, first, tuple(digits.get(4) for _ in range(digits.get(4)))))
+    hands = _hands(deals, landlord)
+    if digits.get(2) and hands is not None:
+        plays = _decode_plays(digits, count, [hands[(landlord - 1 + k) % 3] for k in range(3)])
+    else:
+        plays = [(digits.get_delta(), digits.get(1 << 54)) for _ in range(count)]
+    return Record(game, table, start / 1000, landlord, winner, tuple(deals), tuple(plays))
+
+def _recover(path : str, index_path : str) -> int:
+    """
+    打开(或新建)记录文件与索引文件，截掉崩溃时写了一半的尾部，使两者一致
+
+    :param path: 记录文件路径
+    :type path: str
+    :param index_path: 索引文件路径
+    :type index_path: str
+    :return: 已有的对局数
+    :rtype: int
+    """
+    for p, magic in ((path, MAGIC), (index_path, INDEX_MAGIC)):
+        if not os.path.exists(p) or os.path.getsize(p) < len(magic):
+            with open(p, "wb") as f:
+                f.write(magic)
+        with open(p, "rb") as f:
+            if f.read(len(magic)) != magic:
+                raise ValueError(f"{p} is not a game journal.")
+    size = os.path.getsize(path)
+    with open(index_path, "r+b") as idx, open(path, "r+b") as data:
+        count = (os.path.getsize(index_path) - len(INDEX_MAGIC)) // _OFFSET.size
+        end = len(MAGIC)
+        while count:
+            idx.seek(len(INDEX_MAGIC) + (count - 1) * _OFFSET.size)
+            offset = _OFFSET.unpack(idx.read(_OFFSET.size))[0]
+            data.seek(offset)
+            head = data.read(10)
+            if any(b < 0x80 for b in head): # 长度的变长整数已完整写入
+                length, i = _read_varint(head, 0)
+                end = offset + i + length
+                if end <= size:
+                    break
+            count -= 1
+            end = len(MAGIC)
+        idx.truncate(len(INDEX_MAGIC) + count * _OFFSET.size)
+        data.truncate(end)
+    return count
+
+class Journal:
+    """
+    对局记录文件的写入类
+
+    对局编号在调用线程上同步分配，记录器先进入队列，由后台线程编码后成批追加到记录文件，
+    随后追加索引(先写记录再写索引，崩溃后重新打开时按索引截掉不完整的尾部)。
+    """
+    _BATCH = 256
+
+    def __init__(self, path : str):
+        """
+        打开(或新建)记录文件，索引文件为path + ".idx"
+
+        :param path: 记录文件路径
+        :type path: str
+        """
+        self.path = path
+        self.index_path = path + ".idx"
+        self._count = _recover(self.path, self.index_path)
+        self._queue : "queue.SimpleQueue[Optional[Recorder]]" = queue.SimpleQueue()
+        self._thread : Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def count(self) -> int:
+        """
+        已分配编号的对局数(含尚未写入文件的)
+
+        :return: 对局数
+        :rtype: int
+        """
+        return self._count
+
+    def append(self, record : Recorder) -> int:
+        """
+        追加一局记录(不阻塞，编码与写入在后台线程进行，之后不应再修改记录器)
+
+        :param record: 已结束对局的记录器
+        :type record: Recorder
+        :return: 对局编号
+        :rtype: int
+        """
+        with self._lock:
+            game = self._count
+            self._count += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target = self._run, name = "Journal", daemon = True)
+                self._thread.start()
+                atexit.register(self.close)
+            self._queue.put(record)
+        return game
+
+    def _run(self) -> None:
+        """
+        后台写入线程，每次取出队列中已积压的记录合并写入
+        """
+        data = open(self.path, "ab") # pylint: disable=R1732
+        index = open(self.index_path, "ab") # pylint: disable=R1732
+        try:
+            pos = data.tell()
+            while True:
+                item = self._queue.get()
+                batch : List[Optional[Recorder]] = [item]
+                while item is not None and len(batch) < self._BATCH:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    batch.append(item)
+
+                offsets = []
+                chunks = []
+                for i in batch:
+                    if i is None:
+                        break
+                    chunk = i.encode()
+                    offsets.append(_OFFSET.pack(pos))
+                    chunks.append(chunk)
+                    pos += len(chunk)
+                data.write(b"".join(chunks))
+                data.flush()
+                index.write(b"".join(offsets))
+                index.flush()
+
+                if batch[-1] is None:
+                    return
+        finally:
+            data.close()
+            index.close()
+
+    def close(self) -> None:
+        """
+        写完队列中剩余的记录并停止后台线程(进程退出时自动调用)
+        """
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+class JournalReader:
+    """
+    对局记录文件的读取类，以内存映射打开，按对局编号经索引直接定位
+
+    打开时映射的是当时的文件内容，之后追加的对局需重新打开才能读到。
+    """
+
+    def __init__(self, path : str):
+        """
+        打开记录文件与其索引文件(path + ".idx")
+
+        :param path: 记录文件路径
+        :type path: str
+        """
+        with open(path, "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+        with open(path + ".idx", "rb") as f:
+            self._index = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+        if self._data[:len(MAGIC)] != MAGIC or self._index[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a game journal.")
+        count = (len(self._index) - len(INDEX_MAGIC)) // _OFFSET.size
+        while count and self.offset(count - 1) >= len(self._data): # 索引可能比记录先落盘
+            count -= 1
+        self._count = count
+
+    def __enter__(self) -> "JournalReader":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def offset(self, game : int) -> int:
+        """
+        对局在记录文件中的偏移量
+
+        :param game: 对局编号
+        :type game: int
+        :return: 偏移量
+        :rtype: int
+        """
+        return _OFFSET.unpack_from(self._index, len(INDEX_MAGIC) + game * _OFFSET.size)[0]
+
+    def __getitem__(self, game : int) -> Record:
+        if not 0 <= game < self._count:
+            raise IndexError(f"Game {game} is not in the journal.")
+        return decode(self._data, self.offset(game), game)
+
+    def __iter__(self) -> Iterator[Record]:
+        return self.records()
+
+    def records(self, start : int = 0, stop : Optional[int] = None) -> Iterator[Record]:
+        """
+        顺序读取一段连续编号的对局(按记录首尾相接顺序解码，不再查索引)
+
+        :param start: 起始编号
+        :type start: int
+        :param stop: 结束编号(不含，None为到末尾)
+        :type stop: Optional[int]
+        :return: 各局记录
+        :rtype: Iterator[Record]
+        """
+        stop = self._count if stop is None else min(stop, self._count)
+        if start >= stop:
+            return
+        data = self._data
+        offset = self.offset(start)
+        for game in range(start, stop):
+            yield decode(data, offset, game)
+            size, i = _read_varint(data, offset)
+            offset = i + size
+
+    def close(self) -> None:
+        """
+        关闭内存映射
+        """
+        self._data.close()
+        self._index.close()
@@ -2,6 +2,7 @@
 客户端->异步服务器模块实现，包含了：
 + 控制台日志输出
 + 单例模式的server连接管理类
++ 多牌桌管理类
 """
 # pylint: disable=W0221
 # pylint: disable=R0903
@@ -12,13 +13,21 @@
 # + R0903:类的公共方法太少(小于2)。
 # + W0603:使用了global关键字，pylint不鼓励使用任何的global关键字以在函数内部更改全局变量。
 # + W0718:过于宽松的except异常捕获。
+from multiprocessing.connection import Connection
+from multiprocessing.reduction import recv_handle, send_handle
 import asyncio
 import os
+import secrets
+import socket
 import sys
-import json
-from typing import List, cast
+from typing import Callable, Dict, List, Optional, Tuple, cast
 from Game import Game, Player
+from cards_dealer import Dealer, derive
+from cards_evaluator import Evaluator
+from cards_hand import Hand
+from journal import Journal, Recorder
 from logger import Logger
+from protocol import HELLO, VERSION, BID_VERSION, Op, TextCodec, BinaryCodec
 
 # 运行路径初始化
 if getattr(sys, 'frozen', False):
@@ -27,151 +36,1054 @@ else:
     application_path = os.path.dirname(os.path.abspath(__file__))
 os.chdir(application_path)
 
-class Server:
+class Channel:
     """
-    异步服务器类
+    客户端输出通道，每个连接持有一个有界发送队列，由独立的写协程负责写出
+    """
+    def __init__(self, writer : asyncio.StreamWriter, backlog : int = 64):
+        """
+        初始化输出通道
+
+        :param writer: 网络输出流
+        :type writer: asyncio.StreamWriter
+        :param backlog: 发送队列允许积压的消息数量，超出即视为慢客户端并断开
+        :type backlog: int
+        """
+        self._writer = writer
+        self._queue : asyncio.Queue[bytes] = asyncio.Queue(backlog)
+        self._task = asyncio.create_task(self._write_run())
+        self.binary = False # 协商后是否使用二进制协议
+        self.version = 0    # 协商的二进制协议版本(0为文本协议)
+
+    @property
+    def isclosing(self) -> bool:
+        """
+        通道是否正在关闭
+
+        :return: 是否正在关闭
+        :rtype: bool
+        """
+        return self._writer.is_closing()
+
+    @property
+    def writer(self) -> asyncio.StreamWriter:
+        """
+        通道对应的网络输出流
+
+        :return: 网络输出流
+        :rtype: asyncio.StreamWriter
+        """
+        return self._writer
+
+    def send(self, data : bytes) -> bool:
+        """
+        把已编码的消息放入发送队列(不等待写出)
+
+        :param data: 已编码的消息
+        :type data: bytes
+        :return: 是否成功入队(积压超限时会断开连接并返回False)
+        :rtype: bool
+        """
+        if self._writer.is_closing():
+            return False
+        try:
+            self._queue.put_nowait(data)
+        except asyncio.QueueFull:
+            Logger.write(f"Slow client {self._writer.get_extra_info('peername')} exceeds backlog, disconnect.",
+                         t = "WARN",
+                         thread = "Channel.send")
+            self.close(abort = True)
+            return False
+        return True
+
+    async def _write_run(self) -> None:
+        """
+        写协程，把队列中已积压的消息合并写出后再等待drain
+        """
+        queue = self._queue
+        writer = self._writer
+        try:
+            while True:
+                writer.write(await queue.get())
+                queue.task_done()
+                while not queue.empty():
+                    writer.write(queue.get_nowait())
+                    queue.task_done()
+                await writer.drain()
+        except (ConnectionError, OSError) as e:
+            Logger.write(f"Write failed: {e}", t = "WARN", thread = "Channel._write_run")
+            writer.close()
+
+    async def flush(self, timeout : float = 1.0) -> None:
+        """
+        等待发送队列写空
+
+        :param timeout: 等待时限
+        :type timeout: float
+        """
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def close(self, abort : bool = False) -> None:
+        """
+        关闭通道与连接
+
+        :param abort: 是否丢弃未写出的数据立即断开(慢客户端的缓冲区可能永远写不空)
+        :type abort: bool
+        """
+        self._task.cancel()
+        if abort:
+            self._writer.transport.abort()
+        else:
+            self._writer.close()
+
+class Table:
+    """
+    牌桌类，每张牌桌持有独立的Game实例与各座位的连接
     """
-    _ready_status = 0
     _MAX_CONNECTIONS = 3
-    _current_connections = 0
-    _counter_lock = asyncio.Lock()  # 保护计数器
-    _writers : List[asyncio.StreamWriter] = []
-    _readers : List[asyncio.StreamReader] = []
-    _instance = None
-    _buffer : str = ''
+    _BID_TIMEOUT = 15.0 # 等待客户端叫分的时限(秒)，超时由服务器代为叫分
 
-    def __new__(cls, *argc, **kwargs):
-        if not cls._instance:
-            cls._instance = super().__new__(cls)
-        return cls._instance
+    def __init__(self,
+                 table_id : int,
+                 backlog : int = 64,
+                 seed : Optional[int] = None,
+                 journal : Optional[Journal] = None
+                 ):
+        """
+        初始化牌桌
 
-    def __init__(self, addr : str = '0.0.0.0', port : int = 8888, max_connection : int = 3):
+        :param table_id: 牌桌编号
+        :type table_id: int
+        :param backlog: 每个连接的发送队列上限
+        :type backlog: int
+        :param seed: 本桌发牌器的种子(None即为随机选取)
+        :type seed: Optional[int]
+        :param journal: 对局记录文件(None即为不记录)
+        :type journal: Optional[Journal]
         """
-        初始化服务器
+        self._id = table_id
+        self._journal = journal
+        self._record = Recorder(table_id) # 本局的记录，开局时重新创建
+        self._dealer = Dealer(seed) # 跨局延续，同一种子的牌桌依次发出相同的牌
+        self._game = Game(self._dealer)
+        self._ready_status = 0
+        self._backlog = backlog
+        self._channels : Dict[int, Channel] = {}
+        self._task : Optional[asyncio.Task] = None
+        self._ready = asyncio.Event()   # 全员准备屏障
+        self._begin = asyncio.Event()   # 发牌完成，开局
+        self._inbox : asyncio.Queue[Tuple[int, int]] = asyncio.Queue()   # (座位号, 出牌掩码)
+        self._bids : asyncio.Queue[Tuple[int, int]] = asyncio.Queue()    # (座位号, 叫分)
+        self._turn = 0
+        self._tokens : Dict[int, str] = {}                      # 座位号 -> 会话令牌
+        self._suspended : Dict[int, asyncio.TimerHandle] = {}   # 断线后等待重连的座位 -> 超时计时器
 
-        :param addr: 服务器地址(默认监听所有可用接口)
-        :type addr: str
-        :param port: 接口的端口号(默认为8888)
-        :type port: int
-        :param max_connection: 最大连接数量
-        :type max_connection: int
+    @property
+    def id(self) -> int:
         """
-        self._addr = addr
-        self._port = port
-        self._MAX_CONNECTIONS = max_connection
-        self._game = Game()
+        牌桌编号
+
+        :return: 牌桌编号
+        :rtype: int
+        """
+        return self._id
 
     @property
-    def current_clients(self) -> int:
+    def players(self) -> int:
         """
-        当前客户端的数量
+        当前就座的客户端数量
 
-        :return: 当前客户端的数量
+        :return: 就座的客户端数量
+        :rtype: int
+        """
+        return len(self._channels)
+
+    @property
+    def isfull(self) -> bool:
+        """
+        牌桌是否已满座
+
+        :return: 是否满座
+        :rtype: bool
+        """
+        return len(self._channels) + len(self._suspended) >= self._MAX_CONNECTIONS
+
+    @property
+    def vacancy(self) -> int:
+        """
+        空座数量(等待重连的座位不算空座)
+
+        :return: 空座数量
+        :rtype: int
+        """
+        return self._MAX_CONNECTIONS - len(self._channels) - len(self._suspended)
+
+    @property
+    def isempty(self) -> bool:
+        """
+        牌桌是否已无人(等待重连的座位不算空座)
+
+        :return: 是否无人
+        :rtype: bool
+        """
+        return not self._channels and not self._suspended
+
+    @property
+    def istart(self) -> bool:
+        """
+        牌桌上的游戏是否已经开始
+
+        :return: 游戏是否开始
+        :rtype: bool
+        """
+        return self._game.istart
+
+    @property
+    def isover(self) -> bool:
+        """
+        牌桌上的游戏是否已经分出胜负
+
+        :return: 是否已分出胜负
+        :rtype: bool
+        """
+        return self._game.winner is not None
+
+    @property
+    def turn(self) -> int:
+        """
+        当前出牌的座位号(未开局时为0)
+
+        :return: 当前出牌的座位号
+        :rtype: int
+        """
+        return self._turn
+
+    def holds(self, seat : int, writer : asyncio.StreamWriter) -> bool:
+        """
+        座位是否仍由该连接占用(重连接管后，旧连接不再占用原座位)
+
+        :param seat: 座位号
+        :type seat: int
+        :param writer: 网络输出流
+        :type writer: asyncio.StreamWriter
+        :return: 是否占用
+        :rtype: bool
+        """
+        channel = self._channels.get(seat)
+        return channel is not None and channel.writer is writer
+
+    def resumable(self, seat : int) -> bool:
+        """
+        该座位断线后能否保留等待重连(对局进行中且持有会话令牌)
+
+        :param seat: 座位号
+        :type seat: int
+        :return: 能否等待重连
+        :rtype: bool
+        """
+        return self.istart and seat in self._tokens
+
+    def issuspended(self, seat : int) -> bool:
+        """
+        该座位是否正在等待重连
+
+        :param seat: 座位号
+        :type seat: int
+        :return: 是否等待重连
+        :rtype: bool
+        """
+        return seat in self._suspended
+
+    def bind(self, seat : int, token : str) -> None:
+        """
+        为座位绑定会话令牌
+
+        :param seat: 座位号
+        :type seat: int
+        :param token: 会话令牌
+        :type token: str
+        """
+        self._tokens[seat] = token
+
+    def unbind(self, seat : Optional[int] = None) -> List[str]:
+        """
+        解除座位的会话令牌
+
+        :param seat: 座位号(None即为全部座位)
+        :type seat: Optional[int]
+        :return: 被解除的令牌
+        :rtype: List[str]
+        """
+        if seat is None:
+            tokens = list(self._tokens.values())
+            self._tokens.clear()
+            return tokens
+        token = self._tokens.pop(seat, None)
+        return [token] if token else []
+
+    def sit(self, writer : asyncio.StreamWriter) -> int:
+        """
+        为连接分配座位(座位号即客户端id，取1~3中最小的空座)
+
+        :param writer: 网络输出流
+        :type writer: asyncio.StreamWriter
+        :return: 座位号
+        :rtype: int
+        """
+        seat = next(i for i in range(1, self._MAX_CONNECTIONS + 1) if i not in self._channels)
+        self._channels[seat] = Channel(writer, self._backlog)
+        return seat
+
+    def leave(self, seat : int) -> None:
+        """
+        释放座位
+
+        :param seat: 座位号
+        :type seat: int
+        """
+        channel = self._channels.pop(seat, None)
+        if channel:
+            channel.close()
+        handle = self._suspended.pop(seat, None)
+        if handle:
+            handle.cancel()
+        if not self.istart and self._game.searchPlayer(str(seat)):
+            self._game.removePlayer(str(seat))
+            self._ready_status -= 1
+            self._ready.clear()
+
+    def detach(self, seat : int) -> Channel:
+        """
+        让出座位但保留连接(重连的客户端先被分到临时座位，出示令牌后迁回原座位)
+
+        :param seat: 座位号
+        :type seat: int
+        :return: 该座位的输出通道
+        :rtype: Channel
+        """
+        return self._channels.pop(seat)
+
+    def suspend(self, seat : int, grace : float, expire : Callable[["Table", int], None]) -> None:
+        """
+        断线的座位保留至多grace秒等待重连，对局状态不变
+
+        :param seat: 座位号
+        :type seat: int
+        :param grace: 等待重连的时限(秒)
+        :type grace: float
+        :param expire: 超时回调，参数为(牌桌, 座位号)
+        :type expire: Callable[[Table, int], None]
+        """
+        channel = self._channels.pop(seat, None)
+        if channel:
+            channel.close()
+        self._suspended[seat] = asyncio.get_running_loop().call_later(grace, expire, self, seat)
+
+    def resume(self, seat : int, channel : Channel) -> None:
+        """
+        把重连的连接放回原座位
+
+        :param seat: 座位号
+        :type seat: int
+        :param channel: 重连的输出通道
+        :type channel: Channel
+        """
+        self._suspended.pop(seat).cancel()
+        self._channels[seat] = channel
+
+    def open(self) -> None:
+        """
+        启动牌桌的游戏进程
+        """
+        self._task = asyncio.create_task(self._game_run(), name = f"table-{self._id}")
+
+    def close(self) -> None:
+        """
+        关闭牌桌的游戏进程
+        """
+        if self._task and not self._task.done():
+            self._task.cancel()
+        self._task = None
+
+    def reset(self) -> None:
+        """
+        重置牌桌上的游戏，仍在座的连接会被断开(否则它们会停留在已失效的对局里)
+        """
+        self.close()
+        for channel in self._channels.values():
+            channel.close()
+        for handle in self._suspended.values():
+            handle.cancel()
+        self._suspended.clear()
+        self._game = Game(self._dealer)
+        self._ready_status = 0
+        self._ready = asyncio.Event()
+        self._begin = asyncio.Event()
+        self._inbox = asyncio.Queue()
+        self._bids = asyncio.Queue()
+        self._turn = 0
+        self.open()
+
+    def _handoff(self) -> int:
+        """
+        把出牌权交给下家
+
+        :return: 下家的座位号
         :rtype: int
         """
-        return len(self._writers)
+        self._turn = self._turn % self._MAX_CONNECTIONS + 1
+        return self._turn
 
     async def _game_run(self):
-        while True:
-            if self._ready_status == 3: # debug: 3-> 1
-                if self._ready_status == 1:
-                    Logger.write("Single client debug permitted.", t = "DEBUG", thread = "_game_run")
-                self._game.start()
-                await self.broadcast("b") # -> client.SocketMain._run
-                break
-            await asyncio.sleep(0.1)
-
-        await asyncio.sleep(1)
-
-        Logger.write("Enter game loop.", t = 'TRACE', thread = "_game_run")
-        num_list = []
+        # 等待全员准备，期间有人离座会清除屏障，因此唤醒后需复核
+        while self._ready_status != self._MAX_CONNECTIONS:
+            await self._ready.wait()
+        if self._ready_status == 1:
+            Logger.write("Single client debug permitted.", t = "DEBUG", thread = "_game_run")
+
+        # 叫分阶段即视为开局，此后断线的座位可以重连
+        self._game.start()
+        self._record = Recorder(self._id)
+        self.broadcast(Op.BEGIN) # -> client.SocketMain._run
+        self._begin.set()
+        self._deal()
+        while not await self._bid_run():
+            Logger.write(f"Nobody bids at table {self._id}, redeal.", thread = "_game_run")
+            self.broadcast(Op.REDEAL, version = BID_VERSION) # -> client.SocketMain._bid
+            self._deal()
+
+        lord = cast(Player, self._game.searchPlayer(str(self._game.lordsid)))
+        lord.addCard(self._game.lordshand)
+        self._turn = self._game.lordsid
         for i in range(1, 4):
-            num_list.append(self._game.playerlist[
-                self._game.playeridlist[i]
-            ].cardnum)
-        rnd = self._game.lordsid
+            p = self._game.searchPlayer(str(i))
+            if p:
+                self.send(i, Op.LORDS, self._game.lordshand.mask) # -> client.SocketMain._run
+                self.send(i, Op.IDENTITY, int(p.identity)) # -> client.SocketMain._run
+                self.send(i, Op.HAND, p.hand.mask) # -> client.SocketMain._run
+
+        play_task = asyncio.create_task(self._play_run())
+        try:
+            winner = await self._game.isfinished()
+            await play_task
+        finally:
+            play_task.cancel()
+
+        Logger.write(f"Seat {winner.id} wins at table {self._id}.", thread = "_game_run")
+        if self._journal:
+            self._record.finish(self._game.lordsid, int(winner.id))
+            self._journal.append(self._record) # 交给后台线程编码写入，不阻塞事件循环
+        self.broadcast(Op.WIN, int(winner.id)) # -> client.SocketMain._run
+        channels = list(self._channels.values())
+        await asyncio.gather(*(channel.flush() for channel in channels))
+        for channel in channels:
+            channel.close()
+
+    def _deal(self) -> None:
+        """
+        发牌(每人17张，地主牌在叫分结束后再交给地主)，支持叫分的客户端先收到这17张手牌
+        """
+        deal = self._game.dealCards()
+        self._record.deal(deal.seed, deal.first)
+        Logger.write(f"Table {self._id} deals {deal.seed:#018x}.", thread = "_deal")
+        for i in range(1, 4):
+            p = self._game.searchPlayer(str(i))
+            if p:
+                p.clearCard()
+                p.addCard(Hand.from_mask(deal.hands[i - 1]))
+                channel = self._channels.get(i)
+                if channel and channel.version >= BID_VERSION:
+                    self.send(i, Op.HAND, p.hand.mask) # -> client.SocketMain._bid
+
+    async def _bid_run(self) -> bool:
+        """
+        叫分循环，每次叫分都广播给支持叫分的客户端
+
+        :return: 是否选出了地主(三家都不叫时为False，需重新发牌)
+        :rtype: bool
+        """
+        game = self._game
+        self.broadcast(Op.BID, 0, 0, game.startBid(), version = BID_VERSION) # -> client.SocketMain._bid
+        while game.bidder:
+            seat = game.bidder
+            score = await self._ask_bid(seat)
+            game.bid(str(seat), score)
+            self._record.bid(score)
+            self.broadcast(Op.BID, seat, score, game.bidder, version = BID_VERSION) # -> client.SocketMain._bid
+        Logger.write(f"Bidding at table {self._id} ends with {game.bidscore}.", t = "TRACE", thread = "_bid_run")
+        return game.lordsid != 0
+
+    async def _ask_bid(self, seat : int) -> int:
+        """
+        取得一个座位的叫分: 支持叫分的客户端在时限内自己叫分，其余座位(及超时、断线的座位)按手牌强度代为叫分
+
+        :param seat: 座位号
+        :type seat: int
+        :return: 叫分
+        :rtype: int
+        """
+        game = self._game
+        while not self._bids.empty(): # 丢弃此前超时后才到达的叫分，以免在重新发牌后被当作该座位的叫分
+            self._bids.get_nowait()
+        channel = self._channels.get(seat)
+        if channel and channel.version >= BID_VERSION:
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self._BID_TIMEOUT
+            while True:
+                try:
+                    bidder, score = await asyncio.wait_for(self._bids.get(), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    Logger.write(f"Seat {seat} bids timeout at table {self._id}.", t = "WARN", thread = "_ask_bid")
+                    break
+                if bidder == seat and (score == 0 or game.bidscore < score <= 3):
+                    return score
+                Logger.write(f"Illegal bid {score} from seat {bidder} at table {self._id}.", t = "WARN", thread = "_ask_bid")
+        p = cast(Player, game.searchPlayer(str(seat)))
+        return Evaluator.bid(p.hand, game.bidscore)
+
+    async def _play_run(self) -> None:
+        """
+        出牌循环，只接受当前出牌座位的消息
+        """
+        Logger.write(f"Table {self._id} enters game loop.", t = 'TRACE', thread = "_play_run")
         while True:
-            current_recv = self._readers[rnd - 1]
-            if current_recv:
-                # 客户id + " " + 出牌数 + " " + 牌型JSON字符串 + "\n"
-                deploy_card = (await cast(
-                    asyncio.StreamReader,current_recv
-                    ).readuntil(b'\n')
-                               ).decode("utf-8")
-                dec_num = len(eval(deploy_card))
-                await self.broadcast(deploy_card)
-
-    async def _client_run(self, reader : asyncio.StreamReader, writer : asyncio.StreamWriter) -> None:
+            seat, mask = await self._inbox.get()
+            if seat != self._turn:
+                Logger.write(f"Seat {seat} played out of turn at table {self._id}.", t = "WARN", thread = "_play_run")
+                self.send(seat, Op.REJECT, mask) # -> client.SocketMain._run
+                continue
+            try:
+                self._game.play(str(seat), Hand.from_mask(mask))
+            except ValueError as e:
+                Logger.write(f"Illegal play from seat {seat} at table {self._id}: {e}", t = "WARN", thread = "_play_run")
+                self.send(seat, Op.REJECT, mask) # -> client.SocketMain._run
+                continue
+            self._record.play(mask)
+            self.broadcast(Op.PLAY, seat, mask)
+            if self._game.winner:
+                return
+            self._handoff()
+
+    async def hello(self, reader : asyncio.StreamReader) -> Tuple[Optional[int], str]:
+        """
+        读取客户端首行。首行为"<id> v <版本> [令牌]"时为协商请求，否则即为旧版客户端的准备消息
+
+        :param reader: 网络输入流
+        :type reader: asyncio.StreamReader
+        :return: (协商的版本号, 客户端出示的会话令牌)，首行不是协商请求时版本号为None，是空行时为-1
+        :rtype: Tuple[Optional[int], str]
+        """
+        tokens = (await reader.readuntil(b'\n')).decode("utf-8").split()
+        if len(tokens) in (3, 4) and tokens[1] == HELLO:
+            return min(int(tokens[2]), VERSION), tokens[3] if len(tokens) == 4 else ""
+        return (None if tokens else -1), ""
+
+    def ack(self, seat : int, version : int, token : str = "") -> None:
+        """
+        应答协商请求并切换该连接的协议，二进制协议的应答附带会话令牌与(可能迁回的)座位号
+
+        :param seat: 座位号
+        :type seat: int
+        :param version: 协商的版本号
+        :type version: int
+        :param token: 会话令牌
+        :type token: str
+        """
+        channel = self._channels[seat]
+        text = f"{HELLO} {version} {token} {seat}" if token else f"{HELLO} {version}"
+        channel.send(f"{text}\n".encode("utf-8")) # -> client.SocketMain._listen
+        channel.binary = version > 0
+        channel.version = version
+
+    async def client_run(self, seat : int, reader : asyncio.StreamReader, version : Optional[int]) -> None:
         """
         游戏相关进程
 
+        :param seat: 座位号
+        :type seat: int
+        :param reader: 网络输入流
+        :type reader: asyncio.StreamReader
+        :param version: 协商的版本号(见hello)
+        :type version: Optional[int]
         """
-        Logger.write("Game task starts.", thread = "_client_run")
+        Logger.write(f"Game task starts at table {self._id}.", thread = "_client_run")
+        channel = self._channels[seat]
 
-        ready = (await reader.readuntil(b'\n')).decode("utf-8").strip().split() # <- client.welcome_screen
+        if version is None or version < 0:
+            ready = version is None # 旧版客户端的首行即为准备消息 <- client.welcome_screen
+        elif channel.binary:
+            op, _ = await BinaryCodec.read(reader) # <- client.welcome_screen
+            ready = op == Op.READY
+        else:
+            ready = bool((await reader.readuntil(b'\n')).split())
 
         if ready:
             self._ready_status += 1
-            player_id = int(ready[0])
-            self._game.addPlayer(Player(ready[0]))
+            self._game.addPlayer(Player(str(seat)))
+            if self._ready_status == self._MAX_CONNECTIONS:
+                self._ready.set()
 
         else:
             raise TimeoutError
 
-        while not self._game.istart:
-            await asyncio.sleep(0.1)
-            continue
-        cl = self._game.arrangeCards()
-        Logger.write("All players ready, game starts.", t = "TRACE", thread = "_client_run")
-
-        # 公布地主牌
-        Logger.write("Inform lord's cards", thread = "_client_run")
-        if self._game.lordscard:
-            await self.broadcast(json.dumps(self._game.lordscard)) # -> client.SocketMain._run
-
-        # 分配地主
-        Logger.write("Arrange identities.", thread = "_client_run")
-        self._game.arrangeIden()
-        i = self._game.playeridlist[player_id]
-        if i:
-            p = self._game.playerlist[i]
-        else:
-            raise IndexError("The player id is not exist.")
-        if p:
-            p.addCard(cl[17 * (player_id - 1):player_id * 17])
-            writer.write((
-                '1\n' if p.identity else '0\n'
-                ).encode("utf-8")) # -> client.SocketMian._run
-            await writer.drain()
-        else:
+        await self._begin.wait()
+        Logger.write(f"All players at table {self._id} ready, game starts.", t = "TRACE", thread = "_client_run")
+
+        if not self._game.searchPlayer(str(seat)):
             raise IndexError("The player of the id is lost.")
 
-        # 发牌
-        Logger.write("Arrange cards.", thread = "_client_run")
-        if p and p.identity:
-            if self._game.lordscard:
-                p.addCard(cast(List[List[int]], self._game.lordscard))
-            else:
-                raise TypeError("Lordscard is not initialtive, please arrangeCards fst.")
-        else:
+        # 手牌、叫分与地主牌由_game_run发出，这里只转交客户端的消息
+        await self._relay(seat, reader)
+
+    async def resume_run(self, seat : int, reader : asyncio.StreamReader) -> None:
+        """
+        重连后的游戏进程: 以一帧快照代替重放历史消息，之后与client_run相同；
+        叫分阶段重连时快照不含地主牌，支持叫分的客户端随后收到一帧当前的叫分状态
+
+        :param seat: 座位号
+        :type seat: int
+        :param reader: 网络输入流
+        :type reader: asyncio.StreamReader
+        """
+        Logger.write(f"Seat {seat} resumes at table {self._id}.", thread = "_resume_run")
+        p = self._game.searchPlayer(str(seat))
+        if not p:
             raise IndexError("The player of the id is lost.")
-        writer.write((json.dumps(p.cards) + '\n').encode("utf-8")) # -> client.SocketMain._run
-        await writer.drain()
+        game = self._game
+        self.send(seat,
+                  Op.SNAPSHOT,
+                  seat,
+                  game.lordsid,
+                  self._turn,
+                  int(game.lastid or 0),
+                  game.lastcards.mask,
+                  p.hand.mask,
+                  game.lordshand.mask if game.lordsid else 0 # 叫分结束前地主牌不公开
+                  ) # -> client.SocketMain._run
+        channel = self._channels[seat]
+        if not game.lordsid and channel.version >= BID_VERSION:
+            self.send(seat, Op.BID, 0, game.bidscore, game.bidder) # -> client.SocketMain._bid
+        if game.winner: # 等待重连期间对局已结束
+            self.send(seat, Op.WIN, int(game.winner.id))
+            await self._channels[seat].flush()
+            return
+        await self._relay(seat, reader)
+
+    async def _relay(self, seat : int, reader : asyncio.StreamReader) -> None:
+        """
+        把出牌消息转交给牌桌，连接断开时结束
+
+        :param seat: 座位号
+        :type seat: int
+        :param reader: 网络输入流
+        :type reader: asyncio.StreamReader
+        """
+        channel = self._channels[seat]
+        inbox = self._inbox
+        while True:
+            try:
+                if channel.binary:
+                    op, args = await BinaryCodec.read(reader)
+                    if op == Op.BID:
+                        self._bids.put_nowait((seat, args[0]))
+                        continue
+                    if op != Op.PLAY:
+                        continue
+                    mask = args[0]
+                else:
+                    mask = TextCodec.decode_play(await reader.readuntil(b'\n'))
+            except asyncio.IncompleteReadError:
+                return
+            except (ValueError, TypeError) as e:
+                Logger.write(f"Malformed message from seat {seat} at table {self._id}: {e}", t = "WARN", thread = "_relay")
+                continue
+            inbox.put_nowait((seat, mask))
+
+    def send_seat(self, seat : int) -> None:
+        """
+        向新连接告知座位号(协商前的首条消息，总是文本)
+
+        :param seat: 座位号
+        :type seat: int
+        """
+        self._channels[seat].send(f"{seat}\n".encode("utf-8"))
+
+    def send(self, seat : int, op : Op, *args : int) -> None:
+        """
+        向指定座位发送消息(按该连接协商的协议编码)
+
+        :param seat: 座位号
+        :type seat: int
+        :param op: 操作码
+        :type op: Op
+        """
+        channel = self._channels.get(seat)
+        if channel:
+            channel.send((BinaryCodec if channel.binary else TextCodec).encode(op, *args))
+
+    def broadcast(self, op : Op, *args : int, sender : int = 0, version : int = 0) -> None:
+        """
+        向牌桌上所有客户端广播消息(每种协议只编码一次，各连接的写协程并发写出)
+
+        :param op: 操作码
+        :type op: Op
+        :param sender: 发送消息的座位号(0即指当服务器发送消息的情况)
+        :type sender: int
+        :param version: 只发给协商版本不低于此的客户端(0为全部)
+        :type version: int
+        """
+        frames : Dict[bool, bytes] = {}
+        for seat, channel in list(self._channels.items()):
+            if seat != sender and channel.version >= version:
+                data = frames.get(channel.binary)
+                if data is None:
+                    data = frames[channel.binary] = (
+                        BinaryCodec if channel.binary else TextCodec
+                        ).encode(op, *args)
+                channel.send(data)
+        if Logger.enabled("TRACE"):
+            Logger.write(f"Table {self._id} broadcast {op.name} {args}", t = "TRACE", thread = "lambda/self.boardcast")
+
+def token_owner(token : str) -> Optional[int]:
+    """
+    签发会话令牌的工作进程序号(令牌形如"<序号>.<随机串>"，单进程运行时没有序号)
+
+    :param token: 会话令牌
+    :type token: str
+    :return: 工作进程序号，没有序号时为None
+    :rtype: Optional[int]
+    """
+    owner, dot, _ = token.partition(".")
+    return int(owner) if dot and owner.isdigit() else None
+
+class TableManager:
+    """
+    牌桌管理类，按需创建与回收牌桌，并为每个连接分配座位
+    """
+    def __init__(self,
+                 max_tables : int = 512,
+                 backlog : int = 64,
+                 grace : float = 30.0,
+                 seed : Optional[int] = None,
+                 journal : Optional[Journal] = None,
+                 worker : Optional[int] = None
+                 ):
+        """
+        初始化牌桌管理器
+
+        :param max_tables: 最大牌桌数量
+        :type max_tables: int
+        :param backlog: 每个连接的发送队列上限
+        :type backlog: int
+        :param grace: 对局中断线的座位等待重连的时限(秒)
+        :type grace: float
+        :param seed: 发牌种子，各牌桌的种子由它与牌桌编号派生(None即为每桌随机选取)
+        :type seed: Optional[int]
+        :param journal: 各牌桌共用的对局记录文件(None即为不记录)
+        :type journal: Optional[Journal]
+        :param worker: 工作进程序号(None即为单进程运行)，作为会话令牌的前缀
+        :type worker: Optional[int]
+        """
+        self._max_tables = max_tables
+        self._backlog = backlog
+        self._grace = grace
+        self._seed = seed
+        self._journal = journal
+        self._prefix = "" if worker is None else f"{worker}."
+        self._sessions : Dict[str, Tuple[Table, int]] = {} # 会话令牌 -> (牌桌, 座位号)
+        self._tables : Dict[int, Table] = {}
+        self._vacant : Dict[int, Table] = {} # 有空座且未开局的牌桌，按创建顺序排列
+        self._next_id = 0
+        self._players = 0
+        self._games = 0 # 已分出胜负的对局数
+
+    @property
+    def tables(self) -> int:
+        """
+        当前牌桌的数量
+
+        :return: 当前牌桌的数量
+        :rtype: int
+        """
+        return len(self._tables)
+
+    @property
+    def players(self) -> int:
+        """
+        当前就座的客户端数量
+
+        :return: 当前就座的客户端数量
+        :rtype: int
+        """
+        return self._players
+
+    @property
+    def games(self) -> int:
+        """
+        已分出胜负并回收的对局数量
+
+        :return: 对局数量
+        :rtype: int
+        """
+        return self._games
+
+    @property
+    def vacancy(self) -> int:
+        """
+        未开局牌桌上的空座总数，监督进程据此把新连接交给能凑满牌桌的工作进程
+
+        :return: 空座数量
+        :rtype: int
+        """
+        return sum(i.vacancy for i in self._vacant.values())
+
+    def join(self, writer : asyncio.StreamWriter) -> Optional[Tuple[Table, int]]:
+        """
+        为连接分配牌桌与座位，没有空座时按需创建新牌桌
+
+        :param writer: 网络输出流
+        :type writer: asyncio.StreamWriter
+        :return: (牌桌, 座位号)，牌桌数量已达上限时返回None
+        :rtype: Optional[Tuple[Table, int]]
+        """
+        if self._vacant:
+            table = next(iter(self._vacant.values()))
+        elif len(self._tables) < self._max_tables:
+            self._next_id += 1
+            seed = None if self._seed is None else derive(self._seed, self._next_id)
+            table = Table(self._next_id, self._backlog, seed, self._journal)
+            self._tables[table.id] = table
+            self._vacant[table.id] = table
+            table.open()
+            Logger.write(f"Table {table.id} opened.", thread = "TableManager.join")
+        else:
+            return None
+
+        seat = table.sit(writer)
+        self._players += 1
+        if table.isfull:
+            del self._vacant[table.id]
+        return table, seat
+
+    def issue(self, table : Table, seat : int) -> str:
+        """
+        为座位签发会话令牌
 
-    async def broadcast(self, message : str, sender : asyncio.StreamWriter|None = None) -> None:
+        :param table: 牌桌
+        :type table: Table
+        :param seat: 座位号
+        :type seat: int
+        :return: 会话令牌
+        :rtype: str
         """
-        向所有客户端广播消息
+        token = self._prefix + secrets.token_hex(8)
+        table.bind(seat, token)
+        self._sessions[token] = table, seat
+        return token
 
-        :param message: 广播的信息
-        :type message: str
-        :param sender: 发送消息的客户端(None即指当服务器发送消息的情况)
-        :type sender: asyncio.StreamWriter|None
+    def resume(self, token : str, table : Table, seat : int) -> Optional[Tuple[Table, int]]:
         """
-        for client in self._writers:
-            if client != sender:
-                client.write((message + '\n').encode("utf-8"))
-                await client.drain()
-                Logger.write(f"Boardcast message: {message}", t = "TRACE", thread = "lambda/self.boardcast")
+        凭令牌把连接从临时座位迁回原座位。原连接尚未察觉断线时由新连接接管
+
+        :param token: 会话令牌
+        :type token: str
+        :param table: 连接的临时牌桌
+        :type table: Table
+        :param seat: 临时座位号
+        :type seat: int
+        :return: (原牌桌, 原座位号)，令牌无效或已过期时返回None
+        :rtype: Optional[Tuple[Table, int]]
+        """
+        session = self._reclaim(token)
+        if session is None:
+            return None
+        target, old = session
+        target.resume(old, table.detach(seat))
+        self._settle(table)
+        Logger.write(f"Seat {old} at table {target.id} resumed.", thread = "TableManager.resume")
+        return session
+
+    def adopt(self, token : str, writer : asyncio.StreamWriter) -> Optional[Tuple[Table, int]]:
+        """
+        凭令牌把其他工作进程转来的重连放回原座位(该连接已在别处得到过临时座位，不再另行分配)
+
+        :param token: 会话令牌
+        :type token: str
+        :param writer: 网络输出流
+        :type writer: asyncio.StreamWriter
+        :return: (原牌桌, 原座位号)，令牌无效或已过期时返回None
+        :rtype: Optional[Tuple[Table, int]]
+        """
+        session = self._reclaim(token)
+        if session is None:
+            return None
+        target, old = session
+        target.resume(old, Channel(writer, self._backlog))
+        self._players += 1
+        Logger.write(f"Seat {old} at table {target.id} resumed from another worker.", thread = "TableManager.adopt")
+        return session
+
+    def _reclaim(self, token : str) -> Optional[Tuple[Table, int]]:
+        """
+        找到令牌对应的座位并确保它处于等待重连的状态。原连接尚未察觉断线时先将其挂起
+
+        :param token: 会话令牌
+        :type token: str
+        :return: (原牌桌, 原座位号)，令牌无效或已过期时返回None
+        :rtype: Optional[Tuple[Table, int]]
+        """
+        session = self._sessions.get(token)
+        if session is None:
+            return None
+        target, old = session
+        if not target.issuspended(old):
+            if not target.resumable(old):
+                return None
+            target.suspend(old, self._grace, self._expire)
+        return session
+
+    def leave(self, table : Table, seat : int, writer : asyncio.StreamWriter) -> None:
+        """
+        释放连接占用的座位，对局中持有令牌的座位保留等待重连，牌桌无人时回收牌桌
+
+        :param table: 连接所在的牌桌
+        :type table: Table
+        :param seat: 座位号
+        :type seat: int
+        :param writer: 连接的网络输出流
+        :type writer: asyncio.StreamWriter
+        """
+        self._players -= 1
+        if not table.holds(seat, writer): # 座位已被重连的客户端接管
+            return
+        if table.resumable(seat):
+            Logger.write(f"Seat {seat} left table {table.id} during game, waiting {self._grace}s for resume.",
+                         t = "WARN",
+                         thread = "TableManager.leave")
+            table.suspend(seat, self._grace, self._expire)
+            return
+        for token in table.unbind(seat):
+            del self._sessions[token]
+        table.leave(seat)
+        self._settle(table)
+
+    def _expire(self, table : Table, seat : int) -> None:
+        """
+        断线的座位超时未重连
+
+        :param table: 牌桌
+        :type table: Table
+        :param seat: 座位号
+        :type seat: int
+        """
+        Logger.write(f"Seat {seat} at table {table.id} did not resume in time.", t = "WARN", thread = "TableManager._expire")
+        for token in table.unbind(seat):
+            del self._sessions[token]
+        table.leave(seat)
+        self._settle(table)
+
+    def _settle(self, table : Table) -> None:
+        """
+        有座位被释放后整理牌桌: 中途离场则重置对局，无人则回收，否则重新接纳新玩家
+
+        :param table: 牌桌
+        :type table: Table
+        """
+        if table.istart:
+            Logger.write(f"Player left table {table.id} during game, resetting game.", t = "WARN", thread = "TableManager.leave")
+            for token in table.unbind():
+                del self._sessions[token]
+            table.reset()
+
+        if table.isempty:
+            table.close()
+            del self._tables[table.id]
+            self._vacant.pop(table.id, None)
+            for token in table.unbind():
+                del self._sessions[token]
+            if table.isover:
+                self._games += 1
+            Logger.write(f"Table {table.id} retired.", thread = "TableManager.leave")
+            return
+
+        if table.isover: # 已结束的牌桌不再接纳新玩家，等待全员离开后回收
+            return
+        self._vacant[table.id] = table
+
+class Server:
+    """
+    异步服务器类
+    """
+    _instance = None
+
+    def __new__(cls, *argc, **kwargs):
+        if not cls._instance:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self,
+                 addr : str = '0.0.0.0',
+                 port : int = 8888,
+                 max_tables : int = 512,
+                 backlog : int = 64,
+                 grace : float = 30.0,
+                 seed : Optional[int] = None,
+                 journal : str = "games.kj",
+                 worker : Optional[int] = None
+                 ):
+        """
+        初始化服务器
+
+        :param addr: 服务器地址(默认监听所有可用接口)
+        :type addr: str
+        :param port: 接口的端口号(默认为8888)
+        :type port: int
+        :param max_tables: 最大牌桌数量(每桌3个连接)
+        :type max_tables: int
+        :param backlog: 每个连接的发送队列上限，积压超过该值的慢客户端会被断开
+        :type backlog: int
+        :param grace: 对局中断线的客户端凭令牌重连的时限(秒)
+        :type grace: float
+        :param seed: 发牌种子(None即为随机)，给定时各牌桌的发牌可重现，便于压力测试与排查
+        :type seed: Optional[int]
+        :param journal: 对局记录文件路径(空字符串即为不记录)，索引文件为该路径加".idx"
+        :type journal: str
+        :param worker: 作为supervisor的工作进程运行时的序号(None即为单独运行)
+        :type worker: Optional[int]
+        """
+        self._addr = addr
+        self._port = port
+        self._worker = worker
+        self._tables = TableManager(max_tables, backlog, grace, seed, Journal(journal) if journal else None, worker)
+        self._pipe : Optional[Connection] = None # 与监督进程之间的管道(见serve)
+        self._closed : Optional[asyncio.Future] = None # 管道关闭(监督进程退出)
+        self._joined = 0 # 监督进程交来的新连接中已分配过座位的数量
+
+    @property
+    def current_clients(self) -> int:
+        """
+        当前客户端的数量
+
+        :return: 当前客户端的数量
+        :rtype: int
+        """
+        return self._tables.players
+
+    def stats(self) -> Dict[str, int]:
+        """
+        服务器运行统计
+
+        :return: 牌桌数、在座客户端数、已完成的对局数
+        :rtype: Dict[str, int]
+        """
+        return {
+            "tables": self._tables.tables,
+            "players": self._tables.players,
+            "games": self._tables.games
+        }
 
     async def _handle_client(self, reader : asyncio.StreamReader, writer : asyncio.StreamWriter) -> None:
         """
@@ -184,34 +1096,47 @@ class Server:
         """
         addr = writer.get_extra_info("peername")
 
-        async with self._counter_lock:
-            if self._current_connections >= self._MAX_CONNECTIONS:
-                Logger.write(f"Connection is full, refuse {addr}.", t = "WARN", thread = "_handle_client")
-                writer.write(b"f\n")   # 如果连接数已满，发送"failed"
-                await writer.drain()
-                writer.close()
-                await writer.wait_closed()
-                return
-
-            # 接受连接
-            self._current_connections += 1
-            self._writers.append(writer)
-            self._readers.append(reader)
+        joined = self._tables.join(writer)
+        if self._pipe:
+            self._joined += 1
+            self._report()
+        if joined is None:
+            Logger.write(f"All tables are full, refuse {addr}.", t = "WARN", thread = "_handle_client")
+            writer.write(b"f\n")   # 如果牌桌已满，发送"failed"
+            await writer.drain()
+            writer.close()
+            await writer.wait_closed()
+            return
+        table, seat = joined
 
         try:
-            writer.write((str(self._current_connections) + '\n').encode("utf-8"))   # -> client.SocketMain._run
-            Logger.write(f'user "{addr}" has joined.')
-            await writer.drain()
+            table.send_seat(seat)   # -> client.SocketMain._run
+            Logger.write(f'user "{addr}" has joined table {table.id} at seat {seat}.')
+
+            # 协议协商: 二进制协议的客户端会得到会话令牌，断线后凭令牌重连时迁回原座位
+            version, token = await table.hello(reader)
+            resumed = None
+            if version is not None and version > 0 and token and self._forward(token, version, writer):
+                return
+            if version is not None and version > 0:
+                resumed = self._tables.resume(token, table, seat) if token else None
+                if resumed:
+                    table, seat = resumed
+                else:
+                    token = self._tables.issue(table, seat)
+            if version is not None and version >= 0:
+                table.ack(seat, version, token if version else "")
 
-            await self._client_run(reader, writer)
+            if resumed:
+                await table.resume_run(seat, reader)
+            else:
+                await table.client_run(seat, reader, version)
 
         except (TimeoutError, ConnectionError) as e:
             Logger.write(f"Connection exception: {e}", t = "WARN", thread = "_handle_client")
         except BaseException as e:
             Logger.write(str(e), t = "ERROR", thread = "_handle_client")
         finally:
-
-            self._writers.remove(writer)
             if not writer.is_closing():
                 writer.close()
             try:
@@ -220,13 +1145,117 @@ class Server:
                 pass
 
             Logger.write(f'user "{addr}" exits.', thread = "_handle_client")
-            async with self._counter_lock:
-                self._current_connections -= 1
+            self._tables.leave(table, seat, writer)
+            self._report()
 
-            if self._game.istart:
-                Logger.write(f'{addr} diconnected during game,resetting game.', t = "WARN", thread = "_handle_client")
-                self._game = Game()
-                self._ready_status = 0
+    async def _resume_client(self, reader : asyncio.StreamReader, writer : asyncio.StreamWriter, token : str, version : int) -> None:
+        """
+        处理其他工作进程转来的重连(协商请求已在那边读过，这里直接应答并恢复牌局)
+
+        :param reader: 网络输入流
+        :type reader: asyncio.StreamReader
+        :param writer: 网络输出流
+        :type writer: asyncio.StreamWriter
+        :param token: 客户端出示的会话令牌
+        :type token: str
+        :param version: 协商的版本号
+        :type version: int
+        """
+        resumed = self._tables.adopt(token, writer)
+        if resumed is None:
+            Logger.write(f"Forwarded session {token} has expired.", t = "WARN", thread = "_resume_client")
+            writer.close()
+            return
+        table, seat = resumed
+        try:
+            table.ack(seat, version, token)
+            await table.resume_run(seat, reader)
+        except (TimeoutError, ConnectionError) as e:
+            Logger.write(f"Connection exception: {e}", t = "WARN", thread = "_resume_client")
+        except BaseException as e:
+            Logger.write(str(e), t = "ERROR", thread = "_resume_client")
+        finally:
+            if not writer.is_closing():
+                writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+            self._tables.leave(table, seat, writer)
+            self._report()
+
+    def _forward(self, token : str, version : int, writer : asyncio.StreamWriter) -> bool:
+        """
+        令牌由其他工作进程签发时，把连接交还监督进程转给原工作进程(本进程随后只关闭自己持有的描述符)
+
+        :param token: 客户端出示的会话令牌
+        :type token: str
+        :param version: 协商的版本号
+        :type version: int
+        :param writer: 网络输出流
+        :type writer: asyncio.StreamWriter
+        :return: 是否已转交
+        :rtype: bool
+        """
+        owner = token_owner(token)
+        if not self._pipe or owner is None or owner == self._worker:
+            return False
+        self._pipe.send(("forward", token, version))
+        send_handle(self._pipe, writer.get_extra_info("socket").fileno(), os.getppid())
+        return True
+
+    def _report(self) -> None:
+        """
+        向监督进程上报空座数量，附带已分配座位的新连接数，监督进程据此丢弃过时的上报
+        """
+        if self._pipe:
+            self._pipe.send(("vacancy", self._joined, self._tables.vacancy))
+
+    def _receive(self) -> None:
+        """
+        读出管道中监督进程交来的连接: ("join",)为新连接，("resume", 令牌, 版本号)为转来的重连，其后各跟一个套接字描述符
+        """
+        pipe = cast(Connection, self._pipe)
+        while pipe.poll():
+            try:
+                message = pipe.recv()
+            except EOFError:
+                asyncio.get_running_loop().remove_reader(pipe.fileno())
+                if self._closed and not self._closed.done():
+                    self._closed.set_result(None)
+                return
+            sock = socket.socket(fileno = recv_handle(pipe))
+            sock.setblocking(False)
+            asyncio.create_task(self._adopt(sock, message))
+
+    async def _adopt(self, sock : socket.socket, message : Tuple) -> None:
+        """
+        接管监督进程交来的连接
+
+        :param sock: 已接受的连接
+        :type sock: socket.socket
+        :param message: 连接附带的消息(见_receive)
+        :type message: Tuple
+        """
+        reader, writer = await asyncio.open_connection(sock = sock)
+        if message[0] == "resume":
+            await self._resume_client(reader, writer, message[1], message[2])
+        else:
+            await self._handle_client(reader, writer)
+
+    async def serve(self, pipe : Connection) -> None:
+        """
+        工作进程主程序: 不自行监听端口，由监督进程接受连接后经管道交来(见supervisor)
+
+        :param pipe: 与监督进程之间的管道
+        :type pipe: Connection
+        """
+        self._pipe = pipe
+        self._closed = asyncio.get_running_loop().create_future()
+        asyncio.get_running_loop().add_reader(pipe.fileno(), self._receive)
+        Logger.write(f"Worker {self._worker} serves connections from the supervisor.")
+        await self._closed
+        Logger.write(f"Supervisor is gone, worker {self._worker} stops.", t = "WARN")
 
 
     async def main(self) -> None:
@@ -245,7 +1274,7 @@ class Server:
 
         # 运行服务器
         async with server:
-            await asyncio.gather(server.serve_forever(), self._game_run()) #bug src,待更改
+            await server.serve_forever()
 
 if __name__ == "__main__":
     # test start
@@ -0,0 +1,361 @@
+"""
+多进程服务器入口，包含了：
++ 统一接受连接并撮合牌桌的监督进程: 新连接经管道交给有空座的工作进程，同一牌桌的三个连接总在同一工作进程
++ 断线重连按会话令牌转交回签发它的工作进程
++ 重启崩溃工作进程并汇总统计
+"""
+from multiprocessing.connection import Connection, wait
+from multiprocessing.process import BaseProcess
+from multiprocessing.reduction import recv_handle, send_handle
+from typing import Dict, Optional, Tuple, cast
+import argparse
+import asyncio
+import multiprocessing
+import os
+import queue
+import socket
+import sys
+import time
+from cards_dealer import derive
+from logger import Logger
+from server import Server, token_owner
+
+async def _worker_main(server : Server,
+                       pipe : Optional[Connection],
+                       index : int,
+                       stats : "multiprocessing.Queue",
+                       interval : float
+                       ) -> None:
+    """
+    工作进程主程序，运行服务器并定期上报统计
+
+    :param server: 服务器
+    :type server: Server
+    :param pipe: 与监督进程之间的管道(None即为自行监听端口)
+    :type pipe: Optional[Connection]
+    :param index: 工作进程序号
+    :type index: int
+    :param stats: 统计上报队列
+    :type stats: multiprocessing.Queue
+    :param interval: 上报间隔(秒)
+    :type interval: float
+    """
+    task = asyncio.create_task(server.serve(pipe) if pipe else server.main())
+    while not task.done():
+        await asyncio.wait([task], timeout = interval)
+        try:
+            stats.put_nowait((index, os.getpid(), server.stats()))
+        except queue.Full:
+            pass
+    task.result()
+
+def _worker(index : int,
+            pipe : Optional[Connection],
+            addr : str,
+            port : int,
+            max_tables : int,
+            backlog : int,
+            stats : "multiprocessing.Queue",
+            interval : float,
+            seed : Optional[int] = None,
+            journal : str = ""
+            ) -> None:
+    """
+    工作进程入口，每个工作进程独立运行一个事件循环与自己的牌桌
+
+    :param index: 工作进程序号
+    :type index: int
+    :param pipe: 与监督进程之间的管道，连接经它交来(None即为自行监听addr:port)
+    :type pipe: Optional[Connection]
+    :param seed: 发牌种子，各工作进程的种子由它与进程序号派生
+    :type seed: Optional[int]
+    :param journal: 对局记录文件路径，各工作进程写各自的文件(games.kj -> games.0.kj)
+    :type journal: str
+    """
+    Logger.file = f"serevr.{index}.log"
+    if journal:
+        stem, ext = os.path.splitext(journal)
+        journal = f"{stem}.{index}{ext}"
+    server = Server(addr, port, max_tables, backlog,
+                    seed = None if seed is None else derive(seed, index), journal = journal, worker = index)
+    try:
+        asyncio.run(_worker_main(server, pipe, index, stats, interval))
+    except KeyboardInterrupt:
+        Logger.write("Worker stops.", thread = f"worker-{index}")
+
+class Supervisor:
+    """
+    监督进程类，派生N个工作进程，重启崩溃的工作进程并汇总它们的统计
+
+    监督进程自己监听端口，每接受一个连接就选出一个工作进程，经管道把套接字交给它。
+    工作进程在每次分配座位与有人离座后上报空座数量，新连接优先交给有空座的工作进程，
+    都没有空座时轮流交给各工作进程开新桌，因此同一牌桌的三个连接总在同一工作进程。
+    不支持传递套接字的平台(Windows)退回单个自行监听的工作进程。
+    """
+    _RESTART_DELAY = 1.0 # 启动后立即崩溃的工作进程延迟重启，避免空转
+    _SEATS = 3 # 每桌座位数
+
+    def __init__(self,
+                 workers : int = 0,
+                 addr : str = '0.0.0.0',
+                 port : int = 8888,
+                 max_tables : int = 512,
+                 backlog : int = 64,
+                 interval : float = 5.0,
+                 seed : Optional[int] = None,
+                 journal : str = "games.kj"
+                 ):
+        """
+        初始化监督进程
+
+        :param workers: 工作进程数量(0即为CPU核数，平台不支持传递套接字时固定为1)
+        :type workers: int
+        :param addr: 服务器地址
+        :type addr: str
+        :param port: 接口的端口号
+        :type port: int
+        :param max_tables: 每个工作进程的最大牌桌数量
+        :type max_tables: int
+        :param backlog: 每个连接的发送队列上限
+        :type backlog: int
+        :param interval: 统计汇总间隔(秒)
+        :type interval: float
+        :param seed: 发牌种子(None即为随机)
+        :type seed: Optional[int]
+        :param journal: 对局记录文件路径(空字符串即为不记录)
+        :type journal: str
+        """
+        self._handoff = sys.platform != "win32"
+        if not self._handoff:
+            workers = 1
+        self._workers = workers or os.cpu_count() or 1
+        self._addr = (addr, port)
+        self._args = (addr, port, max_tables, backlog)
+        self._interval = interval
+        self._seed = seed
+        self._journal = journal
+        # 以spawn启动工作进程，它们只继承各自的管道，不会继承监听套接字与其他工作进程的管道
+        self._context = multiprocessing.get_context("spawn")
+        self._stats : "multiprocessing.Queue" = self._context.Queue()
+        self._procs : Dict[int, BaseProcess] = {}
+        self._started : Dict[int, float] = {}
+        self._latest : Dict[int, Dict[str, int]] = {}
+        self._pipes : Dict[int, Connection] = {}    # 工作进程序号 -> 管道
+        self._sent : Dict[int, int] = {}            # 已交给该工作进程的新连接数
+        self._vacancy : Dict[int, int] = {}         # 该工作进程未开局牌桌上的空座数
+        self._next = 0                              # 都没有空座时下一个开新桌的工作进程
+        self._listener : Optional[socket.socket] = None
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        所有工作进程最近一次上报的统计之和
+
+        :return: 汇总的统计
+        :rtype: Dict[str, int]
+        """
+        total = {"workers": len(self._procs)}
+        for i in self._latest.values():
+            for k, v in i.items():
+                total[k] = total.get(k, 0) + v
+        return total
+
+    def _spawn(self, index : int) -> None:
+        """
+        启动一个工作进程
+
+        :param index: 工作进程序号
+        :type index: int
+        """
+        pipe = child = None
+        if self._handoff:
+            pipe, child = self._context.Pipe()
+        proc = self._context.Process(
+            target = _worker,
+            args = (index, child, *self._args, self._stats, self._interval, self._seed, self._journal),
+            name = f"worker-{index}",
+            daemon = True
+        )
+        proc.start()
+        if pipe and child:
+            child.close()
+            self._pipes[index] = pipe
+        self._sent[index] = 0
+        self._vacancy[index] = 0
+        self._procs[index] = proc
+        self._started[index] = time.monotonic()
+        Logger.write(f"Worker {index} started, pid {proc.pid}.", thread = "Supervisor")
+
+    def _collect(self) -> None:
+        """
+        取出工作进程上报的统计
+        """
+        while True:
+            try:
+                index, _pid, stats = self._stats.get_nowait()
+            except queue.Empty:
+                return
+            if index in self._procs:
+                self._latest[index] = stats
+
+    def _route(self) -> int:
+        """
+        选出接收新连接的工作进程: 优先交给有空座的(凑满已有的牌桌)，都没有时轮流交给各工作进程开新桌
+
+        :return: 工作进程序号
+        :rtype: int
+        """
+        for index, vacancy in self._vacancy.items():
+            if vacancy > 0 and index in self._pipes:
+                self._vacancy[index] = vacancy - 1
+                return index
+        indexes = sorted(self._pipes)
+        index = indexes[self._next % len(indexes)]
+        self._next += 1
+        self._vacancy[index] = self._SEATS - 1
+        return index
+
+    def _dispatch(self, index : int, message : Tuple, fd : int) -> bool:
+        """
+        经管道把一个连接交给工作进程
+
+        :param index: 工作进程序号
+        :type index: int
+        :param message: 连接附带的消息(见server.Server._receive)
+        :type message: Tuple
+        :param fd: 连接的套接字描述符(交出后由调用方关闭自己的副本)
+        :type fd: int
+        :return: 是否交出
+        :rtype: bool
+        """
+        try:
+            self._pipes[index].send(message)
+            send_handle(self._pipes[index], fd, self._procs[index].pid)
+        except OSError as e:
+            Logger.write(f"Handing connection to worker {index} failed: {e}", t = "WARN", thread = "Supervisor")
+            return False
+        return True
+
+    def _accept(self) -> None:
+        """
+        接受一个新连接并交给工作进程
+        """
+        try:
+            conn, _ = cast(socket.socket, self._listener).accept()
+        except OSError:
+            return
+        with conn:
+            index = self._route()
+            if self._dispatch(index, ("join",), conn.fileno()):
+                self._sent[index] += 1
+
+    def _receive(self, index : int) -> None:
+        """
+        读出工作进程经管道发来的消息: 空座上报与需要转交的重连
+
+        :param index: 工作进程序号
+        :type index: int
+        """
+        pipe = self._pipes[index]
+        try:
+            while pipe.poll():
+                message = pipe.recv()
+                if message[0] == "vacancy":
+                    _, joined, vacancy = message
+                    if joined == self._sent[index]: # 仍有未分配座位的连接时，上报已过时
+                        self._vacancy[index] = vacancy
+                    continue
+                # ("forward", 令牌, 版本号): 连接出示了其他工作进程签发的令牌
+                _, token, version = message
+                fd = recv_handle(pipe)
+                owner = token_owner(token)
+                if owner in self._pipes and owner != index:
+                    self._dispatch(cast(int, owner), ("resume", token, version), fd)
+                else:
+                    Logger.write(f"Session {token} has no live worker, drop it.", t = "WARN", thread = "Supervisor")
+                os.close(fd)
+        except (EOFError, OSError):
+            pass
+
+    def run(self, rounds : Optional[int] = None) -> None:
+        """
+        监督进程主循环
+
+        :param rounds: 汇总轮数(None即一直运行)
+        :type rounds: Optional[int]
+        """
+        if self._handoff:
+            self._listener = socket.create_server(self._addr, backlog = 128)
+            Logger.write(f"Supervisor listens on {self._listener.getsockname()}.", thread = "Supervisor")
+        for i in range(self._workers):
+            self._spawn(i)
+
+        deadline = time.monotonic() + self._interval
+        try:
+            while rounds is None or rounds > 0:
+                sentinels = {proc.sentinel: i for i, proc in self._procs.items()}
+                pipes = {pipe: i for i, pipe in self._pipes.items()}
+                waitables = [*sentinels, *pipes] + ([self._listener] if self._listener else [])
+                ready = wait(waitables, timeout = max(0.0, deadline - time.monotonic()))
+                for sentinel in (i for i in ready if i in sentinels):
+                    index = sentinels[sentinel]
+                    proc = self._procs.pop(index)
+                    proc.join()
+                    self._latest.pop(index, None)
+                    pipe = self._pipes.pop(index, None)
+                    if pipe:
+                        pipe.close()
+                    Logger.write(f"Worker {index} exited with code {proc.exitcode}, restarting.",
+                                 t = "WARN",
+                                 thread = "Supervisor")
+                    if time.monotonic() - self._started[index] < self._RESTART_DELAY:
+                        time.sleep(self._RESTART_DELAY)
+                    self._spawn(index)
+                for pipe in (i for i in ready if i in pipes):
+                    if pipes[pipe] in self._pipes and self._pipes[pipes[pipe]] is pipe:
+                        self._receive(pipes[pipe])
+                if self._listener and self._listener in ready:
+                    self._accept()
+
+                if time.monotonic() >= deadline:
+                    self._collect()
+                    stats = self.stats
+                    Logger.write(", ".join(f"{k}: {v}" for k, v in stats.items()), thread = "Supervisor")
+                    deadline = time.monotonic() + self._interval
+                    if rounds is not None:
+                        rounds -= 1
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        """
+        停止所有工作进程
+        """
+        for proc in self._procs.values():
+            proc.terminate()
+        for proc in self._procs.values():
+            proc.join()
+        self._procs.clear()
+        for pipe in self._pipes.values():
+            pipe.close()
+        self._pipes.clear()
+        if self._listener:
+            self._listener.close()
+            self._listener = None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Karten multi-process server")
+    parser.add_argument("-w", "--workers", type = int, default = 0, help = "worker processes (0 = CPU count)")
+    parser.add_argument("--addr", default = "0.0.0.0")
+    parser.add_argument("--port", type = int, default = 8888)
+    parser.add_argument("--max-tables", type = int, default = 512, help = "tables per worker")
+    parser.add_argument("--backlog", type = int, default = 64)
+    parser.add_argument("--interval", type = float, default = 5.0, help = "stats interval in seconds")
+    parser.add_argument("--seed", type = int, default = None, help = "make deals reproducible")
+    parser.add_argument("--journal", default = "games.kj", help = "binary game journal per worker ('' to disable)")
+    opts = parser.parse_args()
+    try:
+        Supervisor(opts.workers, opts.addr, opts.port, opts.max_tables, opts.backlog, opts.interval,
+                   opts.seed, opts.journal).run()
+    except KeyboardInterrupt:
+        Logger.write("Supervisor stops.", thread = "Supervisor")
@@ -0,0 +1,9 @@
+"""
+测试配置: 服务器各模块按平铺方式导入，把server目录加入搜索路径
+"""
+import os
+import sys
+
+# -*- encoding: utf-8 -*-
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
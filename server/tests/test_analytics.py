@@ -0,0 +1,60 @@
+"""
+离线统计测试: 部分统计的合并与分片方式无关，保存后可恢复，不完整的记录只计数
+"""
+from analytics import Stats, analyze, run
+from bot import GreedyPolicy
+from journal import Journal, JournalReader, Record, Recorder
+from simulator import play_game
+
+# -*- encoding: utf-8 -*-
+
+def write_games(path : str, count : int) -> None:
+    """
+    模拟若干局写入记录文件，另外追加一局不完整的记录
+    """
+    journal = Journal(path)
+    for i in range(count):
+        recorder = Recorder(i)
+        play_game(i, i, [GreedyPolicy] * 3, recorder)
+        journal.append(recorder)
+    journal.append(Recorder(count))
+    journal.close()
+
+def test_merge_matches_single_pass(tmp_path):
+    path = str(tmp_path / "games.kj")
+    write_games(path, 40)
+    with JournalReader(path) as reader:
+        whole = analyze(reader)
+        parts = [analyze(reader.records(i, i + 7)) for i in range(0, len(reader), 7)]
+
+    merged = Stats()
+    for part in reversed(parts):
+        assert merged.merge(part) is merged
+    assert merged.to_dict() == whole.to_dict()
+    assert run([path], workers = 1, chunk = 9).to_dict() == whole.to_dict()
+    assert whole.games == 40
+    assert whole.incomplete == 1
+    assert sum(whole.lengths.values()) == 40
+
+def test_saved_partial_round_trip(tmp_path):
+    path = str(tmp_path / "games.kj")
+    write_games(path, 10)
+    with JournalReader(path) as reader:
+        stats = analyze(reader)
+    restored = Stats.from_dict(stats.to_dict())
+    assert restored.to_dict() == stats.to_dict()
+    assert restored.summary() == stats.summary()
+
+    old = stats.to_dict() # 旧版保存的部分统计没有后加的项
+    del old["incomplete"]
+    assert Stats.from_dict(old).incomplete == 0
+
+def test_incomplete_records():
+    stats = Stats()
+    stats.add(Record(0, 0, 0.0, 0, 0, (), ()))                     # 没有发牌
+    stats.add(Record(1, 0, 0.0, 0, 0, ((1, 1, ()),), ()))          # 没有叫分
+    stats.add(Record(2, 0, 0.0, 0, 0, ((1, 1, (0, 0, 0)),), ()))   # 三家都不叫
+    stats.add(Record(3, 0, 0.0, 0, 0, ((1, 1, (2, 0, 0)),), ()))   # 没有地主
+    assert stats.incomplete == 4
+    assert stats.games == 0
+    assert stats.summary()["length"]["max_plays"] == 0
@@ -0,0 +1,51 @@
+"""
+发牌引擎测试: 同一种子发出相同的牌，逐个重现与批量发牌一致
+"""
+import pytest
+from cards_dealer import Dealer, bulk, derive, replay, seeds
+
+# -*- encoding: utf-8 -*-
+
+FULL = (1 << 54) - 1
+
+def test_deal_is_a_partition():
+    for seed in (0, 1, 2 ** 64 - 1, 0x1234_5678_9ABC_DEF0):
+        deal = replay(seed)
+        masks = deal.hands + (deal.lords,)
+        assert [bin(i).count("1") for i in masks] == [17, 17, 17, 3]
+        assert masks[0] | masks[1] | masks[2] | masks[3] == FULL
+        assert sum(masks) == FULL # 两两不相交
+        assert deal.first in (1, 2, 3)
+
+def test_same_seed_same_deals():
+    a, b = Dealer(42), Dealer(42)
+    deals = [a.deal() for _ in range(20)]
+    assert deals == [b.deal() for _ in range(20)]
+    assert a.count == 20
+    assert deals != [Dealer(43).deal() for _ in range(20)]
+    assert len({i.hands for i in deals}) == 20
+
+def test_deal_replays_from_its_seed():
+    dealer = Dealer(7)
+    for k in range(10):
+        deal = dealer.deal()
+        assert deal.seed == derive(7, k)
+        assert replay(deal.seed) == deal
+
+def test_seed_is_64_bit():
+    assert Dealer(-1).seed == 2 ** 64 - 1
+    assert replay(2 ** 64 + 5) == replay(5)
+
+def test_bulk_matches_dealer():
+    np = pytest.importorskip("numpy")
+    dealer = Dealer(2024)
+    expect = [dealer.deal() for _ in range(64)]
+    got = bulk(seeds(2024, 64))
+    assert got.seeds.tolist() == [i.seed for i in expect]
+    assert got.hands.tolist() == [list(i.hands) for i in expect]
+    assert got.lords.tolist() == [i.lords for i in expect]
+    assert got.first.tolist() == [i.first for i in expect]
+
+    tail = seeds(2024, 4, start = 60)
+    assert tail.dtype == np.uint64
+    assert tail.tolist() == [i.seed for i in expect[60:]]
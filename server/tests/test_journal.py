@@ -0,0 +1,86 @@
+"""
+对局记录测试: 写入后按编号与顺序读出的记录与写入时相同，崩溃留下的不完整尾部在重新打开时被截掉
+"""
+import random
+from bot import GreedyPolicy, RandomPolicy
+from journal import Journal, JournalReader, Record, Recorder
+from simulator import play_game
+
+# -*- encoding: utf-8 -*-
+
+def expected(recorder : Recorder, game : int) -> Record:
+    """
+    记录器应当解码出的记录(开局时刻精确到毫秒)
+    """
+    return Record(game, recorder.table, int(recorder.start * 1000) / 1000, recorder.landlord, recorder.winner,
+                  tuple((seed, first, tuple(bids)) for seed, first, bids in recorder.deals),
+                  tuple(recorder.plays))
+
+def recorders(count : int, seed : int = 0):
+    """
+    模拟若干局并记录，出牌用时改为随机的毫秒数，以覆盖用时的各种位数
+    """
+    rng = random.Random(seed)
+    out = []
+    for i in range(count):
+        recorder = Recorder(i)
+        play_game(i, seed + i, [GreedyPolicy, RandomPolicy, GreedyPolicy], recorder)
+        recorder.plays = [(rng.choice((0, 1, rng.randrange(1 << rng.randrange(1, 33)))), mask)
+                          for _, mask in recorder.plays]
+        out.append(recorder)
+    return out
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "games.kj")
+    written = recorders(30)
+
+    raw = Recorder(100) # 没有发牌的记录，出牌整局改为直接记录掩码
+    raw.play((1 << 54) - 1)
+    raw.play(0)
+    raw.plays[0] = (2 ** 32 - 1, raw.plays[0][1])
+    raw.finish(2, 3)
+    empty = Recorder(101) # 开局后即中断的记录
+    written += [raw, empty]
+
+    journal = Journal(path)
+    assert [journal.append(i) for i in written] == list(range(len(written)))
+    journal.close()
+
+    with JournalReader(path) as reader:
+        assert len(reader) == len(written)
+        assert list(reader) == [expected(r, i) for i, r in enumerate(written)]
+        assert reader[31] == expected(empty, 31)
+        assert list(reader.records(10, 12)) == [expected(written[10], 10), expected(written[11], 11)]
+
+def test_reopen_appends(tmp_path):
+    path = str(tmp_path / "games.kj")
+    first, second = recorders(3, 1), recorders(2, 2)
+    for batch in (first, second):
+        journal = Journal(path)
+        for i in batch:
+            journal.append(i)
+        journal.close()
+    with JournalReader(path) as reader:
+        assert list(reader) == [expected(r, i) for i, r in enumerate(first + second)]
+
+def test_recover_truncated_tail(tmp_path):
+    path = str(tmp_path / "games.kj")
+    written = recorders(4, 3)
+    journal = Journal(path)
+    for i in written:
+        journal.append(i)
+    journal.close()
+
+    with open(path, "rb") as f:
+        size = len(f.read())
+    with open(path, "ab") as f: # 写了一半的记录
+        f.write(written[0].encode()[:5])
+    with open(path + ".idx", "ab") as f:
+        f.write(size.to_bytes(8, "little"))
+
+    journal = Journal(path)
+    assert journal.count == 4
+    journal.append(written[1])
+    journal.close()
+    with JournalReader(path) as reader:
+        assert list(reader) == [expected(r, i) for i, r in enumerate(written + [written[1]])]
@@ -0,0 +1,81 @@
+"""
+协议编解码测试: 二进制帧与文本行的往返，以及畸形帧的拒绝
+"""
+import asyncio
+import pytest
+from protocol import MASK_BYTES, BinaryCodec, Op, TextCodec
+
+# -*- encoding: utf-8 -*-
+
+FULL = (1 << 54) - 1
+
+@pytest.mark.parametrize("op, args", [
+    (Op.READY, ()),
+    (Op.BEGIN, ()),
+    (Op.REDEAL, ()),
+    (Op.LORDS, (0b111 << 51,)),
+    (Op.HAND, (FULL >> 37,)),
+    (Op.REJECT, (0,)),
+    (Op.IDENTITY, (1,)),
+    (Op.WIN, (3,)),
+    (Op.BID, (2,)),
+    (Op.BID, (1, 3, 2)),
+    (Op.PLAY, (FULL,)),
+    (Op.PLAY, (2, 1 << 53)),
+    (Op.SNAPSHOT, (1, 2, 3, 1, 1 << 5, FULL >> 20, 0b111))
+    ])
+def test_binary_round_trip(op, args):
+    frame = BinaryCodec.encode(op, *args)
+    assert int.from_bytes(frame[:2], "big") == len(frame) - 2
+    assert BinaryCodec.decode(frame[2:]) == (op, args)
+
+def test_binary_read():
+    frames = BinaryCodec.encode(Op.BEGIN) + BinaryCodec.encode(Op.PLAY, 1, 0b1011)
+
+    async def read_all():
+        reader = asyncio.StreamReader()
+        reader.feed_data(frames)
+        reader.feed_eof()
+        return [await BinaryCodec.read(reader), await BinaryCodec.read(reader)]
+
+    assert asyncio.run(read_all()) == [(Op.BEGIN, ()), (Op.PLAY, (1, 0b1011))]
+
+@pytest.mark.parametrize("frame", [
+    b"",                                        # 空帧
+    bytes((0,)),                                # 未知操作码
+    bytes((99,)) + bytes(MASK_BYTES),           # 未知操作码
+    bytes((Op.READY, 0)),                       # 负载过长
+    bytes((Op.HAND,)) + bytes(MASK_BYTES - 1),  # 负载过短
+    bytes((Op.BID, 1, 2)),                      # 叫分负载只能是1或3字节
+    bytes((Op.PLAY,)) + bytes(MASK_BYTES + 2),
+    bytes((Op.HAND,)) + (1 << 54).to_bytes(MASK_BYTES, "big"), # 掩码越过54位
+    bytes((Op.PLAY, 1)) + (FULL + 1).to_bytes(MASK_BYTES, "big")
+    ])
+def test_binary_malformed(frame):
+    with pytest.raises(ValueError):
+        BinaryCodec.decode(frame)
+
+def test_binary_truncated_stream():
+    async def read_one():
+        reader = asyncio.StreamReader()
+        reader.feed_data(BinaryCodec.encode(Op.HAND, FULL)[:-1])
+        reader.feed_eof()
+        return await BinaryCodec.read(reader)
+
+    with pytest.raises(asyncio.IncompleteReadError):
+        asyncio.run(read_one())
+
+def test_text_play_round_trip():
+    for mask in (0, 1, 1 << 53, FULL):
+        line = TextCodec.encode(Op.PLAY, 2, mask)
+        assert line.endswith(b"\n")
+        assert TextCodec.decode_play(line) == mask
+
+@pytest.mark.parametrize("line", [b"1 {\"a\": 1}\n", b"1 [[1, 2\n", b"1 5\n"])
+def test_text_play_malformed(line):
+    with pytest.raises(ValueError):
+        TextCodec.decode_play(line)
+
+def test_text_unknown_op():
+    with pytest.raises(ValueError):
+        TextCodec.encode(Op.SNAPSHOT, 1, 2, 3, 1, 0, 0, 0)
@@ -0,0 +1,48 @@
+"""
+规则引擎测试: 以小张数上限运行bench.py的等价性检查(完整的20张穷举仍用bench.py check)
+"""
+import pickle
+import pytest
+from cards_data import Cards, Pattern
+from cards_identifier import Identifier
+from cards_judger import Judger
+from cards_transfer import CardsTransfer
+
+# -*- encoding: utf-8 -*-
+
+bench = pytest.importorskip("bench", reason = "bench.py needs NumPy")
+
+def test_multisets_match_reference():
+    out = bench.check_multisets(6, ("lookup", "classify", "batch"), workers = 1)
+    assert out["multisets"] > 0
+    assert {k: v["count"] for k, v in out["mismatches"].items()} == {"lookup": 0, "classify": 0, "batch": 0}
+
+def test_patterns_match_reference():
+    out = bench.check_patterns(6)
+    assert out["pairs"] > 0
+    assert {k: v["count"] for k, v in out["mismatches"].items()} == \
+        {"judger": 0, "batch.compare": 0, "key": 0, "transfer": 0}
+
+def test_identify_examples():
+    assert Identifier.identify([[1, 3], [2, 3], [3, 3], [0, 5]]) == Cards(Pattern.FULLHOUSE, (4, 3))
+    assert Identifier.identify([[1, 14], [0, 15]]) == Cards(Pattern.KK)
+    assert Identifier.identify([[1, 3], [1, 4]]).pattern == Pattern.NONE
+
+def test_judger_examples():
+    bomb = Cards(Pattern.BOMB, 1)
+    pair = Cards(Pattern.PAIR, 13)
+    assert Judger.compare(pair, bomb) == 2
+    assert Judger.compare(bomb, pair) == 1
+    assert Judger.compare(Cards(Pattern.KK), bomb) == 1
+
+def test_cards_are_interned():
+    a = Cards(Pattern.STRAIGHT, (5, 9))
+    assert a is Cards(Pattern.STRAIGHT, [5, 9])
+    assert pickle.loads(pickle.dumps(a)) is a
+    with pytest.raises(AttributeError):
+        a.level = (5, 10)
+
+def test_transfer_round_trip():
+    cards = [Cards(Pattern.SINGLE, 3), Cards(Pattern.PLANE, (2, 2, 7)), Cards(Pattern.NONE)]
+    assert [CardsTransfer.decoson(CardsTransfer.encoson(c)) for c in cards] == cards
+    assert CardsTransfer.decoson_list(CardsTransfer.encoson_list(cards)) == cards